@@ -0,0 +1,2 @@
+# bench package: synthetic corpus generator, stub VLM server and stage benchmarks.
+# Run with:  python -m bench.run_bench --out bench_baseline.json
@@ -0,0 +1,98 @@
+# bench/corpus.py
+from __future__ import annotations
+import random, struct, zipfile
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Tuple
+import fitz
+
+_WRITE_CHUNK = 1024 * 1024
+
+def canonical_tracklist(sides: int, tracks_per_side: int, track_sec: int) -> Dict[str, List[Tuple[str, int]]]:
+    """Tracklist shared by every generated pair, so the stub VLM can answer without looking at images."""
+    return {chr(ord("A")+s): [(f"Track {chr(ord('A')+s)}{t+1}", track_sec + t) for t in range(tracks_per_side)]
+            for s in range(sides)}
+
+def vlm_response(tracklist: Dict[str, List[Tuple[str, int]]]) -> dict:
+    return {"sides": {s: [{"title": title, "side": s, "position": i+1,
+                           "duration_formatted": f"{sec//60:02d}:{sec%60:02d}"}
+                          for i, (title, sec) in enumerate(tracks)]
+                      for s, tracks in tracklist.items()}}
+
+def make_cue_pdf(path: Path, tracklist: Dict[str, List[Tuple[str, int]]], scanned: bool = False) -> None:
+    """Write a cue sheet PDF; scanned=True replaces the text layer with a raster image of the page."""
+    doc = fitz.open()
+    page = doc.new_page()
+    y = 60
+    page.insert_text((60, y), "Synthetic Records - Final cue sheet"); y += 30
+    for side, tracks in tracklist.items():
+        page.insert_text((60, y), f"Side {side}"); y += 18
+        for i, (title, sec) in enumerate(tracks):
+            page.insert_text((72, y), f"{i+1}. {title}")
+            page.insert_text((420, y), f"{sec//60:02d}:{sec%60:02d}")
+            y += 16
+            if y > page.rect.height - 60:
+                page = doc.new_page(); y = 60
+        y += 10
+    if scanned:
+        raster = fitz.open()
+        for p in doc:
+            pm = p.get_pixmap(dpi=100)
+            rp = raster.new_page(width=p.rect.width, height=p.rect.height)
+            rp.insert_image(rp.rect, pixmap=pm)
+        doc.close()
+        doc = raster
+    doc.save(str(path))
+    doc.close()
+
+def write_wav(fh: BinaryIO, seconds: float, rate: int = 48000, sampwidth: int = 2, channels: int = 2) -> int:
+    """Write a silent PCM WAV (RIFF header + zero samples) in bounded chunks; returns bytes written."""
+    block_align = sampwidth * channels
+    data_size = int(seconds * rate) * block_align
+    fh.write(b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE")
+    fh.write(b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, rate, rate*block_align, block_align, sampwidth*8))
+    fh.write(b"data" + struct.pack("<I", data_size))
+    zeros = bytes(_WRITE_CHUNK)
+    left = data_size
+    while left > 0:
+        n = min(left, _WRITE_CHUNK)
+        fh.write(zeros[:n]); left -= n
+    return 44 + data_size
+
+def make_zip(path: Path, tracklist: Dict[str, List[Tuple[str, int]]], side_mode: bool,
+             rate: int, sampwidth: int, channels: int, compress: bool = False) -> int:
+    """Write a delivery ZIP with one WAV per track ("A1.wav") or per side ("Side A.wav"); returns WAV bytes."""
+    total = 0
+    comp = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with zipfile.ZipFile(str(path), "w", comp, allowZip64=True) as z:
+        for side, tracks in tracklist.items():
+            members = ([(f"Side {side}.wav", sum(sec for _, sec in tracks))] if side_mode else
+                       [(f"{side}{i+1}.wav", sec) for i, (_, sec) in enumerate(tracks)])
+            for name, sec in members:
+                with z.open(name, "w", force_zip64=True) as fh:
+                    total += write_wav(fh, sec, rate, sampwidth, channels)
+    return total
+
+def generate_corpus(root: Path, pairs: int, sides: int = 2, tracks_per_side: int = 5, track_sec: int = 180,
+                    rate: int = 48000, sampwidth: int = 2, channels: int = 2, side_mode_ratio: float = 0.5,
+                    scanned_ratio: float = 0.0, ambiguous: int = 2, seed: int = 1) -> Dict:
+    """
+    Generate `pairs` PDF/ZIP deliveries under root/pdf and root/zip plus `ambiguous`
+    files whose names carry zero or two IDs, to exercise discover_and_pair_files.
+    """
+    rnd = random.Random(seed)
+    pdf_dir, zip_dir = root / "pdf", root / "zip"
+    pdf_dir.mkdir(parents=True, exist_ok=True); zip_dir.mkdir(parents=True, exist_ok=True)
+    tracklist = canonical_tracklist(sides, tracks_per_side, track_sec)
+    wav_bytes = 0
+    for i in range(pairs):
+        pid = f"{100000 + i}"
+        make_cue_pdf(pdf_dir / f"cue_{pid}.pdf", tracklist, scanned=rnd.random() < scanned_ratio)
+        wav_bytes += make_zip(zip_dir / f"audio_{pid}.zip", tracklist, rnd.random() < side_mode_ratio,
+                              rate, sampwidth, channels)
+    for j in range(ambiguous):
+        make_cue_pdf(pdf_dir / f"cue_{200000+j}_{300000+j}.pdf", tracklist)
+        make_zip(zip_dir / f"audio_noid_{chr(ord('a')+j % 26)}.zip", tracklist, False, rate, sampwidth, channels)
+    return {"pairs": pairs, "sides": sides, "tracks_per_side": tracks_per_side, "track_sec": track_sec,
+            "rate": rate, "sampwidth": sampwidth, "channels": channels, "side_mode_ratio": side_mode_ratio,
+            "scanned_ratio": scanned_ratio, "ambiguous": ambiguous, "seed": seed, "wav_bytes": wav_bytes,
+            "tracklist": tracklist}
@@ -0,0 +1,83 @@
+# bench/import_time.py
+"""
+Startup benchmark: `python -X importtime` reports for the CLI entry points.
+
+    python -m bench.import_time --repeat 5 --budget-ms 150
+
+Scenarios run in fresh interpreters: `m01_main_cli.py --help` (the fast path: argument
+parsing only), `import m01_main_cli`, and an import of the pipeline modules (what the
+first pair pays). For each the best wall time and the slowest modules by cumulative
+import time are reported. The --help path must not load any of the heavy libraries
+(fitz, PIL, httpx, numpy, ...) and, with --budget-ms, must start within the budget;
+a violation exits with status 1 so the check can guard CI or watch setups.
+"""
+from __future__ import annotations
+import argparse, json, subprocess, sys, time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SCENARIOS = {
+    "help": ["m01_main_cli.py", "--help"],
+    "cli_import": ["-c", "import m01_main_cli"],
+    "pipeline": ["-c", "import m10_utils, m05_pdf_extractor, m06_wav_analyzer, m07_track_matcher, m08_comparator, m09_export"],
+}
+# top-level packages the --help path must never import
+FORBIDDEN = ("fitz", "pymupdf", "PIL", "httpx", "tenacity", "numpy", "scipy", "pydantic", "asyncio")
+
+def _run(args: List[str]) -> Dict:
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if p.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed: {p.stderr[-500:]}")
+    mods = {}
+    for line in p.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        mods[name.strip()] = (int(self_us), int(cum_us))
+    return {"wall_ms": wall*1000, "modules": mods}
+
+def measure(args: List[str], repeat: int, top: int) -> Dict:
+    runs = [_run(args) for _ in range(repeat)]
+    best = min(runs, key=lambda r: r["wall_ms"])
+    mods = best["modules"]
+    slowest = sorted(mods.items(), key=lambda kv: -kv[1][1])[:top]
+    return {"wall_ms": round(best["wall_ms"], 1),
+            "import_ms": round(sum(s for s, _ in mods.values()) / 1000, 1),
+            "modules": len(mods),
+            "top": [{"module": k, "self_ms": round(s/1000, 2), "cumulative_ms": round(c/1000, 2)} for k, (s, c) in slowest],
+            "loaded": sorted({k.split(".")[0] for k in mods})}
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="CLI startup (import time) benchmark")
+    p.add_argument("--repeat", type=int, default=5); p.add_argument("--top", type=int, default=10)
+    p.add_argument("--budget-ms", type=float, default=None, help="Fail when --help takes longer (best wall time)")
+    p.add_argument("--out", default=None)
+    a = p.parse_args(argv)
+    report = {k: measure(v, a.repeat, a.top) for k, v in SCENARIOS.items()}
+
+    for name, r in report.items():
+        print(f"{name}: wall {r['wall_ms']} ms, imports {r['import_ms']} ms, {r['modules']} modules")
+        print(f"  {'MODULE':<40} {'SELF_MS':>9} {'CUMUL_MS':>9}")
+        for m in r["top"]:
+            print(f"  {m['module'][:40]:<40} {m['self_ms']:>9} {m['cumulative_ms']:>9}")
+
+    failures = []
+    heavy = [m for m in FORBIDDEN if m in report["help"]["loaded"]]
+    if heavy:
+        failures.append(f"--help imports heavy modules: {', '.join(heavy)}")
+    if a.budget_ms is not None and report["help"]["wall_ms"] > a.budget_ms:
+        failures.append(f"--help took {report['help']['wall_ms']} ms > budget {a.budget_ms} ms")
+    report["failures"] = failures
+    for f in failures:
+        print(f"FAIL: {f}")
+    if a.out:
+        Path(a.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+# bench/records.py
+"""
+Record-representation benchmark: pydantic models (the former hot-path types) against
+the slotted dataclass records of m03_models on a synthetic track batch.
+
+    python -m bench.records --tracks 10000 --out bench_records.json
+
+For each representation the same workload runs: validate/build tracks from VLM-style
+dicts, build WAV infos, match them, compare per side and dump everything for logs and
+export. Reported per representation: best wall time, tracemalloc peak and total
+allocated blocks, and the live objects (gc-tracked) held by the results. The
+"pipeline" row runs the real match_tracks/compare_pair on the records.
+"""
+from __future__ import annotations
+import argparse, gc, json, sys, time, tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Literal, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from pydantic import BaseModel, field_validator
+import m03_models as rec
+from m03_models import Letter
+from bench.run_bench import _NullLogger
+
+# The hot-path models as they were before the switch to records
+class _TrackInfo(BaseModel):
+    title: str
+    side: Letter
+    position: int
+    duration_sec: int
+    @field_validator("position")
+    @classmethod
+    def _pos(cls, v):
+        if v < 1: raise ValueError("position>=1")
+        return v
+
+class _WavInfo(BaseModel):
+    filename: str
+    duration_sec: float
+    side: Optional[Letter] = None
+    position: Optional[int] = None
+
+class _MatchedTrack(BaseModel):
+    side: Letter
+    position: Optional[int] = None
+    pdf: Optional[_TrackInfo] = None
+    wav: Optional[_WavInfo] = None
+    is_fully_matched: bool = False
+    side_consolidated: bool = False
+
+class _ComparisonItem(BaseModel):
+    side: Letter
+    pdf_total_sec: int
+    wav_total_sec: int
+    delta_sec: int
+    status: Literal["OK","WARN","FAIL"]
+
+def _batch(tracks: int, per_side: int) -> List[Dict]:
+    sides = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return [{"title": f"Song {i}", "side": sides[(i // per_side) % 26], "position": i % per_side + 1,
+             "duration_sec": 180 + i % 60, "wav_sec": 180.4 + i % 60} for i in range(tracks)]
+
+def _work_models(items: List[Dict]):
+    tracks = [_TrackInfo(title=d["title"], side=d["side"], position=d["position"], duration_sec=d["duration_sec"]) for d in items]
+    wavs = [_WavInfo(filename=f"{d['side']}{d['position']}.wav", duration_sec=d["wav_sec"], side=d["side"], position=d["position"]) for d in items]
+    matched = [_MatchedTrack(side=t.side, position=t.position, pdf=t, wav=w, is_fully_matched=True) for t, w in zip(tracks, wavs)]
+    comps = _compare(matched, _ComparisonItem)
+    dumped = [m.model_dump() for m in matched] + [c.model_dump() for c in comps]
+    return matched, comps, dumped
+
+def _work_records(items: List[Dict]):
+    tracks = [rec.VlmTrack(title=d["title"], side=d["side"], position=d["position"], duration_sec=d["duration_sec"]).record() for d in items]
+    wavs = [rec.WavInfo(f"{d['side']}{d['position']}.wav", d["wav_sec"], d["side"], d["position"]) for d in items]
+    matched = [rec.MatchedTrack(t.side, t.position, t, w, True) for t, w in zip(tracks, wavs)]
+    comps = _compare(matched, rec.ComparisonItem)
+    dumped = rec.as_dict(matched) + rec.as_dict(comps)
+    return matched, comps, dumped
+
+def _work_pipeline(items: List[Dict]):
+    from m07_track_matcher import match_tracks
+    from m08_comparator import compare_pair
+    sides: Dict[str, List[rec.TrackInfo]] = {}
+    for d in items:
+        sides.setdefault(d["side"], []).append(rec.VlmTrack(title=d["title"], side=d["side"], position=d["position"],
+                                                            duration_sec=d["duration_sec"]).record())
+    tl = rec.SideTracklist(sides)
+    wa = rec.WavAnalysis([rec.WavInfo(f"{d['side']}{d['position']}.wav", d["wav_sec"], d["side"], d["position"]) for d in items],
+                         {s: rec.WavSideMode(s, "tracks", 0.0) for s in sides})
+    log = _NullLogger()
+    matched = match_tracks(tl, wa, log, "bench")
+    comp = compare_pair(tl, wa, matched, 3, 6, log, "bench")
+    return matched, comp, rec.as_dict(matched)
+
+def _compare(matched, item_cls):
+    totals: Dict[str, List[float]] = {}
+    for m in matched:
+        t = totals.setdefault(m.side, [0, 0.0])
+        t[0] += m.pdf.duration_sec; t[1] += m.wav.duration_sec
+    out = []
+    for s, (pdf_t, wav_t) in sorted(totals.items()):
+        d = int(round(wav_t)) - pdf_t
+        out.append(item_cls(side=s, pdf_total_sec=pdf_t, wav_total_sec=int(round(wav_t)), delta_sec=d,
+                            status="OK" if d == 0 else ("WARN" if abs(d) <= 3 else "FAIL")))
+    return out
+
+def measure(work: Callable, items: List[Dict], repeat: int) -> Dict:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter(); work(items); best = min(best, time.perf_counter()-t0)
+    gc.collect()
+    before = len(gc.get_objects())
+    tracemalloc.start()
+    snap0 = tracemalloc.take_snapshot()
+    result = work(items)
+    peak = tracemalloc.get_traced_memory()[1]
+    snap1 = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(s.count_diff for s in snap1.compare_to(snap0, "filename") if s.count_diff > 0)
+    live = len(gc.get_objects()) - before
+    del result
+    return {"time_ms": round(best*1000, 1), "peak_alloc_kib": round(peak/1024, 1),
+            "alloc_blocks": blocks, "live_gc_objects": live}
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Hot-path record representation benchmark")
+    p.add_argument("--tracks", type=int, default=10000); p.add_argument("--per-side", type=int, default=10)
+    p.add_argument("--repeat", type=int, default=3); p.add_argument("--out", default=None)
+    a = p.parse_args(argv)
+    items = _batch(a.tracks, a.per_side)
+    report = {"tracks": a.tracks, "pydantic": measure(_work_models, items, a.repeat),
+              "records": measure(_work_records, items, a.repeat),
+              "pipeline": measure(_work_pipeline, items, a.repeat)}
+    print(f"{'REPRESENTATION':<14} {'TIME_MS':>9} {'PEAK_KIB':>10} {'ALLOC_BLOCKS':>13} {'LIVE_OBJECTS':>13}")
+    for k in ("pydantic", "records", "pipeline"):
+        r = report[k]
+        print(f"{k:<14} {r['time_ms']:>9} {r['peak_alloc_kib']:>10} {r['alloc_blocks']:>13} {r['live_gc_objects']:>13}")
+    if a.out:
+        Path(a.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
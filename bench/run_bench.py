@@ -0,0 +1,214 @@
+# bench/run_bench.py
+"""
+Stage and end-to-end benchmarks on a synthetic corpus.
+
+    python -m bench.run_bench --pairs 20 --out bench_baseline.json
+    python -m bench.run_bench --pairs 20 --out bench_new.json --compare bench_baseline.json
+
+Each stage records count, total time, throughput, latency percentiles (ms) and the
+process peak RSS after the stage; the CLI stage runs m01_main_cli.py as a subprocess
+against a local stub VLM server and reports the child's peak RSS.
+"""
+from __future__ import annotations
+import argparse, json, platform, subprocess, sys, tempfile, time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from bench.corpus import generate_corpus, vlm_response
+from bench.stub_vlm import StubVlmServer
+from m17_spans import percentile
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+class _NullLogger:
+    def _noop(self, *a, **k): pass
+    info = warn = error = critical = _noop
+
+def _peak_rss_mb(who: str = "self") -> Optional[float]:
+    if resource is None:
+        return None
+    ru = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(ru.ru_maxrss / (1024*1024 if sys.platform == "darwin" else 1024), 1)
+
+def _pct(sorted_ms: List[float], q: float) -> float:
+    return round(percentile(sorted_ms, q), 3) if sorted_ms else 0.0
+
+def _stats(samples_ms: List[float], rss: Optional[float]) -> Dict:
+    s = sorted(samples_ms)
+    total_s = sum(s) / 1000
+    return {"count": len(s), "total_s": round(total_s, 4),
+            "throughput_per_s": round(len(s)/total_s, 2) if total_s > 0 else None,
+            "p50_ms": _pct(s, 50), "p95_ms": _pct(s, 95), "p99_ms": _pct(s, 99),
+            "max_ms": round(s[-1], 3) if s else 0.0, "peak_rss_mb": rss}
+
+def _timed(fn: Callable, items, repeat: int) -> List[float]:
+    out = []
+    for _ in range(repeat):
+        for it in items:
+            t0 = time.perf_counter(); fn(it); out.append((time.perf_counter()-t0)*1000)
+    return out
+
+def run_stages(corpus: Path, stub_url: str, repeat: int, dpi: int) -> Dict[str, Dict]:
+    from m02_config import Config
+    from m04_file_matcher import discover_and_pair_files
+    from m05_pdf_extractor import render_pdf_pages, callvlm_json
+    from m06_wav_analyzer import analyze_zip
+    from m07_track_matcher import match_tracks
+    from m08_comparator import compare_pair
+    from m09_export import (save_tracklist_json, save_wav_analysis_json, save_matched_json,
+                            save_compare_json, write_pair_csv, write_batch_files)
+    from m16_text_layer import extract_text_tracklist
+    from m03_models import BatchSummary
+    from m13_vlm_client import close_shared_client
+
+    log = _NullLogger()
+    cfg = Config(vlm_provider="local", vlm_endpoint=stub_url, dpi=dpi, vlm_cache_enabled=False)
+    res: Dict[str, Dict] = {}
+
+    pr_holder = {}
+    def pairing(_):
+        pr_holder["pr"] = discover_and_pair_files(corpus/"pdf", corpus/"zip", cfg.id_min_digits, cfg.id_max_digits, log)
+    res["pairing"] = _stats(_timed(pairing, [None], repeat), _peak_rss_mb())
+    pairs = [p for p in pr_holder["pr"].pairs if p.zip]
+
+    tracklists = {}
+    def text_layer(p):
+        tracklists[p.pair_id] = extract_text_tracklist(Path(p.pdf))[0]
+    res["text_layer"] = _stats(_timed(text_layer, pairs, repeat), _peak_rss_mb())
+
+    pages = {}
+    def render(p):
+        pages[p.pair_id] = render_pdf_pages(Path(p.pdf), cfg, log, p.pair_id)
+    res["render"] = _stats(_timed(render, pairs, repeat), _peak_rss_mb())
+
+    res["vlm_call"] = _stats(_timed(lambda p: callvlm_json(pages[p.pair_id], cfg, log, p.pair_id, False), pairs, repeat), _peak_rss_mb())
+    pages.clear()
+    close_shared_client()
+
+    wavs = {}
+    def analyze(p):
+        wavs[p.pair_id] = analyze_zip(Path(p.zip), log, p.pair_id)
+    res["analyze_zip"] = _stats(_timed(analyze, pairs, repeat), _peak_rss_mb())
+
+    matched = {}
+    def match(p):
+        matched[p.pair_id] = match_tracks(tracklists[p.pair_id], wavs[p.pair_id], log, p.pair_id)
+    res["match_tracks"] = _stats(_timed(match, pairs, repeat), _peak_rss_mb())
+
+    comps = {}
+    def compare(p):
+        comps[p.pair_id] = compare_pair(tracklists[p.pair_id], wavs[p.pair_id], matched[p.pair_id],
+                                        cfg.tolerance_warn, cfg.tolerance_fail, log, p.pair_id)
+    res["compare_pair"] = _stats(_timed(compare, pairs, repeat), _peak_rss_mb())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def export(p):
+            d = Path(tmp) / p.pair_id
+            d.mkdir(exist_ok=True)
+            save_tracklist_json(d, tracklists[p.pair_id]); save_wav_analysis_json(d, wavs[p.pair_id])
+            save_matched_json(d, matched[p.pair_id]); save_compare_json(d, comps[p.pair_id])
+            write_pair_csv(d, comps[p.pair_id])
+        samples = _timed(export, pairs, repeat)
+        rows = [{"pair_id": p.pair_id, "sides_total": 0, "ok": 0, "warn": 0, "fail": 0, "worst_delta": 0} for p in pairs]
+        t0 = time.perf_counter()
+        write_batch_files(Path(tmp)/"_batch", rows, BatchSummary(pairs_total=len(rows), sides_total=0, ok=0, warn=0, fail=0))
+        samples.append((time.perf_counter()-t0)*1000)
+        res["export"] = _stats(samples, _peak_rss_mb())
+    return res
+
+def run_cli(corpus: Path, stub_url: str, pairs: int, jobs: int, dpi: int, extra: List[str]) -> Dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        cmd = [sys.executable, str(ROOT/"m01_main_cli.py"), "--pdf-dir", str(corpus/"pdf"), "--zip-dir", str(corpus/"zip"),
+               "--out-dir", tmp, "--vlm-provider", "local", "--vlm-endpoint", stub_url, "--no-vlm-cache",
+               "--dpi", str(dpi), "--jobs", str(jobs)] + extra
+        t0 = time.perf_counter()
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        wall_ms = (time.perf_counter()-t0)*1000
+    out = _stats([wall_ms], _peak_rss_mb("children"))
+    out["pairs_per_s"] = round(pairs / (wall_ms/1000), 2)
+    out["returncode"] = proc.returncode
+    if proc.returncode not in (0, 1):
+        out["stderr_tail"] = proc.stderr[-2000:]
+    return out
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_reports(old: Dict, new: Dict) -> str:
+    head = f"{'STAGE':<22} {'P50_OLD':>10} {'P50_NEW':>10} {'P50_%':>8} {'P95_OLD':>10} {'P95_NEW':>10} {'P95_%':>8}"
+    lines = [head, "-"*len(head)]
+    def pct(a, b):
+        return f"{(b-a)/a*100:+.1f}" if a else "n/a"
+    for stage, n in new["stages"].items():
+        o = old.get("stages", {}).get(stage)
+        if not o:
+            lines.append(f"{stage:<22} {'-':>10} {n['p50_ms']:>10} {'new':>8}"); continue
+        lines.append(f"{stage:<22} {o['p50_ms']:>10} {n['p50_ms']:>10} {pct(o['p50_ms'], n['p50_ms']):>8} "
+                     f"{o['p95_ms']:>10} {n['p95_ms']:>10} {pct(o['p95_ms'], n['p95_ms']):>8}")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Final Cue Sheet Checker benchmarks")
+    p.add_argument("--out", default="bench_baseline.json")
+    p.add_argument("--compare", default=None, help="Previous report to diff against")
+    p.add_argument("--work-dir", default=None, help="Keep the generated corpus here (default: temp dir)")
+    p.add_argument("--pairs", type=int, default=10); p.add_argument("--sides", type=int, default=2)
+    p.add_argument("--tracks", type=int, default=5); p.add_argument("--track-sec", type=int, default=60)
+    p.add_argument("--rate", type=int, default=48000); p.add_argument("--sampwidth", type=int, default=2, choices=[1, 2, 3, 4])
+    p.add_argument("--channels", type=int, default=2); p.add_argument("--side-mode-ratio", type=float, default=0.5)
+    p.add_argument("--scanned-ratio", type=float, default=0.0); p.add_argument("--ambiguous", type=int, default=2)
+    p.add_argument("--seed", type=int, default=1); p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--dpi", type=int, default=200); p.add_argument("--jobs", type=int, default=1)
+    p.add_argument("--vlm-latency-ms", type=float, default=200.0); p.add_argument("--vlm-jitter-ms", type=float, default=0.0)
+    p.add_argument("--skip-cli", action="store_true")
+    a = p.parse_args(argv)
+
+    tmp = None
+    if a.work_dir:
+        corpus = Path(a.work_dir)
+    else:
+        tmp = tempfile.TemporaryDirectory(); corpus = Path(tmp.name)
+    try:
+        t0 = time.perf_counter()
+        meta = generate_corpus(corpus, a.pairs, a.sides, a.tracks, a.track_sec, a.rate, a.sampwidth, a.channels,
+                               a.side_mode_ratio, a.scanned_ratio, a.ambiguous, a.seed)
+        gen_s = time.perf_counter()-t0
+        tracklist = meta.pop("tracklist")
+        with StubVlmServer(vlm_response(tracklist), a.vlm_latency_ms, a.vlm_jitter_ms, seed=a.seed) as stub:
+            stages = run_stages(corpus, stub.url, a.repeat, a.dpi)
+            if not a.skip_cli:
+                stages["cli_vlm"] = run_cli(corpus, stub.url, a.pairs, a.jobs, a.dpi, ["--no-text-layer"])
+                stages["cli_text_layer"] = run_cli(corpus, stub.url, a.pairs, a.jobs, a.dpi, [])
+        report = {
+            "meta": {"timestamp": datetime.now().isoformat(timespec="seconds"), "git_rev": _git_rev(),
+                     "python": platform.python_version(), "platform": platform.platform(),
+                     "corpus": meta, "corpus_gen_s": round(gen_s, 2), "repeat": a.repeat, "dpi": a.dpi,
+                     "jobs": a.jobs, "vlm_latency_ms": a.vlm_latency_ms, "vlm_jitter_ms": a.vlm_jitter_ms},
+            "stages": stages,
+        }
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    Path(a.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if a.compare:
+        print(compare_reports(json.loads(Path(a.compare).read_text(encoding="utf-8")), report))
+    else:
+        print(json.dumps(report["stages"], indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
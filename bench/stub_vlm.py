@@ -0,0 +1,59 @@
+# bench/stub_vlm.py
+from __future__ import annotations
+import json, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+class StubVlmServer:
+    """
+    Local HTTP server answering both the local/direct VLM endpoint and OpenRouter's
+    /chat/completions with a fixed tracklist after a configurable latency
+    (base latency plus uniform jitter, both in milliseconds); a status other than 200
+    answers every request with that error instead.
+    """
+    def __init__(self, response: dict, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0, seed: Optional[int] = None, status: int = 200):
+        body = json.dumps(response).encode("utf-8")
+        chat = json.dumps({"choices": [{"message": {"content": json.dumps(response)}}]}).encode("utf-8")
+        rnd = random.Random(seed)
+        lock = threading.Lock()
+        stats = self.stats = {"requests": 0, "request_bytes": 0}
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                n = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(n)
+                with lock:
+                    stats["requests"] += 1; stats["request_bytes"] += n
+                    delay = (latency_ms + rnd.uniform(0, jitter_ms)) / 1000.0
+                time.sleep(delay)
+                out = chat if self.path.endswith("/chat/completions") else body
+                if status != 200:
+                    out = json.dumps({"error": "stub failure"}).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, *a):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/vision/extract"
+
+    def __enter__(self) -> "StubVlmServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -1,9 +1,10 @@
 # 01_main_cli.py
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import argparse, sys
+import argparse, os, signal, sys, threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List
+from typing import TYPE_CHECKING, Dict
 
 # Load .env file if it exists
 try:
@@ -13,87 +14,317 @@ except ImportError:
     # python-dotenv not available, continue without it
     pass
 
-from m02_config import Config
-from m03_models import (SideTracklist, WavAnalysis, MatchedTrack,
-                       ComparisonResult, BatchSummary, PairingResult)
-from m04_file_matcher import discover_and_pair_files
-from m05_pdf_extractor import extract_pdf_tracklist
-from m06_wav_analyzer import analyze_zip
-from m07_track_matcher import match_tracks
-from m08_comparator import compare_pair
-from m09_export import (save_tracklist_json, save_matched_json, save_compare_json,
-                       write_pair_csv, write_batch_files)
-from m10_utils import JsonLogger, make_run_tag, ensure_dir, make_pair_dirs, brief_traceback, run_pipeline_for_pair
+# Project modules (pydantic, and through them PDF/HTTP libraries) are imported only after
+# the arguments are parsed and checked, so --help and usage errors return immediately.
+if TYPE_CHECKING:
+    from m02_config import Config
+    from m03_models import PairingItem, PairingResult
+    from m10_utils import JsonLogger
 
 def _build_args():
     p = argparse.ArgumentParser(description="Final Cue Sheet Checker (Windows CLI)")
-    p.add_argument("--pdf-dir", required=True); p.add_argument("--zip-dir", required=True); p.add_argument("--out-dir", default="_debug_outputs")
+    p.add_argument("--pdf-dir", help="Required except with --worker"); p.add_argument("--zip-dir", help="Required except with --worker")
+    p.add_argument("--out-dir", default="_debug_outputs")
     p.add_argument("--dpi", type=int, default=200); p.add_argument("--max-pages", type=int, default=2)
+    p.add_argument("--image-format", choices=["png", "jpeg", "webp"], default="png", help="Page encoding sent to the VLM")
+    p.add_argument("--image-quality", type=int, default=80, help="JPEG/WebP quality")
+    p.add_argument("--grayscale", action="store_true", help="Render pages in grayscale")
+    p.add_argument("--max-long-edge", type=int, default=0, help="Cap rendered page long edge in pixels (0 = no cap)")
+    p.add_argument("--render-memory-mb", type=int, default=1024, help="Memory budget for pages rendered concurrently (0 = unlimited)")
     p.add_argument("--warn-sec", type=int, default=3); p.add_argument("--fail-sec", type=int, default=6)
     p.add_argument("--model", default="google/gemini-2.5-flash", help="Model name used for all VLM providers")
     p.add_argument("--vlm-provider", choices=["openrouter", "local", "direct"], default="openrouter")
+    p.add_argument("--vlm-endpoint", default="http://localhost:12345/v1/vision/extract", help="Endpoint for the local/direct providers")
     p.add_argument("--openrouter-api-key", help="OpenRouter API key (can also be set via OPENROUTER_API_KEY env var)")
     p.add_argument("--log-file", default=None)
+    p.add_argument("--log-level", choices=["INFO", "WARN", "ERROR", "CRITICAL"], default="INFO")
+    p.add_argument("--quiet", action="store_true", help="Do not echo log lines to stdout (log file only)")
     p.add_argument("--id-min-digits", type=int, default=4); p.add_argument("--id-max-digits", type=int, default=8)
+    p.add_argument("--dir-index", default=None, help="Persisted directory index file; only changed directories are rescanned")
+    p.add_argument("--results-backend", choices=["files", "sqlite", "both"], default="files",
+                   help="Per-pair JSON/CSV files, one SQLite database for all runs, or both")
+    p.add_argument("--results-db", default=None, help="SQLite results database (default: <out-dir>/results.sqlite)")
     p.add_argument("--use-vlm-stub", action="store_true")
+    p.add_argument("--no-text-layer", action="store_true", help="Always use the VLM, even for PDFs with a text layer")
+    p.add_argument("--text-min-confidence", type=float, default=0.9, help="Min text-layer parse confidence to skip the VLM")
+    p.add_argument("--jobs", type=int, default=1, help="Number of pairs processed concurrently")
+    p.add_argument("--no-page-select", action="store_true", help="Render the first --max-pages pages instead of selecting tracklist pages")
+    p.add_argument("--no-page-crop", action="store_true", help="Render selected pages whole instead of cropped to content")
+    p.add_argument("--page-scan-limit", type=int, default=20, help="Pages inspected by the page pre-pass (0 = all)")
+    p.add_argument("--wav-workers", type=int, default=4, help="Threads probing WAV members of one ZIP")
+    p.add_argument("--no-infer-wavs", action="store_true", help="Do not match WAVs without side/position in the name by duration")
+    p.add_argument("--silence-analysis", action="store_true", help="Scan WAV samples for leading/trailing silence (needs NumPy)")
+    p.add_argument("--silence-threshold-db", type=float, default=-60.0, help="RMS level in dBFS at or below which a window is silent")
+    p.add_argument("--compare-effective", action="store_true", help="Compare sides by effective length without edge silence (implies --silence-analysis)")
+    p.add_argument("--no-vlm-cache", action="store_true", help="Always call the VLM, ignoring cached results")
+    p.add_argument("--vlm-cache-dir", default=".vlm_cache")
+    p.add_argument("--incremental-from", default=None, help="Previous run dir; unchanged pairs are reused from it")
+    p.add_argument("--resume", default=None, help="Run dir of an interrupted run; completed pairs are skipped")
+    p.add_argument("--incremental-hash", action="store_true", help="Fingerprint inputs by content hash, not only size/mtime")
+    p.add_argument("--vlm-max-in-flight", type=int, default=8, help="Max concurrent VLM requests on the shared HTTP client")
+    p.add_argument("--vlm-rate", type=float, default=0.0, help="Max VLM requests per second per endpoint (0 = adaptive only)")
+    p.add_argument("--vlm-max-attempts", type=int, default=6, help="Attempts per VLM request on 429/5xx/network errors")
+    p.add_argument("--vlm-chain", default=None, help="Providers tried in order, e.g. local=http://a/v1/x,openrouter")
+    p.add_argument("--vlm-deadline", type=float, default=0.0, help="Seconds per provider before the next one is tried (0 = none)")
+    p.add_argument("--vlm-hedge", action="store_true", help="Also query the next provider once a request exceeds its p95 latency")
+    p.add_argument("--vlm-hedge-after", type=float, default=20.0, help="Hedge delay until a provider's p95 is known")
+    p.add_argument("--watch", action="store_true", help="Keep running and process new deliveries as they land")
+    p.add_argument("--watch-interval", type=float, default=5.0, help="Seconds between directory rescans")
+    p.add_argument("--watch-settle", type=float, default=10.0, help="Seconds a file must stay unchanged before it is processed")
+    p.add_argument("--watch-orphan-after", type=float, default=600.0, help="Process a PDF without ZIP after this many seconds")
+    p.add_argument("--watch-retry", type=float, default=60.0, help="Seconds before a failed pair is retried (doubles per attempt)")
+    p.add_argument("--watch-max-attempts", type=int, default=5, help="Attempts per pair before waiting for its files to change")
+    p.add_argument("--queue", action="store_true", help="Coordinator: pair once, queue the pairs for --worker processes, wait and merge")
+    p.add_argument("--worker", default=None, metavar="RUN_DIR", help="Process pairs queued in RUN_DIR by a --queue coordinator")
+    p.add_argument("--worker-id", default=None, help="Worker name in the queue (default: host:pid)")
+    p.add_argument("--lease-sec", type=float, default=120.0, help="Queue lease per pair; renewed while the pair runs")
+    p.add_argument("--queue-poll", type=float, default=5.0, help="Seconds between queue checks while waiting")
     return p.parse_args()
 
+def _run_pair(pi: PairingItem, cfg: Config, out_run: Path, logger: JsonLogger, reuse_from: Path | None = None) -> Dict | None:
+    """Run one pair and return its summary row; failures are logged and isolated to the pair."""
+    from m09_export import get_results_store
+    from m10_utils import brief_traceback, run_pipeline_for_pair
+    from m15_incremental import reuse_pair_result
+    try:
+        result = (reuse_pair_result(reuse_from, out_run, pi.pair_id, get_results_store(cfg),
+                                    cfg.results_backend in ("files", "both")) if reuse_from else None)
+        if result is not None:
+            logger.info("pair_reused","cli",pi.pair_id,"Pair unchanged, reusing previous result",{"from_run":str(reuse_from)})
+        else:
+            result = run_pipeline_for_pair(pi, cfg, out_run, logger)
+        worst = max((abs(it.delta_sec) for it in result.per_side), default=0)
+        cnts = result.counts
+        return {"pair_id": pi.pair_id, "sides_total": cnts["sides_total"], "ok": cnts["ok"], "warn": cnts["warn"], "fail": cnts["fail"], "worst_delta": worst}
+    except Exception as e:
+        logger.error("pair_failed","cli",pi.pair_id,"Pair processing failed",{"reason":str(e),"trace":brief_traceback(e)})
+        return None
+
+def _worker_main(a: argparse.Namespace) -> None:
+    """--worker: process pairs from a coordinator's queue until it is drained."""
+    run_dir = Path(a.worker)
+    from m22_work_queue import QUEUE_FILE
+    if not (run_dir / "_batch" / QUEUE_FILE).is_file():
+        print("ERROR: --worker: adresář běhu neobsahuje frontu (spusťte koordinátor s --queue).", file=sys.stderr); sys.exit(2)
+    for d in (a.pdf_dir, a.zip_dir):
+        if d is not None and not Path(d).is_dir():
+            print("ERROR: --pdf-dir nebo --zip-dir neexistuje.", file=sys.stderr); sys.exit(2)
+
+    from m10_utils import JsonLogger, brief_traceback
+    from m13_vlm_client import close_shared_client, get_shared_client
+    from m22_work_queue import WorkQueue, default_worker_id, run_worker
+    from m24_provider_chain import provider_stats
+
+    queue = WorkQueue(run_dir)
+    cfg = queue.config(openrouter_api_key=a.openrouter_api_key or os.getenv("OPENROUTER_API_KEY"),
+                       log_file=a.log_file, log_level=a.log_level, log_echo=not a.quiet, jobs=max(1, a.jobs))
+    worker_id = a.worker_id or default_worker_id()
+    logger = JsonLogger(run_dir.name, cfg.log_file, min_level=cfg.log_level, echo=cfg.log_echo)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        run_worker(queue, worker_id, logger, lambda pi, reuse: _run_pair(pi, cfg, run_dir, logger, reuse), stop,
+                   cfg.jobs, a.lease_sec, a.queue_poll, Path(a.pdf_dir) if a.pdf_dir else None,
+                   Path(a.zip_dir) if a.zip_dir else None)
+        logger.info("app_finish","cli",None,"Done",{"mode":"worker","vlm_rate":get_shared_client(cfg).rate_stats,
+                                                    "vlm_providers":provider_stats().snapshot()})
+        sys.exit(0)
+    except KeyboardInterrupt:
+        # leases of the pairs in progress expire and other workers take them over
+        logger.info("queue_worker_interrupted","queue",None,"Interrupted",{"worker":worker_id})
+        sys.exit(1)
+    except Exception as e:
+        logger.critical("app_terminated","cli",None,"Unhandled",{"message":str(e),"traceback_excerpt":brief_traceback(e)})
+        sys.exit(1)
+    finally:
+        close_shared_client()
+        queue.close()
+        logger.close()
+
 if __name__ == "__main__":
     a = _build_args()
+    if a.worker:
+        _worker_main(a)
+    if not a.pdf_dir or not a.zip_dir:
+        print("ERROR: --pdf-dir a --zip-dir jsou povinné.", file=sys.stderr); sys.exit(2)
     pdf_dir, zip_dir, out_dir = Path(a.pdf_dir), Path(a.zip_dir), Path(a.out_dir)
     if not pdf_dir.is_dir() or not zip_dir.is_dir():
         print("ERROR: --pdf-dir nebo --zip-dir neexistuje.", file=sys.stderr); sys.exit(2)
+    if a.queue and (a.watch or a.results_backend != "files"):
+        print("ERROR: --queue nelze kombinovat s --watch ani s --results-backend sqlite/both.", file=sys.stderr); sys.exit(2)
+    prev_run = Path(a.incremental_from) if a.incremental_from else None
+    if prev_run is not None and not prev_run.is_dir():
+        print("ERROR: --incremental-from neexistuje.", file=sys.stderr); sys.exit(2)
+    resume_run = Path(a.resume) if a.resume else None
+    if resume_run is not None and not resume_run.is_dir():
+        print("ERROR: --resume neexistuje.", file=sys.stderr); sys.exit(2)
+
+    from m02_config import Config
+    from m04_file_matcher import discover_and_pair_files
+    from m09_export import write_batch_files, get_results_store, close_results_store
+    from m10_utils import JsonLogger, make_run_tag, ensure_dir, brief_traceback, summarize_rows
+    from m13_vlm_client import close_shared_client, get_shared_client
+    from m14_vlm_cache import get_shared_cache
+    from m15_incremental import pair_fingerprint, load_fingerprints, write_fingerprints
+    from m19_checkpoint import Checkpoint, drop_stale
+    from m21_memory_budget import get_shared_budget
+    from m24_provider_chain import provider_stats, resolve_chain
 
     cfg = Config(
         vlm_provider=a.vlm_provider,
         openrouter_api_key=a.openrouter_api_key,
         model_name=a.model,
+        vlm_endpoint=a.vlm_endpoint,
         use_vlm_stub=bool(a.use_vlm_stub),
+        text_layer_enabled=not a.no_text_layer, text_layer_min_confidence=a.text_min_confidence,
         dpi=a.dpi, max_pages=a.max_pages,
-        id_min_digits=a.id_min_digits, id_max_digits=a.id_max_digits,
-        tolerance_warn=a.warn_sec, tolerance_fail=a.fail_sec,
-        out_root=str(out_dir), log_file=a.log_file
+        page_select=not a.no_page_select, page_crop=not a.no_page_crop, page_scan_limit=a.page_scan_limit,
+        image_format=a.image_format, image_quality=a.image_quality,
+        image_grayscale=bool(a.grayscale), image_max_long_edge=a.max_long_edge, render_memory_mb=max(0, a.render_memory_mb),
+        id_min_digits=a.id_min_digits, id_max_digits=a.id_max_digits, dir_index=a.dir_index,
+        tolerance_warn=a.warn_sec, tolerance_fail=a.fail_sec, infer_unlabelled_wavs=not a.no_infer_wavs,
+        out_root=str(out_dir), results_backend=a.results_backend, results_db=a.results_db,
+        log_file=a.log_file, log_level=a.log_level, log_echo=not a.quiet,
+        jobs=max(1, a.jobs), wav_probe_workers=max(1, a.wav_workers),
+        silence_analysis=a.silence_analysis or a.compare_effective, silence_threshold_dbfs=a.silence_threshold_db,
+        compare_effective_length=a.compare_effective, vlm_max_in_flight=max(1, a.vlm_max_in_flight),
+        vlm_rate_per_s=max(0.0, a.vlm_rate), vlm_max_attempts=max(1, a.vlm_max_attempts),
+        vlm_chain=[s.strip() for s in (a.vlm_chain or "").split(",") if s.strip()], vlm_deadline_s=max(0.0, a.vlm_deadline),
+        vlm_hedge=a.vlm_hedge, vlm_hedge_after_s=a.vlm_hedge_after,
+        vlm_cache_enabled=not a.no_vlm_cache, vlm_cache_dir=a.vlm_cache_dir
     )
+    try:
+        resolve_chain(cfg)
+    except ValueError as e:
+        print(f"ERROR: --vlm-chain: {e}", file=sys.stderr); sys.exit(2)
 
-    run_tag = make_run_tag()
-    out_run = ensure_dir(out_dir / run_tag)
-    logger = JsonLogger(run_tag, cfg.log_file)
+    if resume_run is not None:
+        out_run, run_tag = resume_run, resume_run.name
+    else:
+        run_tag = make_run_tag()
+        out_run = ensure_dir(out_dir / run_tag)
+    logger = JsonLogger(run_tag, cfg.log_file, min_level=cfg.log_level, echo=cfg.log_echo)
 
     logger.info("app_start","cli",None,"Start",{
         "pdf_dir":str(pdf_dir),"zip_dir":str(zip_dir),"out_dir":str(out_dir),
         "warn_sec":cfg.tolerance_warn,"fail_sec":cfg.tolerance_fail,
-        "dpi":cfg.dpi,"model":cfg.model_name,"max_pages":cfg.max_pages,
+        "dpi":cfg.dpi,"model":cfg.model_name,"max_pages":cfg.max_pages,"image_format":cfg.image_format,
         "id_min":cfg.id_min_digits,"id_max":cfg.id_max_digits,
-        "vlm_provider":cfg.vlm_provider,"use_stub":cfg.use_vlm_stub
+        "vlm_provider":cfg.vlm_provider,"use_stub":cfg.use_vlm_stub,"jobs":cfg.jobs
     })
 
     try:
-        pr: PairingResult = discover_and_pair_files(pdf_dir, zip_dir, cfg.id_min_digits, cfg.id_max_digits, logger)
+        cache = get_shared_cache(cfg)
+        if cache is not None:
+            logger.info("vlm_cache_evict","cli",None,"VLM cache eviction",{"cache_dir":cfg.vlm_cache_dir} | cache.evict())
+        store = get_results_store(cfg)
+        if store is not None:
+            store.start_run(run_tag)
+
+        if a.watch:
+            from m18_watch import watch_loop
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+            try:
+                watch_loop(pdf_dir, zip_dir, cfg, out_run, logger, lambda pi: _run_pair(pi, cfg, out_run, logger), stop,
+                           a.watch_interval, a.watch_settle, a.watch_orphan_after, a.watch_retry, max(1, a.watch_max_attempts))
+            except KeyboardInterrupt:
+                logger.info("watch_interrupted","cli",None,"Interrupted, rolling summary is up to date",{})
+            logger.info("app_finish","cli",None,"Done",{"mode":"watch"})
+            sys.exit(0)
+
+        pr: PairingResult = discover_and_pair_files(pdf_dir, zip_dir, cfg.id_min_digits, cfg.id_max_digits, logger,
+                                                          Path(cfg.dir_index) if cfg.dir_index else None)
         logger.info("file_matching_finish","pairing",None,"Pairing done",{
             "pairs_found":len(pr.pairs),"unmatched_pdfs":pr.unmatched_pdfs,"unmatched_zips":pr.unmatched_zips
         })
-        rows=[]
-        for pi in pr.pairs:
+        fingerprints = {pi.pair_id: pair_fingerprint(pi, cfg, a.incremental_hash) for pi in pr.pairs}
+        prev_fps = load_fingerprints(prev_run) if prev_run else {}
+        reuse = {pid: prev_run for pid, fp in fingerprints.items() if prev_fps.get(pid) == fp}
+        if prev_run:
+            logger.info("incremental_plan","cli",None,"Incremental run",{
+                "from_run":str(prev_run),"reusable":len(reuse),"to_process":len(pr.pairs)-len(reuse)
+            })
+
+        if a.queue:
+            from m22_work_queue import WorkQueue, wait_and_merge
+            queue = WorkQueue(out_run)
             try:
-                result = run_pipeline_for_pair(pi, cfg, out_run, logger)
-                worst = max((abs(it.delta_sec) for it in result.per_side), default=0)
-                cnts = result.counts
-                rows.append({"pair_id": pi.pair_id, "sides_total": cnts["sides_total"], "ok": cnts["ok"], "warn": cnts["warn"], "fail": cnts["fail"], "worst_delta": worst})
-            except Exception as e:
-                logger.error("pair_failed","cli",pi.pair_id,"Pair processing failed",{"reason":str(e),"trace":brief_traceback(e)})
-
-        summary = BatchSummary(
-            pairs_total=len(rows),
-            sides_total=sum(r["sides_total"] for r in rows),
-            ok=sum(r["ok"] for r in rows),
-            warn=sum(r["warn"] for r in rows),
-            fail=sum(r["fail"] for r in rows),
-        )
-        table = write_batch_files(out_run/"_batch", rows, summary)
+                # on --resume, pairs already in the queue keep their state unless their fingerprint changed
+                requeued = queue.enqueue(pr.pairs, cfg, pdf_dir, zip_dir, fingerprints, reuse)
+                logger.info("queue_ready","queue",None,"Pairs queued for workers",{
+                    "run_dir":str(out_run),"queue":str(queue.path),"requeued":requeued} | queue.counts())
+                stop = threading.Event()
+                signal.signal(signal.SIGTERM, lambda *_: stop.set())
+                try:
+                    table = wait_and_merge(queue, out_run, logger, stop, a.queue_poll)
+                except KeyboardInterrupt:
+                    table = None
+                if table is None:
+                    logger.info("queue_wait_interrupted","queue",None,"Stopped waiting, finish with --queue --resume",{"run_dir":str(out_run)})
+                    sys.exit(1)
+                rows = queue.results()[0]
+            finally:
+                queue.close()
+            summary = summarize_rows(rows)
+            logger.flush()
+            print(table)
+            rc = 0 if summary.fail==0 else 1
+            logger.info("app_finish","cli",None,"Done",summary.model_dump() | {"rc":rc,"mode":"queue"})
+            sys.exit(rc)
+
+        checkpoint = Checkpoint(out_run)
+        # a pair whose files or result-relevant settings changed since the crash runs again
+        completed, stale = drop_stale(checkpoint.load(), fingerprints) if resume_run else ({}, 0)
+        if store is not None and completed:
+            # pairs still buffered when the run died are checkpointed but not in the database
+            stored = store.pair_ids(run_tag)
+            completed = {k: v for k, v in completed.items() if k in stored}
+        todo = [pi for pi in pr.pairs if pi.pair_id not in completed]
+        if resume_run:
+            logger.info("resume_plan","cli",None,"Resuming run",{
+                "run_dir":str(resume_run),"completed":len(completed),"stale":stale,"to_process":len(todo)
+            })
+
+        def _work(pi: PairingItem) -> None:
+            # only successful pairs are checkpointed, so failed ones are retried on resume
+            row = _run_pair(pi, cfg, out_run, logger, reuse.get(pi.pair_id))
+            if row is not None:
+                checkpoint.append(row | {"fingerprint": fingerprints[pi.pair_id]})
+
+        if cfg.jobs > 1:
+            with ThreadPoolExecutor(max_workers=cfg.jobs, thread_name_prefix="pair") as ex:
+                for _ in ex.map(_work, todo):
+                    pass
+        else:
+            for pi in todo:
+                _work(pi)
+
+        # the checkpoint is the source of truth, also for pairs finished before a resume;
+        # rows follow pairing order, so the summary stays deterministic
+        if store is not None:
+            store.flush()
+        completed = drop_stale(checkpoint.load(), fingerprints)[0]
+        rows = [completed[pi.pair_id] for pi in pr.pairs if pi.pair_id in completed]
+        write_fingerprints(out_run, {r["pair_id"]: r["fingerprint"] for r in rows})
+
+        summary = summarize_rows(rows)
+        table = write_batch_files(out_run/"_batch", rows, summary, logger.stages.summary())
+        logger.flush()  # keep the table after the pair logs on stdout
         print(table)
         rc = 0 if summary.fail==0 else 1
-        logger.info("app_finish","cli",None,"Done",summary.model_dump() | {"rc":rc})
+        finish = summary.model_dump() | {"rc":rc}
+        if cache is not None:
+            finish["vlm_cache"] = cache.stats
+        finish["render_budget"] = get_shared_budget(cfg).stats
+        finish["vlm_rate"] = get_shared_client(cfg).rate_stats
+        finish["vlm_providers"] = provider_stats().snapshot()
+        logger.info("app_finish","cli",None,"Done",finish)
         sys.exit(rc)
     except Exception as e:
         logger.critical("app_terminated","cli",None,"Unhandled",{"message":str(e),"traceback_excerpt":brief_traceback(e)})
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+    finally:
+        close_shared_client()
+        close_results_store()
+        logger.close()
\ No newline at end of file
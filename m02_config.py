@@ -16,18 +16,71 @@ class Config(BaseModel):
     vlm_endpoint: str = "http://localhost:12345/v1/vision/extract"  # uprav dle reálu
     use_vlm_stub: bool = False
 
+    # VLM HTTP transport (one pooled client per run)
+    vlm_timeout_s: int = 90
+    vlm_max_in_flight: int = 8
+    vlm_http2: bool = True
+    vlm_rate_per_s: float = 0.0  # request rate cap per endpoint, 0 = only the adaptive concurrency window
+    vlm_max_attempts: int = 6  # per request; 429/5xx/transport errors are retried, honouring Retry-After
+
+    # Provider chain: "kind" or "kind=url" entries tried in order (empty = vlm_provider only)
+    vlm_chain: list[str] = Field(default_factory=list)
+    vlm_deadline_s: float = 0.0  # per provider, including its retries; 0 = none
+    vlm_hedge: bool = False  # also start the next provider once a request exceeds its provider's p95
+    vlm_hedge_after_s: float = 20.0  # hedge delay until a provider has enough latency samples
+
+    # VLM result cache
+    vlm_cache_enabled: bool = True
+    vlm_cache_dir: str = ".vlm_cache"
+    vlm_cache_max_mb: int = 512
+    vlm_cache_max_age_days: int = 30
+
+    # Text-layer fast path (VLM only when the parse is not confident enough)
+    text_layer_enabled: bool = True
+    text_layer_min_confidence: float = 0.9
+
     # PDF render
     dpi: int = 200
     max_pages: int = 2
 
+    # Page pre-pass: render only pages likely to hold the tracklist, cropped to content
+    page_select: bool = True
+    page_crop: bool = True
+    page_scan_limit: int = 20  # pages inspected by the pre-pass, 0 = all
+
+    # Page encoding for VLM payloads
+    image_format: str = "png"  # "png", "jpeg", "webp"
+    image_quality: int = 80  # JPEG/WebP only
+    image_grayscale: bool = False
+    image_max_long_edge: int = 0  # px, 0 = no cap
+    render_memory_mb: int = 1024  # budget for pages rendered/held concurrently across pairs, 0 = unlimited
+
     # Pairing
     id_min_digits: int = 4
     id_max_digits: int = 8
+    dir_index: str | None = None  # persisted directory index for incremental discovery
 
     # Tolerance
     tolerance_warn: int = 3
     tolerance_fail: int = 6
 
+    # Matching: assign WAVs without side/position in their name by duration (within tolerance_fail)
+    infer_unlabelled_wavs: bool = True
+
+    # Concurrency
+    jobs: int = 1
+    wav_probe_workers: int = 4  # threads probing members of one ZIP
+
+    # Sample-level silence analysis (streams PCM data, needs NumPy)
+    silence_analysis: bool = False
+    silence_threshold_dbfs: float = -60.0
+    silence_window_ms: int = 50
+    compare_effective_length: bool = False  # compare sides without leading/trailing silence
+
     # IO
     out_root: str = "_debug_outputs"
-    log_file: str | None = None
\ No newline at end of file
+    results_backend: str = "files"  # "files" (per-pair JSON/CSV), "sqlite" or "both"
+    results_db: str | None = None  # default: <out_root>/results.sqlite, shared by all runs
+    log_file: str | None = None
+    log_level: str = "INFO"  # "INFO", "WARN", "ERROR", "CRITICAL"
+    log_echo: bool = True  # mirror log lines to stdout
\ No newline at end of file
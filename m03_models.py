@@ -1,7 +1,8 @@
 # 03_models.py
 from __future__ import annotations
+from dataclasses import dataclass, field
 from pydantic import BaseModel, Field, field_validator
-from typing import Dict, List, Optional, Literal
+from typing import Any, Dict, List, Optional, Literal, get_args
 
 def parse_mmss_to_seconds(s: str) -> int:
     """
@@ -62,50 +63,97 @@ def parse_mmss_to_seconds(s: str) -> int:
 
 Letter = Literal["A","B","C","D","E","F","G","H","I","J","K","L","M","N","O","P","Q","R","S","T","U","V","W","X","Y","Z"]
 
-class TrackInfo(BaseModel):
+LETTERS = frozenset(get_args(Letter))
+
+# Hot-path records: slotted dataclasses built without validation inside the pipeline.
+# Data entering from the VLM is validated via VlmTrack; exports go through as_dict or
+# the pydantic models below (ComparisonResult, BatchSummary, ...).
+
+@dataclass(slots=True)
+class TrackInfo:
     title: str
     side: Letter
     position: int
     duration_sec: int
-    @field_validator("position")
-    @classmethod
-    def _pos(cls, v):
-        if v < 1: raise ValueError("position>=1")
-        return v
 
-class SideTracklist(BaseModel):
-    sides: Dict[Letter, List[TrackInfo]] = Field(default_factory=dict)
+@dataclass(slots=True)
+class SideTracklist:
+    sides: Dict[Letter, List[TrackInfo]] = field(default_factory=dict)
 
-class WavInfo(BaseModel):
+@dataclass(slots=True)
+class WavInfo:
     filename: str
     duration_sec: float
     side: Optional[Letter] = None
     position: Optional[int] = None
-
-class WavSideMode(BaseModel):
+    # sample-level level scan (only with silence analysis enabled)
+    effective_duration_sec: Optional[float] = None
+    leading_silence_sec: Optional[float] = None
+    trailing_silence_sec: Optional[float] = None
+    peak_dbfs: Optional[float] = None
+
+@dataclass(slots=True)
+class WavSideMode:
     side: Letter
     mode: Literal["tracks","side"]
     total_duration_sec: float
+    effective_duration_sec: Optional[float] = None  # total minus leading/trailing silence of the side
 
-class WavAnalysis(BaseModel):
+@dataclass(slots=True)
+class WavAnalysis:
     items: List[WavInfo]
-    per_side_mode: Dict[Letter, WavSideMode] = Field(default_factory=dict)
+    per_side_mode: Dict[Letter, WavSideMode] = field(default_factory=dict)
 
-class MatchedTrack(BaseModel):
+@dataclass(slots=True)
+class MatchedTrack:
     side: Letter
     position: Optional[int] = None
     pdf: Optional[TrackInfo] = None
     wav: Optional[WavInfo] = None
     is_fully_matched: bool = False
     side_consolidated: bool = False
+    inferred: bool = False  # WAV assigned by duration, its name carried no side/position
 
-class ComparisonItem(BaseModel):
+@dataclass(slots=True)
+class ComparisonItem:
     side: Letter
     pdf_total_sec: int
     wav_total_sec: int
     delta_sec: int
     status: Literal["OK","WARN","FAIL"]
     reason: Optional[Literal["missing_component","mixed_mode_detected","empty_side"]] = None
+    silence_trimmed_sec: Optional[int] = None  # edge silence excluded when comparing effective length
+
+_SCALARS = frozenset({str, int, float, bool, type(None)})
+
+def as_dict(obj: Any) -> Any:
+    """JSON-ready form of a record (nested records, pydantic models, lists and dicts included)."""
+    cls = obj.__class__
+    if cls in _SCALARS:
+        return obj
+    if hasattr(cls, "__dataclass_fields__"):
+        return {k: (v if v.__class__ in _SCALARS else as_dict(v)) for k in cls.__slots__ for v in (getattr(obj, k),)}
+    if isinstance(obj, list):
+        return [as_dict(v) for v in obj]
+    if isinstance(obj, dict):
+        return {k: as_dict(v) for k, v in obj.items()}
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    return obj
+
+class VlmTrack(BaseModel):
+    """Edge schema for one tracklist item coming from the VLM; validated once, then kept as a TrackInfo."""
+    title: str
+    side: Letter
+    position: int
+    duration_sec: int
+    @field_validator("position")
+    @classmethod
+    def _pos(cls, v):
+        if v < 1: raise ValueError("position>=1")
+        return v
+    def record(self) -> TrackInfo:
+        return TrackInfo(self.title, self.side, self.position, self.duration_sec)
 
 class ComparisonResult(BaseModel):
     pair_id: str
@@ -1,37 +1,170 @@
 # 04_file_matcher.py
 from __future__ import annotations
 from pathlib import Path
-import re
-from typing import List, Tuple, Dict
+import json, os, re, time
+from functools import lru_cache
+from typing import List, Tuple, Dict, Optional, Pattern
 from m03_models import PairingItem, PairingResult
 
-def _iter(root: Path, exts: Tuple[str,...]) -> List[Path]:
-    return [p for p in root.rglob("*") if p.is_file() and p.suffix.lower() in exts]
+INDEX_VERSION = 2
+# coarsest directory mtime resolution of the filesystems we list (FAT/SMB shares: 2 s)
+_MTIME_RESOLUTION_NS = 2_000_000_000
+
+@lru_cache(maxsize=None)
+def _id_pattern(lo: int, hi: int) -> Pattern[str]:
+    return re.compile(rf"([0-9]{{{lo},{hi}}})")
 
 def _ids(name: str, lo: int, hi: int) -> List[str]:
-    return re.findall(rf"([0-9]{{{lo},{hi}}})", name)
+    return _id_pattern(lo, hi).findall(name)
+
+def _iter(root: Path, exts: Tuple[str,...]) -> List[Path]:
+    """Iterative os.scandir walk; uses the d_type cached by scandir instead of a stat per entry."""
+    out: List[Path] = []
+    stack = [str(root)]
+    while stack:
+        d = stack.pop()
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.is_dir(follow_symlinks=False):
+                        stack.append(e.path)
+                    elif e.is_file() and os.path.splitext(e.name)[1].lower() in exts:
+                        out.append(Path(e.path))
+        except OSError:
+            continue
+    return sorted(out)
+
+class DirIndex:
+    """
+    Persisted listing of the delivery trees: per directory its mtime, the time it was
+    listed, sub-directories and matching files (with their extracted IDs).
+
+    A directory whose mtime is unchanged since the last refresh is taken from the
+    index without listing it again; since adding, removing or renaming an entry bumps
+    the parent directory's mtime, only directories that actually changed are rescanned.
+    With coarse timestamps an entry added in the same tick as a listing leaves the
+    mtime unchanged, so a directory listed within _MTIME_RESOLUTION_NS of its mtime is
+    listed again on the next refresh.
+    """
+    def __init__(self, path: Path, id_min: int, id_max: int):
+        self.path = Path(path)
+        self.id_min, self.id_max = id_min, id_max
+        self.dirs: Dict[str, Dict] = {}
+        self.scanned = self.reused = 0
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") == INDEX_VERSION and data.get("id_range") == [id_min, id_max]:
+                self.dirs = data["dirs"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def files(self, root: Path, exts: Tuple[str,...]) -> List[Tuple[Path, List[str]]]:
+        """Return (path, ids) for files under root with one of exts, refreshing changed directories."""
+        out: List[Tuple[Path, List[str]]] = []
+        stack = [str(root)]
+        while stack:
+            d = stack.pop()
+            try:
+                mtime = os.stat(d).st_mtime_ns
+            except OSError:
+                self.dirs.pop(d, None)
+                continue
+            ent = self.dirs.get(d)
+            if (ent is None or ent["mtime_ns"] != mtime or ent["exts"] != list(exts)
+                    or ent["listed_ns"] - mtime < _MTIME_RESOLUTION_NS):
+                ent = self._scan(d, mtime, exts)
+                self.scanned += 1
+            else:
+                self.reused += 1
+            stack.extend(os.path.join(d, s) for s in ent["subdirs"])
+            out.extend((Path(d, name), ids) for name, ids in ent["files"])
+        return sorted(out, key=lambda x: x[0])
+
+    def _scan(self, d: str, mtime: int, exts: Tuple[str,...]) -> Dict:
+        subdirs, files = [], []
+        listed = time.time_ns()
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.is_dir(follow_symlinks=False):
+                        subdirs.append(e.name)
+                    elif e.is_file() and os.path.splitext(e.name)[1].lower() in exts:
+                        files.append([e.name, _ids(Path(e.name).stem, self.id_min, self.id_max)])
+        except OSError:
+            pass
+        ent = {"mtime_ns": mtime, "listed_ns": listed, "exts": list(exts), "subdirs": subdirs, "files": files}
+        self.dirs[d] = ent
+        return ent
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({"version": INDEX_VERSION, "id_range": [self.id_min, self.id_max], "dirs": self.dirs}),
+                       encoding="utf-8")
+        os.replace(tmp, self.path)
+
+def _fold_wav_dirs(root: Path, items: List[Tuple[Path, List[str]]], lo: int, hi: int) -> List[Tuple[Path, List[str]]]:
+    """
+    Replace loose WAVs by their delivery folder: the nearest directory below root whose name
+    carries exactly one ID. WAVs without such a folder stay single-file sources.
+    """
+    out: List[Tuple[Path, List[str]]] = []
+    folded: set = set()
+    dir_ids: Dict[Path, Optional[str]] = {}
+    for p, c in items:
+        if p.suffix.lower() == ".wav":
+            owner = None
+            for d in p.parents:
+                if d == root or len(d.parts) <= len(root.parts):
+                    break
+                if d not in dir_ids:
+                    ids = _ids(d.name, lo, hi)
+                    dir_ids[d] = ids[0] if len(ids) == 1 else None
+                if dir_ids[d] is not None:
+                    owner = d
+                    break
+            if owner is not None:
+                if owner not in folded:
+                    folded.add(owner)
+                    out.append((owner, [dir_ids[owner]]))
+                continue
+        out.append((p, c))
+    return out
+
+def discover_and_pair_files(pdf_dir: Path, zip_dir: Path, id_min:int, id_max:int, logger,
+                            index_path: Optional[Path] = None) -> PairingResult:
+    if index_path is not None:
+        index = DirIndex(index_path, id_min, id_max)
+        pdfs_ids = index.files(pdf_dir, (".pdf",))
+        zips_ids = _fold_wav_dirs(zip_dir, index.files(zip_dir, (".zip",".wav")), id_min, id_max)
+        index.save()
+        logger.info("dir_index_refresh","pairing",None,"Directory index refreshed",{
+            "index_path":str(index_path),"dirs_scanned":index.scanned,"dirs_reused":index.reused,
+            "pdfs":len(pdfs_ids),"zips":len(zips_ids)
+        })
+    else:
+        pdfs_ids = [(p, _ids(p.stem, id_min, id_max)) for p in _iter(pdf_dir, (".pdf",))]
+        zips_ids = _fold_wav_dirs(zip_dir, [(z, _ids(z.stem, id_min, id_max)) for z in _iter(zip_dir, (".zip",".wav"))],
+                                  id_min, id_max)
 
-def discover_and_pair_files(pdf_dir: Path, zip_dir: Path, id_min:int, id_max:int, logger) -> PairingResult:
-    pdfs = _iter(pdf_dir, (".pdf",))
-    zips = _iter(zip_dir, (".zip",".wav"))
     pdf_map: Dict[str, List[Path]] = {}
     zip_map: Dict[str, List[Path]] = {}
-    for p in pdfs:
-        c = _ids(p.stem, id_min, id_max)
+    for p, c in pdfs_ids:
         if len(c)==1: pdf_map.setdefault(c[0], []).append(p)
         else: logger.warn("ambiguous_pair","pairing",None,"PDF id ambiguous/none",{"path":str(p),"candidates":c})
-    for z in zips:
-        c = _ids(z.stem, id_min, id_max)
+    for z, c in zips_ids:
         if len(c)==1: zip_map.setdefault(c[0], []).append(z)
         else: logger.warn("ambiguous_pair","pairing",None,"ZIP/WAV id ambiguous/none",{"path":str(z),"candidates":c})
 
     pairs: List[PairingItem] = []
     for pid, plist in pdf_map.items():
-        pdf_path = str(sorted(plist)[0])
+        pdf_path = str(min(plist))
         z = zip_map.get(pid, [])
-        zip_path = str(sorted(z)[0]) if z else None
+        zip_path = str(min(z)) if z else None
         pairs.append(PairingItem(pair_id=pid, pdf=pdf_path, zip=zip_path))
 
-    unmatched_pdfs = [str(p) for p in pdfs if not any(str(p)==pi.pdf for pi in pairs)]
-    unmatched_zips  = [str(z) for z in zips if not any(pi.zip and str(z)==pi.zip for pi in pairs)]
-    return PairingResult(pairs=pairs, unmatched_pdfs=unmatched_pdfs, unmatched_zips=unmatched_zips)
\ No newline at end of file
+    paired_pdfs = {pi.pdf for pi in pairs}
+    paired_zips = {pi.zip for pi in pairs if pi.zip}
+    unmatched_pdfs = [str(p) for p, _ in pdfs_ids if str(p) not in paired_pdfs]
+    unmatched_zips = [str(z) for z, _ in zips_ids if str(z) not in paired_zips]
+    return PairingResult(pairs=pairs, unmatched_pdfs=unmatched_pdfs, unmatched_zips=unmatched_zips)
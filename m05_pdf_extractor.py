@@ -1,76 +1,177 @@
 # 05_pdf_extractor.py
 from __future__ import annotations
 from pathlib import Path
-import json
+import io, json, math, re, time
 import fitz
-import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from typing import Dict, List
-from PIL import Image
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
 from m02_config import Config
-from m03_models import SideTracklist, TrackInfo, parse_mmss_to_seconds, Letter
-
-def renderpdf_to_pngs(pdf_path: Path, dpi: int, max_pages: int, logger, pair_id: str) -> List[Image.Image]:
-    logger.info("pdf_render_start","extract",pair_id,"Rendering",{"pdf_path":str(pdf_path),"dpi":dpi,"max_pages":max_pages})
-    pages=[]
-    with fitz.open(str(pdf_path)) as doc:
-        count = min(len(doc), max_pages if max_pages>0 else len(doc))
-        for i in range(count):
-            mat = fitz.Matrix(dpi/72, dpi/72)
-            pm = doc.load_page(i).get_pixmap(matrix=mat, alpha=False)
-            img = Image.frombytes("RGB", [pm.width, pm.height], pm.samples)
-            pages.append(img)
-    logger.info("pdf_render_finish","extract",pair_id,"Rendered",{"pages_count":len(pages)})
-    return pages
+from m03_models import LETTERS, SideTracklist, TrackInfo, VlmTrack, parse_mmss_to_seconds, Letter
+from m13_vlm_client import JsonBody, VlmClient, get_shared_client
+from m14_vlm_cache import VlmCache, get_shared_cache
+from m16_text_layer import FITZ_LOCK, extract_text_tracklist
+from m17_spans import add_metric
+from m20_page_select import PagePlan, plan_pages
+from m21_memory_budget import Reservation, get_shared_budget
+from m24_provider_chain import Provider, provider_stats, race, resolve_chain
+
+# PIL is only needed for WebP pages (and PIL images passed to callvlm_json); it loads on first use
+if TYPE_CHECKING:
+    from PIL import Image
+
+class EncodedPage(NamedTuple):
+    data: bytes
+    mime: str
+    width: int
+    height: int
+
+_MIME = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+def _encode_pixmap(pm: "fitz.Pixmap", fmt: str, quality: int) -> bytes:
+    # PNG/JPEG come straight from the pixmap; only WebP needs a PIL round trip
+    if fmt == "png":
+        return pm.tobytes("png")
+    if fmt == "jpeg":
+        return pm.tobytes("jpeg", jpg_quality=quality)
+    from PIL import Image
+    img = Image.frombytes("L" if pm.n == 1 else "RGB", (pm.width, pm.height), pm.samples)
+    buf = io.BytesIO()
+    img.save(buf, format="WEBP", quality=quality)
+    return buf.getvalue()
+
+def _pixels(area: "fitz.Rect", zoom: float) -> Tuple[int, int]:
+    """Pixmap size of area at zoom: whole pixels covering it, so an unaligned clip may gain one."""
+    return (math.ceil(area.x1*zoom) - math.floor(area.x0*zoom), math.ceil(area.y1*zoom) - math.floor(area.y0*zoom))
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1,min=1,max=15),
-       retry=retry_if_exception_type(httpx.HTTPError))
-def _post_vlm(endpoint: str, payload: dict, timeout_s: int = 90) -> dict:
-    with httpx.Client(timeout=timeout_s) as c:
-        r = c.post(endpoint, json=payload)
-        r.raise_for_status()
-        return r.json()
-
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1,min=1,max=15),
-       retry=retry_if_exception_type(httpx.HTTPError))
-def _post_openrouter(endpoint: str, payload: dict, headers: dict, timeout_s: int = 90) -> dict:
-    with httpx.Client(timeout=timeout_s) as c:
-        r = c.post(endpoint, json=payload, headers=headers)
-        r.raise_for_status()
-        response_data = r.json()
-
-        # Parse OpenRouter response format
-        if "choices" in response_data and len(response_data["choices"]) > 0:
-            content = response_data["choices"][0]["message"]["content"]
-            # Try to parse the JSON content from the model response
-            try:
-                return json.loads(content)
-            except json.JSONDecodeError:
-                # Return a fallback structure if JSON parsing fails
-                return {"sides": {}}
+def _zoom(area: "fitz.Rect", cfg: Config) -> float:
+    zoom = cfg.dpi/72
+    cap = cfg.image_max_long_edge
+    if cap > 0 and max(_pixels(area, zoom)) > cap:
+        zoom = cap / max(area.width, area.height)
+        while max(_pixels(area, zoom)) > cap:
+            zoom *= 1 - 1/cap
+    return zoom
+
+def render_pdf_pages(pdf_path: Path, cfg: Config, logger, pair_id: str,
+                     reservation: Optional[Reservation] = None) -> List[EncodedPage]:
+    """
+    Render pages and encode them for the VLM payload in one step.
+
+    Honours cfg.image_format/image_quality, renders grayscale when cfg.image_grayscale
+    is set and scales pages down so the long edge stays within cfg.image_max_long_edge.
+    With cfg.page_select, a cheap pre-pass (plan_pages) picks the pages likely to hold
+    the tracklist and crops them to their content region; otherwise the first
+    cfg.max_pages pages are rendered whole.
+
+    Each pixmap is dropped as soon as its page is encoded. With a reservation (see
+    m21_memory_budget), rendering waits until the estimated peak (largest pixmap plus
+    all pages) fits the budget, and the reservation is then shrunk to the encoded bytes
+    the caller keeps until the VLM request is sent. The document is handled under
+    FITZ_LOCK, so concurrent pairs render one at a time.
+    """
+    fmt = cfg.image_format.lower()
+    if fmt not in _MIME:
+        raise ValueError(f"Unsupported image format: {cfg.image_format}")
+    logger.info("pdf_render_start","extract",pair_id,"Rendering",{
+        "pdf_path":str(pdf_path),"dpi":cfg.dpi,"max_pages":cfg.max_pages,"format":fmt,"grayscale":cfg.image_grayscale
+    })
+    cs = fitz.csGRAY if cfg.image_grayscale else fitz.csRGB
+    pages: List[EncodedPage] = []
+    with FITZ_LOCK, fitz.open(str(pdf_path)) as doc:
+        if cfg.page_select:
+            plans = plan_pages(doc, cfg)
+            add_metric("pages_scanned", len(doc) if cfg.page_scan_limit <= 0 else min(len(doc), cfg.page_scan_limit))
+            logger.info("pdf_page_plan","extract",pair_id,"Pages selected",{
+                "pages_total":len(doc),"selected":[p.index for p in plans],"cropped":[p.index for p in plans if p.clip is not None],
+                "reason":plans[0].reason if plans else None
+            })
         else:
-            raise ValueError(f"Unexpected OpenRouter response format: {response_data}")
+            count = min(len(doc), cfg.max_pages if cfg.max_pages>0 else len(doc))
+            plans = [PagePlan(i, None, "first_pages") for i in range(count)]
+        areas = [plan.clip if plan.clip is not None else doc.load_page(plan.index).rect for plan in plans]
+        if reservation is not None and areas:
+            raw = [w * h * cs.n for w, h in (_pixels(a, _zoom(a, cfg)) for a in areas)]
+            reservation.resize(max(raw) + sum(raw))
+        for plan, area in zip(plans, areas):
+            i = plan.index
+            zoom = _zoom(area, cfg)
+            t0 = time.perf_counter()
+            pm = doc.load_page(i).get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=cs, alpha=False, clip=plan.clip)
+            data = _encode_pixmap(pm, fmt, cfg.image_quality)
+            width, height = pm.width, pm.height
+            pm = None  # free the samples before the next page is rasterised
+            pages.append(EncodedPage(data, _MIME[fmt], width, height))
+            add_metric("pages_rendered"); add_metric("encoded_bytes", len(data))
+            logger.info("pdf_page_encoded","extract",pair_id,"Page encoded",{
+                "page":i,"width":width,"height":height,"bytes":len(data),"cropped":plan.clip is not None,
+                "encode_ms":round((time.perf_counter()-t0)*1000, 1)
+            })
+    if reservation is not None:
+        reservation.resize(sum(len(p.data) for p in pages) + JsonBody.SLICE)
+    logger.info("pdf_render_finish","extract",pair_id,"Rendered",{"pages_count":len(pages),"bytes_total":sum(len(p.data) for p in pages)})
+    return pages
+
+VLM_PROMPT = "Extract the tracklist from these cassette tape cue sheet images. Return JSON format: {\"sides\": {\"A\": [{\"title\": \"Song Title\", \"side\": \"A\", \"position\": 1, \"duration_formatted\": \"03:45\"}], ...}}"
+VLM_TASK = "extract_vinyl_tracklist"
 
-def _image_to_base64(image: Image.Image) -> str:
-    """Convert PIL Image to base64 string"""
-    import base64
-    import io
+def _parse_openrouter(response_data: dict) -> dict:
+    # Parse OpenRouter response format
+    if "choices" in response_data and len(response_data["choices"]) > 0:
+        content = response_data["choices"][0]["message"]["content"]
+        # Try to parse the JSON content from the model response
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            # Return a fallback structure if JSON parsing fails
+            return {"sides": {}}
+    else:
+        raise ValueError(f"Unexpected OpenRouter response format: {response_data}")
+
+# retries, backoff and Retry-After are handled by the client's per-endpoint RateController
+def _post_vlm(client: VlmClient, endpoint: str, payload: Union[dict, JsonBody], headers: Optional[dict] = None) -> dict:
+    return client.post_json(endpoint, payload, headers)
+
+def _post_openrouter(client: VlmClient, endpoint: str, payload: Union[dict, JsonBody], headers: dict) -> dict:
+    return _parse_openrouter(client.post_json(endpoint, payload, headers))
+
+async def _apost_vlm(client: VlmClient, endpoint: str, payload: Union[dict, JsonBody], headers: Optional[dict] = None) -> dict:
+    return await client.apost_json(endpoint, payload, headers)
+
+async def _apost_openrouter(client: VlmClient, endpoint: str, payload: Union[dict, JsonBody], headers: dict) -> dict:
+    return _parse_openrouter(await client.apost_json(endpoint, payload, headers))
+
+def _as_page(image: Union["Image.Image", EncodedPage]) -> EncodedPage:
+    """An encoded page as is; a PIL Image is encoded as PNG"""
+    if isinstance(image, EncodedPage):
+        return image
     buffer = io.BytesIO()
     image.save(buffer, format="PNG")
-    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+    return EncodedPage(buffer.getvalue(), "image/png", image.width, image.height)
 
-def callvlm_json(images: List[Image.Image], cfg: Config, logger, pair_id: str, use_stub: bool) -> dict:
-    if use_stub:
-        logger.info("vlm_stub_used","vlm",pair_id,"Using stub",{"pages":len(images),"model":cfg.model_name})
-        resp = {"sides":{
-            "A":[{"title":"Stub Song 1","side":"A","position":1,"duration_formatted":"04:12"},
-                 {"title":"Stub Song 2","side":"A","position":2,"duration_formatted":"03:48"}],
-            "B":[{"title":"Stub Song 3","side":"B","position":1,"duration_formatted":"05:00"}]
-        }}
-        return resp
-
-    # Prepare payload based on provider
-    if cfg.vlm_provider == "openrouter":
+PageImages = Sequence[Union["Image.Image", EncodedPage]]
+
+# Stands in for a page's base64 data while the payload is serialised, see _stream_payload
+_PAGE_SLOT = "@@page:{}@@"
+_PAGE_SLOT_RE = re.compile(r"@@page:(\d+)@@")
+
+def _stream_payload(payload: dict, pages: List[EncodedPage]) -> JsonBody:
+    """Serialise payload (page data given as _PAGE_SLOT placeholders) into a streamed body."""
+    pieces = _PAGE_SLOT_RE.split(json.dumps(payload))
+    return JsonBody([p if k % 2 == 0 else pages[int(p)].data for k, p in enumerate(pieces)])
+
+def _stub_response(images: PageImages, cfg: Config, logger, pair_id: str) -> dict:
+    logger.info("vlm_stub_used","vlm",pair_id,"Using stub",{"pages":len(images),"model":cfg.model_name})
+    resp = {"sides":{
+        "A":[{"title":"Stub Song 1","side":"A","position":1,"duration_formatted":"04:12"},
+             {"title":"Stub Song 2","side":"A","position":2,"duration_formatted":"03:48"}],
+        "B":[{"title":"Stub Song 3","side":"B","position":1,"duration_formatted":"05:00"}]
+    }}
+    return resp
+
+def _build_request(images: PageImages, cfg: Config, provider: Optional[Provider] = None) -> Tuple[str, JsonBody, dict]:
+    """Return (endpoint, streamed payload, headers) for the provider (default: the first of the chain)."""
+    provider = provider or resolve_chain(cfg)[0]
+    pages = [_as_page(img) for img in images]
+    if provider.kind == "openrouter":
         if not cfg.openrouter_api_key:
             raise ValueError("OpenRouter API key is required. Set OPENROUTER_API_KEY environment variable or use --openrouter-api-key")
         payload = {
@@ -81,20 +182,19 @@ def callvlm_json(images: List[Image.Image], cfg: Config, logger, pair_id: str, u
                     "content": [
                         {
                             "type": "text",
-                            "text": "Extract the tracklist from these cassette tape cue sheet images. Return JSON format: {\"sides\": {\"A\": [{\"title\": \"Song Title\", \"side\": \"A\", \"position\": 1, \"duration_formatted\": \"03:45\"}], ...}}"
+                            "text": VLM_PROMPT
                         }
                     ] + [
                         {
                             "type": "image_url",
-                            "image_url": {"url": f"data:image/png;base64,{_image_to_base64(img)}"}
-                        } for img in images
+                            "image_url": {"url": f"data:{page.mime};base64,{_PAGE_SLOT.format(i)}"}
+                        } for i, page in enumerate(pages)
                     ]
                 }
             ],
             "max_tokens": 1000,
             "temperature": 0.1
         }
-        endpoint = f"{cfg.openrouter_base_url}/chat/completions"
         headers = {
             "Authorization": f"Bearer {cfg.openrouter_api_key}",
             "Content-Type": "application/json",
@@ -102,41 +202,142 @@ def callvlm_json(images: List[Image.Image], cfg: Config, logger, pair_id: str, u
             "X-Title": "Final Cue Sheet Checker"
         }
 
-    elif cfg.vlm_provider == "local":
-        payload = {"task":"extract_vinyl_tracklist","model":cfg.model_name,"images_base64":[_image_to_base64(img) for img in images]}
-        endpoint = cfg.vlm_endpoint
+    else:  # local, direct
+        payload = {"task":VLM_TASK,"model":cfg.model_name,"images_base64":[_PAGE_SLOT.format(i) for i in range(len(pages))]}
         headers = {"Content-Type": "application/json"}
+    return provider.endpoint, _stream_payload(payload, pages), headers
 
-    else:  # direct
-        payload = {"task":"extract_vinyl_tracklist","model":cfg.model_name,"images_base64":[_image_to_base64(img) for img in images]}
-        endpoint = cfg.vlm_endpoint
-        headers = {"Content-Type": "application/json"}
-
-    logger.info("vlm_call_start","vlm",pair_id,"VLM call",{"pages":len(images),"model":cfg.model_name,"provider":cfg.vlm_provider})
-
-    if cfg.vlm_provider == "openrouter":
-        resp = _post_openrouter(endpoint, payload, headers)
-    else:
-        resp = _post_vlm(endpoint, payload)
-
+def _log_success(resp: dict, provider: Provider, logger, pair_id: str) -> None:
     logger.info("vlm_call_success","vlm",pair_id,"VLM OK",{
         "sides": list(resp.get("sides", {}).keys()),
         "tracks_count": sum(len(v) for v in resp.get("sides", {}).values()),
-        "provider": cfg.vlm_provider
+        "provider": provider.name
     })
+
+def _usable(raw: dict) -> bool:
+    """A response counts (wins a race) only when it maps to a non-empty tracklist."""
+    try:
+        return bool(_to_tracklist(raw).sides)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return False
+
+def _raced(cfg: Config, providers: List[Provider]) -> bool:
+    return len(providers) > 1 or cfg.vlm_hedge or cfg.vlm_deadline_s > 0
+
+async def _arace(images: PageImages, providers: List[Provider], cfg: Config, logger, pair_id: str,
+                 client: VlmClient) -> Tuple[Provider, dict]:
+    async def attempt(p: Provider) -> dict:
+        endpoint, payload, headers = _build_request(images, cfg, p)
+        if p.kind == "openrouter":
+            return await _apost_openrouter(client, endpoint, payload, headers)
+        return await _apost_vlm(client, endpoint, payload, headers)
+    return await race(providers, attempt, _usable, cfg, logger, pair_id)
+
+def _post_single(images: PageImages, provider: Provider, cfg: Config, client: VlmClient) -> dict:
+    stats = provider_stats()
+    stats.count(provider.name, "requests")
+    t0 = time.perf_counter()
+    try:
+        endpoint, payload, headers = _build_request(images, cfg, provider)
+        if provider.kind == "openrouter":
+            resp = _post_openrouter(client, endpoint, payload, headers)
+        else:
+            resp = _post_vlm(client, endpoint, payload, headers)
+    except Exception:
+        stats.count(provider.name, "failed")
+        raise
+    stats.latency(provider.name, time.perf_counter() - t0)
+    stats.count(provider.name, "wins")
     return resp
 
-def extract_pdf_tracklist(pdf_path: Path, cfg: Config, logger, pair_id: str) -> SideTracklist:
-    images = renderpdf_to_pngs(pdf_path, cfg.dpi, cfg.max_pages, logger, pair_id)
-    raw = callvlm_json(images, cfg, logger, pair_id, cfg.use_vlm_stub)
+def callvlm_json(images: PageImages, cfg: Config, logger, pair_id: str, use_stub: bool,
+                 client: Optional[VlmClient] = None) -> dict:
+    """
+    Get the raw VLM JSON for the page images. A single provider is called directly;
+    a provider chain, hedging or a per-provider deadline races the providers (see
+    m24_provider_chain.race) on the client's event loop.
+    """
+    if use_stub:
+        return _stub_response(images, cfg, logger, pair_id)
 
+    providers = resolve_chain(cfg)
+    client = client or get_shared_client(cfg)
+    logger.info("vlm_call_start","vlm",pair_id,"VLM call",{"pages":len(images),"model":cfg.model_name,
+                                                           "providers":[p.name for p in providers]})
+    if _raced(cfg, providers):
+        provider, resp = client.run(_arace(images, providers, cfg, logger, pair_id, client))
+    else:
+        provider, resp = providers[0], _post_single(images, providers[0], cfg, client)
+
+    _log_success(resp, provider, logger, pair_id)
+    return resp
+
+def _to_tracklist(raw: dict) -> SideTracklist:
     # robustní mapování: očekáváme {"sides": {"A":[...]}}; fallback by se dal doplnit
+    # VLM output is the untrusted edge: every item is validated (VlmTrack) before it becomes a record
     sides_map: Dict[Letter, List[TrackInfo]] = {}
     for side, items in (raw.get("sides") or {}).items():
+        key = str(side).upper()
+        if key not in LETTERS:
+            raise ValueError(f"Invalid side in VLM output: {side!r}")
         arr: List[TrackInfo] = []
         for it in items:
             dur = int(it.get("duration_sec") or parse_mmss_to_seconds(it["duration_formatted"]))
-            arr.append(TrackInfo(title=it["title"], side=str(it["side"]).upper(), position=int(it["position"]), duration_sec=dur))
+            arr.append(VlmTrack(title=it["title"], side=str(it["side"]).upper(), position=int(it["position"]), duration_sec=dur).record())
         if arr:
-            sides_map[str(side).upper()] = arr  # type: ignore
-    return SideTracklist(sides=sides_map)
\ No newline at end of file
+            sides_map[key] = arr  # type: ignore
+    return SideTracklist(sides=sides_map)
+
+def _cache_lookup(pdf_path: Path, cfg: Config, logger, pair_id: str) -> Tuple[Optional[VlmCache], Optional[str], Optional[dict]]:
+    """Return (cache, key, cached raw VLM JSON or None); the stub is never cached."""
+    cache = None if cfg.use_vlm_stub else get_shared_cache(cfg)
+    if cache is None:
+        return None, None, None
+    key = cache.key(pdf_path, {
+        "model": cfg.model_name, "provider": [[p.kind, p.endpoint] for p in resolve_chain(cfg)], "dpi": cfg.dpi,
+        "max_pages": cfg.max_pages, "prompt": VLM_PROMPT, "task": VLM_TASK,
+        "page_select": cfg.page_select, "page_crop": cfg.page_crop, "page_scan_limit": cfg.page_scan_limit,
+        "image_format": cfg.image_format, "image_quality": cfg.image_quality,
+        "image_grayscale": cfg.image_grayscale, "image_max_long_edge": cfg.image_max_long_edge,
+    })
+    raw = cache.get(key)
+    add_metric("vlm_cache_hits" if raw is not None else "vlm_cache_misses")
+    if raw is not None:
+        logger.info("vlm_cache_hit","vlm",pair_id,"VLM result from cache",{"key":key[:16],"pdf_path":str(pdf_path)})
+    else:
+        logger.info("vlm_cache_miss","vlm",pair_id,"VLM result not cached",{"key":key[:16],"pdf_path":str(pdf_path)})
+    return cache, key, raw
+
+def _text_layer_lookup(pdf_path: Path, cfg: Config, logger, pair_id: str) -> Optional[SideTracklist]:
+    """Return the text-layer tracklist when it reaches cfg.text_layer_min_confidence, else None."""
+    if not cfg.text_layer_enabled:
+        return None
+    try:
+        tracklist, confidence = extract_text_tracklist(pdf_path)
+    except Exception as e:
+        logger.warn("text_layer_failed","extract",pair_id,"Text layer parsing failed",{"pdf_path":str(pdf_path),"reason":str(e)})
+        return None
+    use_text = confidence >= cfg.text_layer_min_confidence
+    logger.info("extract_path_chosen","extract",pair_id,"Extraction path",{
+        "path":"text_layer" if use_text else "vlm","confidence":round(confidence, 3),
+        "tracks_count":sum(len(v) for v in tracklist.sides.values())
+    })
+    return tracklist if use_text else None
+
+def extract_pdf_tracklist(pdf_path: Path, cfg: Config, logger, pair_id: str) -> SideTracklist:
+    tracklist = _text_layer_lookup(pdf_path, cfg, logger, pair_id)
+    if tracklist is not None:
+        return tracklist
+    cache, key, raw = _cache_lookup(pdf_path, cfg, logger, pair_id)
+    if raw is None:
+        # the pages count against the render budget until their request has been sent
+        with get_shared_budget(cfg).reserve() as reservation:
+            images = render_pdf_pages(pdf_path, cfg, logger, pair_id, reservation)
+            raw = callvlm_json(images, cfg, logger, pair_id, cfg.use_vlm_stub)
+            del images
+        tracklist = _to_tracklist(raw)
+        # only answers that map to a tracklist are kept; a broken one is asked again next run
+        if cache is not None and tracklist.sides:
+            cache.put(key, raw)
+        return tracklist
+    return _to_tracklist(raw)
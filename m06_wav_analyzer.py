@@ -1,31 +1,198 @@
 # 06_wav_analyzer.py
 from __future__ import annotations
 from pathlib import Path
-import zipfile, io, wave, re, json
-from typing import List, Dict, Tuple
+import contextvars, math, mmap, os, threading, zipfile, re, struct
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import BinaryIO, List, Dict, NamedTuple, Optional, Tuple
 from m03_models import WavInfo, WavAnalysis, WavSideMode, Letter
+from m17_spans import add_metric
+
+@lru_cache(maxsize=None)
+def _numpy():
+    """NumPy is optional and only needed for the sample-level silence scan, so it loads on first use."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
 
 def _list_wavs(z: zipfile.ZipFile) -> List[str]:
     return [m for m in z.namelist() if m.lower().endswith(".wav")]
 
-def _duration(b: bytes) -> float:
-    """Calculate duration of WAV file from bytes."""
+_PROBE_CHUNK = 64 * 1024
+
+
+def _read_exact(fh: BinaryIO, n: int) -> bytes:
+    buf = fh.read(n)
+    if len(buf) != n:
+        raise ValueError("Unexpected end of WAV header")
+    return buf
+
+
+def _skip(fh: BinaryIO, n: int) -> None:
+    """Skip n bytes of a forward-only stream (ZipExtFile seeks by decompressing anyway)."""
+    if isinstance(fh, mmap.mmap):
+        if fh.tell() + n > len(fh):
+            raise ValueError("Unexpected end of WAV data while skipping chunk")
+        fh.seek(n, os.SEEK_CUR)
+        return
+    while n > 0:
+        got = len(fh.read(min(n, _PROBE_CHUNK)))
+        if not got:
+            raise ValueError("Unexpected end of WAV data while skipping chunk")
+        n -= got
+
+
+class _WavHeader(NamedTuple):
+    fmt_tag: int  # 1 = PCM, 3 = IEEE float (WAVE_FORMAT_EXTENSIBLE resolved to its subformat)
+    channels: int
+    rate: int
+    block_align: int
+    bits: int
+    data_size: int
+
+
+def _read_header(fh: BinaryIO, total_size: Optional[int] = None) -> _WavHeader:
+    """
+    Parse the RIFF/RF64 chunk headers up to the `data` chunk.
+
+    Reads the `fmt ` chunk (and `ds64` for RF64 masters over 4 GB) and stops as
+    soon as the `data` chunk header is reached, leaving fh at the first sample.
+
+    Raises:
+        ValueError: If the stream is not a readable RIFF/RF64 WAVE file
+    """
+    riff, _, wave_id = struct.unpack("<4sI4s", _read_exact(fh, 12))
+    if riff not in (b"RIFF", b"RF64") or wave_id != b"WAVE":
+        raise ValueError("Invalid WAV format: missing RIFF/RF64 WAVE header")
+
+    offset = 12
+    fmt_tag = channels = block_align = rate = bits = 0
+    ds64_data_size: Optional[int] = None
+    while True:
+        chunk_id, size = struct.unpack("<4sI", _read_exact(fh, 8))
+        offset += 8
+        if chunk_id == b"ds64":
+            body = _read_exact(fh, size)
+            ds64_data_size = struct.unpack_from("<Q", body, 8)[0]
+        elif chunk_id == b"fmt ":
+            body = _read_exact(fh, size)
+            fmt_tag, channels, rate, _, block_align = struct.unpack_from("<HHIIH", body)
+            if size >= 16:
+                bits = struct.unpack_from("<H", body, 14)[0]
+            if fmt_tag == 0xFFFE and size >= 26:
+                fmt_tag = struct.unpack_from("<H", body, 24)[0]
+        elif chunk_id == b"data":
+            if riff == b"RF64" and size == 0xFFFFFFFF:
+                if ds64_data_size is None:
+                    raise ValueError("Invalid WAV format: RF64 without ds64 chunk")
+                size = ds64_data_size
+            if total_size is not None:
+                size = min(size, max(total_size - offset, 0))
+            break
+        else:
+            _skip(fh, size)
+        # RIFF chunks are word aligned
+        if size % 2:
+            _skip(fh, 1)
+        offset += size + size % 2
+
+    if block_align <= 0:
+        raise ValueError("Invalid WAV format: missing or invalid fmt chunk")
+    return _WavHeader(fmt_tag, channels, rate, block_align, bits, size)
+
+
+class SilenceOptions(NamedTuple):
+    threshold_dbfs: float = -60.0  # windows at or below this RMS level count as silence
+    window_ms: int = 50
+
+
+class _Levels(NamedTuple):
+    leading_sec: float
+    trailing_sec: float
+    peak_dbfs: Optional[float]
+
+
+_SCAN_CHUNK = 4 * 1024 * 1024  # PCM bytes held in memory per member while scanning
+
+
+def _to_float(buf: bytes, h: _WavHeader) -> "numpy.ndarray":
+    """Decode interleaved little-endian samples to float32 in [-1, 1], shape (frames, channels)."""
+    np = _numpy()
+    width = h.block_align // h.channels
+    if h.fmt_tag == 3 and width in (4, 8):
+        x = np.frombuffer(buf, dtype="<f4" if width == 4 else "<f8").astype(np.float32)
+    elif h.fmt_tag == 1 and width == 1:
+        x = (np.frombuffer(buf, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif h.fmt_tag == 1 and width == 2:
+        x = np.frombuffer(buf, dtype="<i2").astype(np.float32) / 32768.0
+    elif h.fmt_tag == 1 and width == 3:
+        b = np.frombuffer(buf, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        x = ((b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8 >> 8).astype(np.float32) / 8388608.0
+    elif h.fmt_tag == 1 and width == 4:
+        x = np.frombuffer(buf, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported sample format for level scan: tag={h.fmt_tag} width={width}")
+    return x.reshape(-1, h.channels)
+
+
+def _scan_levels(fh: BinaryIO, h: _WavHeader, opts: SilenceOptions) -> _Levels:
+    """
+    Stream the `data` chunk in fixed-size chunks and find the first and last window whose
+    RMS (over all channels) exceeds the threshold. Memory stays bounded by _SCAN_CHUNK.
+    """
+    if h.channels <= 0 or h.rate <= 0:
+        raise ValueError("Invalid WAV format: no channels or sample rate")
+    np = _numpy()
+    win = max(1, h.rate * opts.window_ms // 1000)
+    # whole windows per chunk, so only the very last window can be partial
+    chunk_frames = max(1, _SCAN_CHUNK // (h.block_align * win)) * win
+    threshold = 10 ** (opts.threshold_dbfs / 20.0)
+    total_frames = h.data_size // h.block_align
+    first = last = None
+    peak = 0.0
+    pos = 0  # frames consumed
+    while pos < total_frames:
+        n = min(chunk_frames, total_frames - pos)
+        x = _to_float(_read_exact(fh, n * h.block_align), h)
+        sq = np.einsum("ij,ij->i", x, x)
+        starts = np.arange(0, n, win)
+        counts = np.minimum(win, n - starts) * h.channels
+        rms = np.sqrt(np.add.reduceat(sq, starts) / counts)
+        loud = np.flatnonzero(rms > threshold)
+        if loud.size:
+            if first is None:
+                first = pos + int(starts[loud[0]])
+            last = pos + int(min(starts[loud[-1]] + win, n))
+        peak = max(peak, float(np.abs(x).max(initial=0.0)))
+        pos += n
+    if first is None:
+        return _Levels(total_frames / h.rate, 0.0, None)
+    peak_db = 20 * math.log10(peak) if peak > 0 else None
+    return _Levels(first / h.rate, (total_frames - last) / h.rate, round(peak_db, 2) if peak_db is not None else None)
+
+
+def _measure(fh: BinaryIO, total_size: Optional[int] = None,
+             silence: Optional[SilenceOptions] = None) -> Tuple[float, Optional[_Levels]]:
+    """Duration of a WAV stream and, with `silence` set, its sample-level edge silence."""
     try:
-        with wave.open(io.BytesIO(b), "rb") as w:
-            frames, rate = w.getnframes(), w.getframerate()
-            duration = 0.0 if rate <= 0 else frames / float(rate)
+        h = _read_header(fh, total_size)
+        duration = 0.0 if h.rate <= 0 else (h.data_size // h.block_align) / float(h.rate)
 
-            # Validate duration
-            if duration < 0:
-                return 0.0  # Defensive programming
+        # Validate duration
+        if duration < 0:
+            return 0.0, None  # Defensive programming
 
-            # Warn about suspiciously long duration (likely corrupted)
-            if duration > 7200:  # 2 hours
-                print(f"Warning: WAV duration {duration:.1f}s seems unusually long, possibly corrupted")
+        # Warn about suspiciously long duration (likely corrupted)
+        if duration > 7200:  # 2 hours
+            print(f"Warning: WAV duration {duration:.1f}s seems unusually long, possibly corrupted")
 
-            return duration
-    except wave.Error as e:
+        return duration, (_scan_levels(fh, h, silence) if silence is not None else None)
+    except struct.error as e:
         raise ValueError(f"Invalid WAV format: {e}")
+    except ValueError:
+        raise
     except Exception as e:
         raise ValueError(f"Failed to read WAV: {e}")
 
@@ -63,41 +230,158 @@ def _infer(name: str) -> Tuple[Letter|None,int|None]:
     return (None, None)
 
 
-def analyze_zip(zip_path: Path, logger, pair_id: str) -> WavAnalysis:
-    """Analyze WAV files in a ZIP archive."""
-    items: List[WavInfo] = []
-    logger.info("wav_analysis_start", "audio", pair_id, "Analyzing ZIP", {"zip_or_dir": str(zip_path)})
+class _ZipSource:
+    """WAV members of a ZIP archive; every thread reads through its own ZipFile handle."""
+    kind = "zip"
 
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        self._handles: List[zipfile.ZipFile] = []
+        self._lock = threading.Lock()
+        self._zip()  # fail early (BadZipFile, FileNotFoundError, ...) in the caller's thread
+
+    def _zip(self) -> zipfile.ZipFile:
+        z = getattr(self._local, "z", None)
+        if z is None:
+            z = self._local.z = zipfile.ZipFile(str(self.path), "r")
+            with self._lock:
+                self._handles.append(z)
+        return z
+
+    def members(self) -> List[str]:
+        return _list_wavs(self._zip())
+
+    def probe(self, name: str, silence: Optional[SilenceOptions] = None) -> Tuple[float, Optional[_Levels], int]:
+        z = self._zip()
+        with z.open(name) as fh:
+            dur, levels = _measure(fh, z.getinfo(name).file_size, silence)
+            return dur, levels, fh.tell()
+
+    def close(self) -> None:
+        with self._lock:
+            for z in self._handles:
+                z.close()
+            self._handles.clear()
+
+
+class _FileSource:
+    """Loose WAV files: a single file or every WAV below a directory, probed through mmap."""
+    kind = "wav"
+
+    def __init__(self, root: Path, names: List[str]):
+        self.root = root
+        self._names = names
+
+    @classmethod
+    def for_path(cls, path: Path) -> "_FileSource":
+        if path.is_dir():
+            names = sorted(p.relative_to(path).as_posix() for p in path.rglob("*")
+                           if p.suffix.lower() == ".wav" and p.is_file())
+            return cls(path, names)
+        if not path.exists():
+            raise FileNotFoundError(f"No such file or directory: '{path}'")
+        return cls(path.parent, [path.name])
+
+    def members(self) -> List[str]:
+        return self._names
+
+    def probe(self, name: str, silence: Optional[SilenceOptions] = None) -> Tuple[float, Optional[_Levels], int]:
+        # mmap maps the file lazily, so without a level scan only the header pages are read
+        with open(self.root / name, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            dur, levels = _measure(mm, len(mm), silence)
+            return dur, levels, mm.tell()
+
+    def close(self) -> None:
+        pass
+
+
+def open_audio_source(path: Path):
+    """Return the audio source for a ZIP archive, a single WAV file or a directory of WAVs."""
+    if path.is_dir() or path.suffix.lower() == ".wav":
+        return _FileSource.for_path(path)
+    return _ZipSource(path)
+
+
+def _probe_member(src, m: str, logger, pair_id: str, silence: Optional[SilenceOptions] = None) -> Optional[WavInfo]:
+    """Probe one member of an audio source; per-member failures are logged and yield None."""
     try:
-        with zipfile.ZipFile(str(zip_path), "r") as z:
-            members = _list_wavs(z)
-            if not members:
-                logger.warn("no_wavs_in_zip", "audio", pair_id, "ZIP has no WAVs", {"zip_path": str(zip_path)})
+        # Duration from the chunk headers; the PCM data is only streamed for a level scan
+        dur, levels, bytes_read = src.probe(m, silence)
+        add_metric(f"{src.kind}_bytes_read", bytes_read)
+        add_metric("wav_members")
 
-            for m in members:
-                try:
-                    # Read WAV data
-                    wav_bytes = z.read(m)
+        # Infer side and position
+        s, p = _infer(Path(m).name)
 
-                    # Calculate duration
-                    dur = _duration(wav_bytes)
+        if s is None and p is None:
+            logger.warn("unparseable_name", "audio", pair_id, "Cannot infer side/position", {"filename": m})
 
-                    # Infer side and position
-                    s, p = _infer(Path(m).name)
+        if levels is None:
+            return WavInfo(filename=m, duration_sec=dur, side=s, position=p)
+        effective = max(dur - levels.leading_sec - levels.trailing_sec, 0.0)
+        logger.info("wav_levels", "audio", pair_id, "WAV level scan", {
+            "member": m, "duration_sec": round(dur, 3), "effective_sec": round(effective, 3),
+            "leading_silence_sec": round(levels.leading_sec, 3), "trailing_silence_sec": round(levels.trailing_sec, 3),
+            "peak_dbfs": levels.peak_dbfs})
+        return WavInfo(filename=m, duration_sec=dur, side=s, position=p, effective_duration_sec=effective,
+                       leading_silence_sec=levels.leading_sec, trailing_silence_sec=levels.trailing_sec,
+                       peak_dbfs=levels.peak_dbfs)
 
-                    if s is None and p is None:
-                        logger.warn("unparseable_name", "audio", pair_id, "Cannot infer side/position", {"filename": m})
+    except ValueError as e:
+        logger.warn("wav_corrupt", "audio", pair_id, "WAV read failed", {"member": m, "error_type": "ValueError", "reason": str(e)})
+    except KeyError as e:
+        logger.warn("wav_missing", "audio", pair_id, "WAV file missing in ZIP", {"member": m, "error_type": "KeyError", "reason": str(e)})
+    except Exception as e:
+        logger.warn("wav_unexpected_error", "audio", pair_id, "Unexpected WAV error", {"member": m, "error_type": type(e).__name__, "reason": str(e)})
+    return None
+
+
+def _probe_members_concurrently(src, members: List[str], logger, pair_id: str, workers: int,
+                                silence: Optional[SilenceOptions] = None) -> List[Optional[WavInfo]]:
+    """
+    Probe members on a thread pool. ZIP sources give each worker its own ZipFile handle
+    and loose files are opened per probe, so reads are never serialised on one handle.
+    """
+    def probe(job: Tuple[contextvars.Context, str]) -> Optional[WavInfo]:
+        ctx, m = job
+        # run in the caller's context so span metrics land in the caller's stage
+        return ctx.run(_probe_member, src, m, logger, pair_id, silence)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wav-probe") as ex:
+        return list(ex.map(probe, [(contextvars.copy_context(), m) for m in members]))
+
+
+def analyze_zip(zip_path: Path, logger, pair_id: str, workers: int = 1,
+                silence: Optional[SilenceOptions] = None) -> WavAnalysis:
+    """
+    Analyze WAV files of an audio source: a ZIP archive, a single WAV file or a
+    directory of WAVs (see open_audio_source); members are probed on `workers` threads.
+
+    With `silence` set, every member's PCM data is also streamed through a level scan
+    (requires NumPy) that reports leading/trailing silence and the effective program length.
+    """
+    items: List[WavInfo] = []
+    logger.info("wav_analysis_start", "audio", pair_id, "Analyzing ZIP", {"zip_or_dir": str(zip_path)})
+    if silence is not None and _numpy() is None:
+        logger.warn("silence_analysis_unavailable", "audio", pair_id, "NumPy not installed, skipping level scan", {})
+        silence = None
 
-                    items.append(WavInfo(filename=m, duration_sec=dur, side=s, position=p))
+    try:
+        src = open_audio_source(zip_path)
+        try:
+            members = src.members()
+            if not members:
+                logger.warn("no_wavs_in_zip", "audio", pair_id, "Audio source has no WAVs", {"zip_path": str(zip_path), "source": src.kind})
 
-                except wave.Error as e:
-                    logger.warn("wav_corrupt", "audio", pair_id, "WAV format error", {"member": m, "error_type": "wave.Error", "reason": str(e)})
-                except ValueError as e:
-                    logger.warn("wav_corrupt", "audio", pair_id, "WAV read failed", {"member": m, "error_type": "ValueError", "reason": str(e)})
-                except KeyError as e:
-                    logger.warn("wav_missing", "audio", pair_id, "WAV file missing in ZIP", {"member": m, "error_type": "KeyError", "reason": str(e)})
-                except Exception as e:
-                    logger.warn("wav_unexpected_error", "audio", pair_id, "Unexpected WAV error", {"member": m, "error_type": type(e).__name__, "reason": str(e)})
+            # results come back in member order, so items and side-mode detection stay deterministic
+            if workers > 1 and len(members) > 1:
+                probed = _probe_members_concurrently(src, members, logger, pair_id, min(workers, len(members)), silence)
+            else:
+                probed = [_probe_member(src, m, logger, pair_id, silence) for m in members]
+            items = [w for w in probed if w is not None]
+        finally:
+            src.close()
 
     except zipfile.BadZipFile as e:
         logger.error("zip_corrupted", "audio", pair_id, "ZIP file is corrupted or invalid", {"zip_path": str(zip_path), "error_type": "zipfile.BadZipFile", "reason": str(e)})
@@ -135,7 +419,17 @@ def analyze_zip(zip_path: Path, logger, pair_id: str) -> WavAnalysis:
             logger.warn("negative_duration", "audio", pair_id, "Negative total duration calculated", {"side": s, "total": total})
             total = 0.0
 
-        per[s] = WavSideMode(side=s, mode=mode, total_duration_sec=total)
+        # Effective length drops the silence before the first and after the last counted file
+        effective = None
+        counted = [w for w in ws if mode == "side" or w.position is not None]
+        if counted and all(w.effective_duration_sec is not None for w in counted):
+            if mode == "side":
+                effective = sum(w.effective_duration_sec for w in counted)
+            else:
+                counted.sort(key=lambda w: w.position)
+                effective = max(total - counted[0].leading_silence_sec - counted[-1].trailing_silence_sec, 0.0)
+
+        per[s] = WavSideMode(side=s, mode=mode, total_duration_sec=total, effective_duration_sec=effective)
 
     wa = WavAnalysis(items=items, per_side_mode=per)
     logger.info("wav_analysis_finish", "audio", pair_id, "WAV analysis done", {"wav_count": len(items), "sides": list(per.keys())})
@@ -1,11 +1,98 @@
 # 07_track_matcher.py
 from __future__ import annotations
-from typing import List, Dict, Tuple
-from m03_models import SideTracklist, WavAnalysis, MatchedTrack, WavInfo, TrackInfo
+from functools import lru_cache
+from typing import List, Dict, Optional, Sequence, Tuple
+from m03_models import SideTracklist, WavAnalysis, MatchedTrack, WavInfo, as_dict
 
-def match_tracks(pdf_tracks: SideTracklist, wav: WavAnalysis, logger, pair_id: str) -> List[MatchedTrack]:
+# NumPy/SciPy accelerate the duration-based fallback on large matrices only; importing SciPy
+# costs far more than solving a delivery-sized matrix in pure Python
+_ACCEL_MIN_CELLS = 2500
+
+@lru_cache(maxsize=None)
+def _accelerators():
+    """(numpy, linear_sum_assignment), either None when not installed; imported on first use."""
+    try:
+        import numpy as np
+    except ImportError:
+        return None, None
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        linear_sum_assignment = None
+    return np, linear_sum_assignment
+
+def _hungarian(cost: Sequence[Sequence[float]]) -> List[Tuple[int, int]]:
+    """Minimum-cost assignment for an n x m matrix with n <= m (O(n^2 m) Hungarian method)."""
+    n, m = len(cost), len(cost[0])
+    INF = float("inf")
+    u, v = [0.0]*(n+1), [0.0]*(m+1)
+    p, way = [0]*(m+1), [0]*(m+1)  # p[j]: row assigned to column j (1-based, 0 = none)
+    for i in range(1, n+1):
+        p[0] = i
+        j0 = 0
+        minv, used = [INF]*(m+1), [False]*(m+1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = p[j0], INF, 0
+            row = cost[i0-1]
+            for j in range(1, m+1):
+                if not used[j]:
+                    cur = row[j-1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j], way[j] = cur, j0
+                    if minv[j] < delta:
+                        delta, j1 = minv[j], j
+            for j in range(m+1):
+                if used[j]:
+                    u[p[j]] += delta; v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]; p[j0] = p[j1]; j0 = j1
+    return [(p[j]-1, j-1) for j in range(1, m+1) if p[j]]
+
+def _assign(wav_sec: List[float], pdf_sec: List[int], tol: float) -> List[Tuple[int, int, float]]:
+    """
+    Pair WAVs with PDF tracks within tol seconds, maximising the number of pairs and then
+    minimising their total |duration| error; returns (wav, pdf, error) triples.
+    """
+    # an out-of-window pair costs more than any set of in-window pairs, so it is only used when unavoidable
+    penalty = tol * (min(len(wav_sec), len(pdf_sec)) + 1) + 1
+    np, linear_sum_assignment = _accelerators() if len(wav_sec) * len(pdf_sec) >= _ACCEL_MIN_CELLS else (None, None)
+    if np is not None:
+        err = np.abs(np.asarray(wav_sec, dtype=float)[:, None] - np.asarray(pdf_sec, dtype=float)[None, :])
+        cost = np.where(err > tol, penalty, err)
+        if linear_sum_assignment is not None:
+            rows, cols = linear_sum_assignment(cost)
+            pairs = zip(rows.tolist(), cols.tolist())
+        else:
+            pairs = _solve(cost.tolist())
+        err = err.tolist()
+    else:
+        err = [[abs(w - p) for p in pdf_sec] for w in wav_sec]
+        pairs = _solve([[e if e <= tol else penalty for e in row] for row in err])
+    return [(r, c, err[r][c]) for r, c in pairs if err[r][c] <= tol]
+
+def _solve(cost: List[List[float]]) -> List[Tuple[int, int]]:
+    if len(cost) <= len(cost[0]):
+        return _hungarian(cost)
+    return [(r, c) for c, r in _hungarian([list(col) for col in zip(*cost)])]
+
+def match_tracks(pdf_tracks: SideTracklist, wav: WavAnalysis, logger, pair_id: str,
+                 infer_tolerance_sec: Optional[float] = None) -> List[MatchedTrack]:
+    """
+    Match PDF tracks with WAVs by (side, position) in one indexed pass.
+
+    With infer_tolerance_sec set, WAVs whose names carry no side/position are assigned
+    to still unmatched PDF tracks by minimising the total duration error (optimal
+    assignment over pairs within the tolerance). Such matches are marked `inferred`.
+    """
     pos_idx: Dict[Tuple[str,int], WavInfo] = {}
     side_only: Dict[str, List[WavInfo]] = {}
+    unlabelled: List[WavInfo] = []
     for w in wav.items:
         if w.side and w.position is not None:
             k=(w.side, int(w.position))
@@ -16,16 +103,34 @@ def match_tracks(pdf_tracks: SideTracklist, wav: WavAnalysis, logger, pair_id: s
         elif w.side and w.position is None:
             side_only.setdefault(w.side, []).append(w)
         else:
-            logger.warn("unmatchable_wav","match",pair_id,"WAV lacks side/position",w.model_dump())
+            unlabelled.append(w)
 
     out: List[MatchedTrack] = []
+    pdf_keys = set()
     for side, tracks in pdf_tracks.sides.items():
         for t in sorted(tracks, key=lambda x: x.position):
+            pdf_keys.add((side, t.position))
             w = pos_idx.get((side, t.position))
             out.append(MatchedTrack(side=side, position=t.position, pdf=t, wav=w, is_fully_matched=bool(w)))
 
+    if unlabelled and infer_tolerance_sec is not None:
+        # a side delivered as one WAV is covered as a whole, its tracks are not open
+        open_tracks = [m for m in out if m.wav is None and m.side not in side_only]
+        if open_tracks:
+            taken = set()
+            for wi, ti, err in _assign([w.duration_sec for w in unlabelled], [m.pdf.duration_sec for m in open_tracks],
+                                       infer_tolerance_sec):
+                m, w = open_tracks[ti], unlabelled[wi]
+                m.wav, m.is_fully_matched, m.inferred = w, True, True
+                taken.add(wi)
+                logger.info("wav_inferred_match","match",pair_id,"WAV matched by duration",{
+                    "filename":w.filename,"side":m.side,"position":m.position,"error_sec":round(err, 3)})
+            unlabelled = [w for i, w in enumerate(unlabelled) if i not in taken]
+    for w in unlabelled:
+        logger.warn("unmatchable_wav","match",pair_id,"WAV lacks side/position",as_dict(w))
+
     for (s,p), w in pos_idx.items():
-        if not any(m.side==s and m.position==p for m in out):
+        if (s,p) not in pdf_keys:
             out.append(MatchedTrack(side=s, position=p, pdf=None, wav=w, is_fully_matched=False))
 
     for s, ws in side_only.items():
@@ -35,6 +140,7 @@ def match_tracks(pdf_tracks: SideTracklist, wav: WavAnalysis, logger, pair_id: s
 
     logger.info("track_matching_finish","match",pair_id,"Matching done",
                 {"matched":sum(1 for m in out if m.is_fully_matched),
+                 "inferred":sum(1 for m in out if m.inferred),
                  "pdf_missing":sum(1 for m in out if m.wav is None and m.pdf is not None),
                  "wav_extra":sum(1 for m in out if m.pdf is None and m.wav is not None)})
-    return out
\ No newline at end of file
+    return out
@@ -1,18 +1,33 @@
 # 08_comparator.py
 from __future__ import annotations
 from typing import List, Dict
-from m03_models import SideTracklist, WavAnalysis, MatchedTrack, ComparisonItem, ComparisonResult
+from m03_models import SideTracklist, WavAnalysis, MatchedTrack, ComparisonItem, ComparisonResult, as_dict
 
 def compare_pair(pdf_tracks: SideTracklist, wav: WavAnalysis, matched: List[MatchedTrack],
-                 warn_sec: int, fail_sec: int, logger, pair_id: str) -> ComparisonResult:
+                 warn_sec: int, fail_sec: int, logger, pair_id: str, use_effective: bool = False) -> ComparisonResult:
+    """
+    Compare per-side totals of the cue sheet and the WAVs. With use_effective, sides that
+    have a level scan are compared by effective length (leading/trailing silence removed).
+    """
     pdf_totals = {s: sum(t.duration_sec for t in tracks) for s, tracks in pdf_tracks.sides.items()}
     wav_totals: Dict[str,int] = {}
+    trimmed: Dict[str,int] = {}
     for s, mode in wav.per_side_mode.items():
         if mode.mode == "side":
-            wav_totals[s] = int(round(mode.total_duration_sec))
+            total = mode.total_duration_sec
         else:
-            wav_totals[s] = int(round(sum(m.wav.duration_sec for m in matched
-                                          if m.side==s and m.pdf is not None and m.wav is not None and not m.side_consolidated)))
+            total = sum(m.wav.duration_sec for m in matched
+                        if m.side==s and m.pdf is not None and m.wav is not None and not m.side_consolidated)
+        if use_effective and mode.effective_duration_sec is not None:
+            edge = mode.total_duration_sec - mode.effective_duration_sec
+            trimmed[s] = int(round(edge))
+            total = max(total - edge, 0.0)
+        wav_totals[s] = int(round(total))
+    # sides whose WAVs were all unlabelled and matched by duration have no side mode
+    for m in matched:
+        if m.inferred and m.side not in wav.per_side_mode:
+            wav_totals[m.side] = wav_totals.get(m.side, 0) + m.wav.duration_sec
+    wav_totals = {s: int(round(t)) for s, t in wav_totals.items()}
 
     all_sides = set(pdf_totals.keys()) | set(wav_totals.keys())
     out: List[ComparisonItem] = []
@@ -25,7 +40,8 @@ def compare_pair(pdf_tracks: SideTracklist, wav: WavAnalysis, matched: List[Matc
             delta = wav_t - pdf_t
             ad = abs(delta)
             status = "OK" if ad==0 else ("WARN" if ad<=warn_sec else ("FAIL" if ad>fail_sec else "WARN"))
-            item = ComparisonItem(side=s, pdf_total_sec=pdf_t, wav_total_sec=wav_t, delta_sec=delta, status=status)
-        logger.info("comparison_result","compare",pair_id,"Side result",item.model_dump())
+            item = ComparisonItem(side=s, pdf_total_sec=pdf_t, wav_total_sec=wav_t, delta_sec=delta, status=status,
+                                  silence_trimmed_sec=trimmed.get(s))
+        logger.info("comparison_result","compare",pair_id,"Side result",as_dict(item))
         out.append(item)
     return ComparisonResult(pair_id=pair_id, per_side=out)
\ No newline at end of file
@@ -1,21 +1,28 @@
 # 09_export.py
 from __future__ import annotations
 from pathlib import Path
-import json, csv
-from typing import List, Dict
-from m03_models import SideTracklist, WavAnalysis, MatchedTrack, ComparisonResult, BatchSummary
-from m10_utils import ensure_dir
+import argparse, json, csv, sqlite3, sys, threading
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Set, Tuple
+from m02_config import Config
+from m03_models import (SideTracklist, TrackInfo, WavAnalysis, WavInfo, WavSideMode, MatchedTrack,
+                        ComparisonItem, ComparisonResult, BatchSummary, PairingItem, as_dict)
+from m10_utils import ensure_dir, summarize_rows
 
 def save_tracklist_json(pair_dir: Path, tracklist: SideTracklist):
-    (pair_dir/"tracklist.json").write_text(tracklist.model_dump_json(indent=2), encoding="utf-8")
+    (pair_dir/"tracklist.json").write_text(json.dumps(as_dict(tracklist), ensure_ascii=False, indent=2), encoding="utf-8")
 
 def save_matched_json(pair_dir: Path, items: List[MatchedTrack]):
-    (pair_dir/"matched_tracks.json").write_text(json.dumps([m.model_dump() for m in items], ensure_ascii=False, indent=2), encoding="utf-8")
+    (pair_dir/"matched_tracks.json").write_text(json.dumps(as_dict(items), ensure_ascii=False, indent=2), encoding="utf-8")
 
 def save_wav_analysis_json(pair_dir: Path, wav_analysis: WavAnalysis):
     """Save WAV analysis data to wav_analysis.json file"""
     wav_dir = ensure_dir(pair_dir/"wav")
-    (wav_dir/"wav_analysis.json").write_text(wav_analysis.model_dump_json(indent=2), encoding="utf-8")
+    (wav_dir/"wav_analysis.json").write_text(json.dumps(as_dict(wav_analysis), ensure_ascii=False, indent=2), encoding="utf-8")
+
+def save_compare_json(pair_dir: Path, comp: ComparisonResult):
+    cdir = ensure_dir(pair_dir/"compare")
+    (cdir/"compare.json").write_text(comp.model_dump_json(indent=2), encoding="utf-8")
 
 def write_pair_csv(pair_dir: Path, comp: ComparisonResult):
     cdir = ensure_dir(pair_dir/"compare")
@@ -25,9 +32,27 @@ def write_pair_csv(pair_dir: Path, comp: ComparisonResult):
         for it in comp.per_side:
             w.writerow([it.side,it.pdf_total_sec,it.wav_total_sec,it.delta_sec,it.status,it.reason or ""])
 
-def write_batch_files(run_dir: Path, index_rows: List[Dict], summary: BatchSummary) -> str:
+def write_stage_files(run_dir: Path, stage_rows: List[Dict]) -> str:
+    """Write the per-stage timing table (stages.json/.csv/.txt) and return it as text"""
+    (run_dir/"stages.json").write_text(json.dumps(stage_rows, ensure_ascii=False, indent=2), encoding="utf-8")
+    cols = ["stage","count","total_ms","p50_ms","p95_ms","max_ms"]
+    with (run_dir/"stages.csv").open("w", encoding="utf-8", newline="\r\n") as f:
+        w=csv.writer(f); w.writerow(cols)
+        for r in stage_rows: w.writerow([r[c] for c in cols])
+    head = f"{'STAGE':<16} {'COUNT':>6} {'TOTAL_MS':>12} {'P50_MS':>10} {'P95_MS':>10} {'MAX_MS':>10}"
+    lines=[head,"-"*len(head)]
+    for r in stage_rows:
+        lines.append(f"{r['stage']:<16} {r['count']:>6} {r['total_ms']:>12} {r['p50_ms']:>10} {r['p95_ms']:>10} {r['max_ms']:>10}")
+    table = "\n".join(lines)
+    (run_dir/"stages.txt").write_text(table.replace("\n","\r\n"), encoding="utf-8")
+    return table
+
+def write_batch_files(run_dir: Path, index_rows: List[Dict], summary: BatchSummary,
+                      stage_rows: Optional[List[Dict]] = None) -> str:
     run_dir = ensure_dir(run_dir)
     (run_dir/"summary.json").write_text(summary.model_dump_json(indent=2), encoding="utf-8")
+    if stage_rows:
+        write_stage_files(run_dir, stage_rows)
     with (run_dir/"summary.csv").open("w", encoding="utf-8", newline="\r\n") as f:
         w=csv.writer(f); w.writerow(["pair_id","sides_total","ok","warn","fail","worst_delta"])
         for r in index_rows: w.writerow([r["pair_id"],r["sides_total"],r["ok"],r["warn"],r["fail"],r["worst_delta"]])
@@ -41,4 +66,244 @@ def write_batch_files(run_dir: Path, index_rows: List[Dict], summary: BatchSumma
     lines.append(f"{'TOTALS':<16} {summary.sides_total:>5} {summary.ok:>4} {summary.warn:>5} {summary.fail:>5} {'':>12}")
     table = "\n".join(lines)
     (run_dir/"summary.txt").write_text(table.replace("\n","\r\n"), encoding="utf-8")
-    return table
\ No newline at end of file
+    return table
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_tag TEXT PRIMARY KEY, started_at TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS pairs (
+    run_tag TEXT NOT NULL, pair_id TEXT NOT NULL, pdf_path TEXT, zip_path TEXT, finished_at TEXT NOT NULL,
+    sides_total INTEGER, ok INTEGER, warn INTEGER, fail INTEGER, worst_delta INTEGER,
+    PRIMARY KEY (run_tag, pair_id));
+CREATE INDEX IF NOT EXISTS pairs_finished ON pairs(finished_at);
+CREATE INDEX IF NOT EXISTS pairs_pair ON pairs(pair_id);
+CREATE TABLE IF NOT EXISTS sides (
+    run_tag TEXT NOT NULL, pair_id TEXT NOT NULL, side TEXT NOT NULL,
+    pdf_total_sec INTEGER, wav_total_sec INTEGER, delta_sec INTEGER, status TEXT NOT NULL, reason TEXT,
+    silence_trimmed_sec INTEGER, wav_mode TEXT, wav_total_duration_sec REAL, wav_effective_duration_sec REAL,
+    PRIMARY KEY (run_tag, pair_id, side));
+CREATE INDEX IF NOT EXISTS sides_status ON sides(status);
+CREATE TABLE IF NOT EXISTS tracks (
+    run_tag TEXT NOT NULL, pair_id TEXT NOT NULL, seq INTEGER NOT NULL, side TEXT NOT NULL, position INTEGER,
+    title TEXT, pdf_duration_sec INTEGER, wav_filename TEXT, wav_duration_sec REAL,
+    is_fully_matched INTEGER, side_consolidated INTEGER, inferred INTEGER,
+    PRIMARY KEY (run_tag, pair_id, seq));
+CREATE INDEX IF NOT EXISTS tracks_pair ON tracks(pair_id);
+CREATE TABLE IF NOT EXISTS wav_items (
+    run_tag TEXT NOT NULL, pair_id TEXT NOT NULL, seq INTEGER NOT NULL, filename TEXT NOT NULL,
+    duration_sec REAL, side TEXT, position INTEGER, effective_duration_sec REAL,
+    leading_silence_sec REAL, trailing_silence_sec REAL, peak_dbfs REAL,
+    PRIMARY KEY (run_tag, pair_id, seq));
+CREATE INDEX IF NOT EXISTS wav_items_pair ON wav_items(pair_id);
+CREATE INDEX IF NOT EXISTS wav_items_filename ON wav_items(filename);
+"""
+_TABLES = ("pairs", "sides", "tracks", "wav_items")
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+class ResultsStore:
+    """
+    SQLite results backend: all pairs of all runs in one database with indexed tables
+    for pairs, sides, matched tracks and WAV items.
+
+    Pairs are buffered and written in one transaction per `batch_size` pairs (and on
+    flush/close); a pair written again replaces its previous rows. Safe to share
+    between the pair worker threads.
+    """
+    def __init__(self, path: Path, batch_size: int = 50):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, str, Dict[str, List[tuple]]]] = []
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        # rollback journal, not WAL: WAL needs shared-memory locking, which network shares lack
+        self._db.execute("PRAGMA journal_mode=DELETE")
+        self._db.executescript(_SCHEMA)
+
+    def start_run(self, run_tag: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO runs VALUES (?, ?)", (run_tag, _now()))
+
+    def add_pair(self, run_tag: str, pair_item: PairingItem, wav: WavAnalysis,
+                 matched: List[MatchedTrack], comp: ComparisonResult) -> None:
+        key = (run_tag, pair_item.pair_id)
+        c = comp.counts
+        worst = max((abs(it.delta_sec) for it in comp.per_side), default=0)
+        modes = wav.per_side_mode
+        rows = {
+            "pairs": [key + (pair_item.pdf, pair_item.zip, _now(), c["sides_total"], c["ok"], c["warn"], c["fail"], worst)],
+            "sides": [key + (it.side, it.pdf_total_sec, it.wav_total_sec, it.delta_sec, it.status, it.reason,
+                             it.silence_trimmed_sec, *((modes[it.side].mode, modes[it.side].total_duration_sec,
+                                                        modes[it.side].effective_duration_sec) if it.side in modes else (None,)*3))
+                      for it in comp.per_side],
+            "tracks": [key + (i, m.side, m.position, m.pdf.title if m.pdf else None, m.pdf.duration_sec if m.pdf else None,
+                              m.wav.filename if m.wav else None, m.wav.duration_sec if m.wav else None,
+                              int(m.is_fully_matched), int(m.side_consolidated), int(m.inferred))
+                       for i, m in enumerate(matched)],
+            "wav_items": [key + (i, w.filename, w.duration_sec, w.side, w.position, w.effective_duration_sec,
+                                 w.leading_silence_sec, w.trailing_silence_sec, w.peak_dbfs)
+                          for i, w in enumerate(wav.items)],
+        }
+        with self._lock:
+            self._pending.append(key + (rows,))
+            if len(self._pending) >= self.batch_size:
+                self._write()
+
+    def _write(self) -> None:
+        # caller holds self._lock
+        if not self._pending:
+            return
+        with self._db:
+            for table in _TABLES:
+                self._db.executemany(f"DELETE FROM {table} WHERE run_tag=? AND pair_id=?", [(r, p) for r, p, _ in self._pending])
+            for table in _TABLES:
+                batch = [row for _, _, rows in self._pending for row in rows[table]]
+                if batch:
+                    marks = ",".join("?" * len(batch[0]))
+                    self._db.executemany(f"INSERT INTO {table} VALUES ({marks})", batch)
+        self._pending.clear()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._write()
+
+    def close(self) -> None:
+        with self._lock:
+            self._write()
+            self._db.close()
+
+    def pair_ids(self, run_tag: str) -> Set[str]:
+        self.flush()
+        with self._lock:
+            return {r[0] for r in self._db.execute("SELECT pair_id FROM pairs WHERE run_tag=?", (run_tag,))}
+
+    def latest_run(self) -> Optional[str]:
+        with self._lock:
+            r = self._db.execute("SELECT run_tag FROM runs ORDER BY started_at DESC, run_tag DESC LIMIT 1").fetchone()
+        return r[0] if r else None
+
+    def summary_rows(self, run_tag: str) -> List[Dict]:
+        """The run's per-pair summary rows (the `_batch` summary index) in the order they were stored."""
+        self.flush()
+        cols = ["pair_id", "sides_total", "ok", "warn", "fail", "worst_delta"]
+        with self._lock:
+            return [dict(zip(cols, r)) for r in self._db.execute(
+                f"SELECT {','.join(cols)} FROM pairs WHERE run_tag=? ORDER BY rowid", (run_tag,))]
+
+    def copy_pair(self, from_run: str, to_run: str, pair_id: str) -> Optional[ComparisonResult]:
+        """Copy a pair's rows from an earlier run (incremental reuse); None if it is not stored."""
+        self.flush()
+        with self._lock, self._db:
+            if self._db.execute("SELECT 1 FROM pairs WHERE run_tag=? AND pair_id=?", (from_run, pair_id)).fetchone() is None:
+                return None
+            for table in _TABLES:
+                cols = [r[1] for r in self._db.execute(f"PRAGMA table_info({table})")][1:]
+                self._db.execute(f"DELETE FROM {table} WHERE run_tag=? AND pair_id=?", (to_run, pair_id))
+                self._db.execute(f"INSERT INTO {table} SELECT ?, {','.join(cols)} FROM {table} WHERE run_tag=? AND pair_id=?",
+                                 (to_run, from_run, pair_id))
+            self._db.execute("UPDATE pairs SET finished_at=? WHERE run_tag=? AND pair_id=?", (_now(), to_run, pair_id))
+        return self.load_pair(to_run, pair_id)[3]
+
+    def load_pair(self, run_tag: str, pair_id: str) -> Tuple[SideTracklist, WavAnalysis, List[MatchedTrack], ComparisonResult]:
+        """Rebuild a pair's records (the inputs of the per-pair file export) from the database."""
+        self.flush()
+        key = (run_tag, pair_id)
+        with self._lock:
+            wavs = [WavInfo(*r) for r in self._db.execute(
+                "SELECT filename, duration_sec, side, position, effective_duration_sec, leading_silence_sec, trailing_silence_sec, "
+                "peak_dbfs FROM wav_items WHERE run_tag=? AND pair_id=? ORDER BY seq", key)]
+            sides = self._db.execute(
+                "SELECT side, pdf_total_sec, wav_total_sec, delta_sec, status, reason, silence_trimmed_sec, wav_mode, "
+                "wav_total_duration_sec, wav_effective_duration_sec FROM sides WHERE run_tag=? AND pair_id=? ORDER BY side", key).fetchall()
+            tracks = self._db.execute(
+                "SELECT side, position, title, pdf_duration_sec, wav_filename, wav_duration_sec, is_fully_matched, "
+                "side_consolidated, inferred FROM tracks WHERE run_tag=? AND pair_id=? ORDER BY seq", key).fetchall()
+        by_name = {w.filename: w for w in wavs}
+        tracklist = SideTracklist()
+        matched: List[MatchedTrack] = []
+        for side, pos, title, pdf_sec, wav_name, wav_sec, full, consolidated, inferred in tracks:
+            pdf = None
+            if title is not None:
+                pdf = TrackInfo(title, side, pos, pdf_sec)
+                tracklist.sides.setdefault(side, []).append(pdf)
+            w = None
+            if wav_name is not None:
+                # side-consolidated rows carry a synthetic WAV summing the side files
+                w = WavInfo(wav_name, wav_sec, side, None) if consolidated else by_name.get(wav_name) or WavInfo(wav_name, wav_sec)
+            matched.append(MatchedTrack(side, pos, pdf, w, bool(full), bool(consolidated), bool(inferred)))
+        modes = {r[0]: WavSideMode(r[0], r[7], r[8], r[9]) for r in sides if r[7] is not None}
+        comp = ComparisonResult(pair_id=pair_id, per_side=[ComparisonItem(*r[:7]) for r in sides])
+        return tracklist, WavAnalysis(wavs, modes), matched, comp
+
+_store: Optional[ResultsStore] = None
+_store_lock = threading.Lock()
+
+def get_results_store(cfg: Config) -> Optional[ResultsStore]:
+    """Return the process-wide SQLite store, or None when results go to files only."""
+    global _store
+    if cfg.results_backend not in ("sqlite", "both"):
+        return None
+    path = Path(cfg.results_db) if cfg.results_db else Path(cfg.out_root) / "results.sqlite"
+    with _store_lock:
+        if _store is None or _store.path != path:
+            _store = ResultsStore(path)
+        return _store
+
+def close_results_store() -> None:
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
+
+def export_run_files(db_path: Path, run_tag: str, out_run: Path) -> int:
+    """
+    Write the file layout of a stored run: per pair tracklist, WAV analysis, matches and
+    compare files, and the `_batch` summary (without the stage table, which is not stored).
+    Returns the pair count.
+    """
+    store = ResultsStore(db_path)
+    try:
+        rows = store.summary_rows(run_tag)
+        pair_ids = [r["pair_id"] for r in rows]
+        for pid in pair_ids:
+            tracklist, wav, matched, comp = store.load_pair(run_tag, pid)
+            pair_dir = ensure_dir(Path(out_run) / pid)
+            save_tracklist_json(pair_dir, tracklist)
+            save_wav_analysis_json(pair_dir, wav)
+            save_matched_json(pair_dir, matched)
+            save_compare_json(pair_dir, comp)
+            write_pair_csv(pair_dir, comp)
+        if rows:
+            write_batch_files(Path(out_run)/"_batch", rows, summarize_rows(rows))
+        return len(pair_ids)
+    finally:
+        store.close()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """`python m09_export.py --db results.sqlite [--run-tag RUN_...] [--out DIR]`: export a stored run as files."""
+    p = argparse.ArgumentParser(description="Export a run stored in the SQLite results database as per-pair files")
+    p.add_argument("--db", required=True, help="SQLite results database (--results-db of the run)")
+    p.add_argument("--run-tag", default=None, help="Run to export (default: the latest run in the database)")
+    p.add_argument("--out", default=None, help="Output run directory (default: <db dir>/<run tag>)")
+    a = p.parse_args(argv)
+    db = Path(a.db)
+    if not db.is_file():
+        print("ERROR: --db neexistuje.", file=sys.stderr); return 2
+    store = ResultsStore(db)
+    try:
+        run_tag = a.run_tag or store.latest_run()
+        known = run_tag is not None and bool(store.pair_ids(run_tag))
+    finally:
+        store.close()
+    if not known:
+        print("ERROR: běh v databázi nenalezen.", file=sys.stderr); return 2
+    out_run = Path(a.out) if a.out else db.parent / run_tag
+    n = export_run_files(db, run_tag, out_run)
+    print(f"{run_tag}: {n} pairs -> {out_run}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,71 +1,189 @@
 # 10_utils.py
 from __future__ import annotations
-import json, sys, traceback
+import atexit, json, queue, sys, threading, traceback
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Optional, Dict, List
 from m02_config import Config
-from m03_models import PairingItem, SideTracklist, WavAnalysis, MatchedTrack, ComparisonResult
-from m05_pdf_extractor import extract_pdf_tracklist
-from m06_wav_analyzer import analyze_zip
-from m07_track_matcher import match_tracks
-from m08_comparator import compare_pair
-from m09_export import save_tracklist_json, save_matched_json, save_compare_json, write_pair_csv, save_wav_analysis_json
+from m03_models import PairingItem, WavAnalysis, MatchedTrack, ComparisonResult, BatchSummary
+from m17_spans import StageStats, span
 
 def make_run_tag() -> str:
     return "RUN_" + datetime.now().strftime("%Y%m%d_%H%M%S")
 
+LEVELS = {"INFO": 20, "WARN": 30, "ERROR": 40, "CRITICAL": 50}
+
 class JsonLogger:
-    def __init__(self, run_tag: str, log_file: Optional[str] = None):
+    """
+    JSON-lines logger. Records are serialised when they are logged, so callers may
+    reuse or change their data dict afterwards; by default the lines are handed to a
+    background writer thread that writes them in batches (one flush per batch), so
+    hot loops do not wait for I/O. `critical`, `flush` and `close` (also run at exit)
+    block until everything queued so far has been written.
+    """
+    def __init__(self, run_tag: str, log_file: Optional[str] = None, min_level: str = "INFO",
+                 echo: bool = True, buffered: bool = True, batch_size: int = 256):
         self.run_tag = run_tag
         self._fh = open(log_file, "a", encoding="utf-8") if log_file else None
+        self._lock = threading.Lock()  # orders the writer thread's batches with direct writes and close
+        self.stages = StageStats()
+        self.min_level = LEVELS[min_level.upper()]
+        self.echo = echo
+        self._batch_size = max(1, batch_size)
+        self._queue: Optional[queue.SimpleQueue] = None
+        self._writer: Optional[threading.Thread] = None
+        if buffered:
+            self._queue = queue.SimpleQueue()
+            self._writer = threading.Thread(target=self._run_writer, name="json-logger", daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+
+    def _format(self, rec: Dict) -> str:
+        return json.dumps(rec, ensure_ascii=False, default=str)
+
+    def _write(self, lines: List[str]) -> None:
+        text = "\n".join(lines) + "\n"
+        with self._lock:
+            if self.echo:
+                sys.stdout.write(text); sys.stdout.flush()
+            if self._fh:
+                self._fh.write(text); self._fh.flush()
+
+    def _run_writer(self) -> None:
+        stop = False
+        while not stop:
+            items = [self._queue.get()]
+            while len(items) < self._batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines, done = [], []
+            for it in items:
+                if it is None:
+                    stop = True
+                elif isinstance(it, threading.Event):
+                    done.append(it)
+                else:
+                    lines.append(it)
+            if lines:
+                try:
+                    self._write(lines)
+                except Exception as e:  # never let the writer die silently
+                    print(f"JsonLogger write failed: {e}", file=sys.stderr)
+            for ev in done:
+                ev.set()
 
     def _emit(self, level, event, module, pair_id, message, data: Any=None):
+        if LEVELS[level] < self.min_level:
+            return
         rec = {
             "timestamp": datetime.utcnow().isoformat(timespec="milliseconds")+"Z",
             "level": level, "event": event, "run_tag": self.run_tag,
             "pair_id": pair_id, "module": module, "message": message, "data": data or {}
         }
-        line = json.dumps(rec, ensure_ascii=False)
-        print(line)
-        if self._fh:
-            self._fh.write(line+"\n"); self._fh.flush()
+        line = self._format(rec)
+        if self._queue is not None and self._writer.is_alive():
+            self._queue.put(line)
+        else:
+            self._write([line])
+
+    def flush(self, timeout: Optional[float] = 10.0) -> None:
+        """Block until all records queued before this call are written."""
+        if self._queue is not None and self._writer.is_alive():
+            ev = threading.Event()
+            self._queue.put(ev)
+            ev.wait(timeout)
+
+    def close(self) -> None:
+        atexit.unregister(self.close)  # the registration would keep the logger alive
+        if self._queue is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(10.0)
+        with self._lock:
+            if self._fh:
+                self._fh.close(); self._fh = None
 
     def info(self, *a, **k): self._emit("INFO", *a, **k)
     def warn(self, *a, **k): self._emit("WARN", *a, **k)
     def error(self, *a, **k): self._emit("ERROR", *a, **k)
-    def critical(self, *a, **k): self._emit("CRITICAL", *a, **k)
+    def critical(self, *a, **k): self._emit("CRITICAL", *a, **k); self.flush()
+
+    def span(self, stage: str, module: str, pair_id: Optional[str]):
+        """Context manager timing a stage; see m17_spans.span."""
+        return span(self, self.stages, stage, module, pair_id)
 
 def ensure_dir(p: Path) -> Path:
     p.mkdir(parents=True, exist_ok=True); return p
 
 def run_pipeline_for_pair(pair_item: PairingItem, cfg: Config, out_run: Path, logger: JsonLogger) -> ComparisonResult:
     """Centralized pipeline orchestration function that coordinates all steps and exports"""
-    # Create output directories
-    dirs = make_pair_dirs(out_run, pair_item.pair_id)
+    # imported here because m09_export itself depends on this module (ensure_dir), and so that
+    # the pipeline stages (fitz, PIL, httpx, ...) load with the first pair, not with the logger
+    from m05_pdf_extractor import extract_pdf_tracklist
+    from m06_wav_analyzer import SilenceOptions, analyze_zip
+    from m07_track_matcher import match_tracks
+    from m08_comparator import compare_pair
+    from m09_export import (save_tracklist_json, save_matched_json, save_compare_json, write_pair_csv,
+                            save_wav_analysis_json, get_results_store)
 
-    # Step 1: PDF Extraction
-    tracklist = extract_pdf_tracklist(Path(pair_item.pdf), cfg, logger, pair_item.pair_id)
-    save_tracklist_json(dirs["base"], tracklist)
+    pid = pair_item.pair_id
+    files = cfg.results_backend in ("files", "both")
+    with logger.span("pair", "pipeline", pid):
+        # Create output directories (per-pair files only; the SQLite backend needs none).
+        # Each artefact is written as soon as it exists, and each write has its own stage,
+        # so a stage's count/p50/p95 describe one write per pair.
+        dirs = make_pair_dirs(out_run, pid) if files else None
 
-    # Step 2: WAV Analysis
-    if pair_item.zip:
-        wav = analyze_zip(Path(pair_item.zip), logger, pair_item.pair_id)
-    else:
-        wav = WavAnalysis(items=[])
+        # Step 1: PDF Extraction
+        with logger.span("extract", "extract", pid):
+            tracklist = extract_pdf_tracklist(Path(pair_item.pdf), cfg, logger, pid)
+        if files:
+            with logger.span("export_tracklist", "export", pid):
+                save_tracklist_json(dirs["base"], tracklist)
 
-    save_wav_analysis_json(dirs["base"], wav)
+        # Step 2: WAV Analysis
+        with logger.span("wav_analysis", "audio", pid):
+            if pair_item.zip:
+                silence = (SilenceOptions(cfg.silence_threshold_dbfs, cfg.silence_window_ms)
+                           if cfg.silence_analysis or cfg.compare_effective_length else None)
+                wav = analyze_zip(Path(pair_item.zip), logger, pid, cfg.wav_probe_workers, silence)
+            else:
+                wav = WavAnalysis(items=[])
+        if files:
+            with logger.span("export_wav", "export", pid):
+                save_wav_analysis_json(dirs["base"], wav)
 
-    # Step 3: Track Matching
-    matched: List[MatchedTrack] = match_tracks(tracklist, wav, logger, pair_item.pair_id)
-    save_matched_json(dirs["base"], matched)
+        # Step 3: Track Matching
+        with logger.span("match", "match", pid):
+            matched: List[MatchedTrack] = match_tracks(tracklist, wav, logger, pid,
+                                                       cfg.tolerance_fail if cfg.infer_unlabelled_wavs else None)
+        if files:
+            with logger.span("export_matched", "export", pid):
+                save_matched_json(dirs["base"], matched)
 
-    # Step 4: Comparison
-    comp: ComparisonResult = compare_pair(tracklist, wav, matched, cfg.tolerance_warn, cfg.tolerance_fail, logger, pair_item.pair_id)
-    save_compare_json(dirs["base"], comp)
-    write_pair_csv(dirs["base"], comp)
+        # Step 4: Comparison
+        with logger.span("compare", "compare", pid):
+            comp: ComparisonResult = compare_pair(tracklist, wav, matched, cfg.tolerance_warn, cfg.tolerance_fail, logger, pid,
+                                                   cfg.compare_effective_length)
+        with logger.span("export_result", "export", pid):
+            if files:
+                save_compare_json(dirs["base"], comp)
+                write_pair_csv(dirs["base"], comp)
+            store = get_results_store(cfg)
+            if store is not None:
+                store.add_pair(out_run.name, pair_item, wav, matched, comp)
     return comp
 
+def summarize_rows(rows: List[Dict]) -> BatchSummary:
+    return BatchSummary(
+        pairs_total=len(rows),
+        sides_total=sum(r["sides_total"] for r in rows),
+        ok=sum(r["ok"] for r in rows),
+        warn=sum(r["warn"] for r in rows),
+        fail=sum(r["fail"] for r in rows),
+    )
+
 def make_pair_dirs(out_run: Path, pair_id: str) -> dict[str, Path]:
     base = ensure_dir(out_run / pair_id)
     return {
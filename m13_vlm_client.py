@@ -0,0 +1,196 @@
+# 13_vlm_client.py
+from __future__ import annotations
+import base64, threading, weakref
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterator, List, Optional, Union
+from urllib.parse import urlsplit
+from m02_config import Config
+from m17_spans import add_metric
+from m23_rate_control import RateController
+
+# httpx (and asyncio for the async client) load when the first client is created
+if TYPE_CHECKING:
+    import asyncio, httpx
+
+def _count(r: "httpx.Response") -> None:
+    add_metric("vlm_requests")
+    add_metric("vlm_request_bytes", int(r.request.headers.get("Content-Length", 0)))
+    add_metric("vlm_response_bytes", len(r.content))
+
+class JsonBody:
+    """
+    JSON request body written while it is sent: static JSON text (str parts) interleaved
+    with binary blobs (bytes parts) that become base64 string content. Blobs are encoded
+    slice by slice, so no base64 copy of a page exists in full; the exact length is known
+    up front and sent as Content-Length. Every chunks()/achunks() call starts a fresh
+    pass, so a retried request re-sends the same body.
+    """
+    SLICE = 3 * 64 * 1024  # multiple of 3: base64 slices concatenate without padding
+
+    def __init__(self, parts: List[Union[str, bytes]]):
+        self.parts = [p.encode("utf-8") if isinstance(p, str) else p for p in parts]
+        self.blob = [not isinstance(p, str) for p in parts]
+        self.length = sum(4 * -(-len(p) // 3) if b else len(p) for p, b in zip(self.parts, self.blob))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def chunks(self) -> Iterator[bytes]:
+        for p, b in zip(self.parts, self.blob):
+            if not b:
+                yield p
+                continue
+            view = memoryview(p)
+            for i in range(0, len(p), self.SLICE):
+                yield base64.b64encode(view[i:i+self.SLICE])
+
+    async def achunks(self) -> AsyncIterator[bytes]:
+        for chunk in self.chunks():
+            yield chunk
+
+def _request_kwargs(payload: Union[dict, JsonBody], headers: Optional[dict], stream: bool) -> dict:
+    if not isinstance(payload, JsonBody):
+        return {"json": payload, "headers": headers}
+    return {"content": payload.achunks() if stream else payload.chunks(),
+            "headers": {**(headers or {}), "Content-Type": "application/json", "Content-Length": str(len(payload))}}
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (installed via httpx[http2])
+        return True
+    except ImportError:
+        return False
+
+class VlmClient:
+    """
+    Pooled HTTP transport shared by all VLM calls of a run.
+
+    Holds one keep-alive `httpx.Client` for worker threads and one `httpx.AsyncClient`
+    for event loops, both created lazily. Every request of a run goes through the
+    RateController of its endpoint (host), which admits requests within the adaptive
+    concurrency window (at most max_in_flight) and the optional rate cap, and retries
+    429/5xx/transport errors honouring Retry-After. Each event loop gets its own async
+    client; `run` executes a coroutine from a worker thread on a background loop owned
+    by the client (used to race providers with real cancellation from sync code).
+    """
+    def __init__(self, timeout_s: float = 90, max_in_flight: int = 8, http2: bool = True,
+                 rate_per_s: float = 0.0, max_attempts: int = 6):
+        self.timeout_s = timeout_s
+        self.max_in_flight = max(1, max_in_flight)
+        self.http2 = http2 and _http2_available()
+        self.rate_per_s = rate_per_s
+        self.max_attempts = max_attempts
+        self._client: Optional[httpx.Client] = None
+        self._aclients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self._loop: Optional["asyncio.AbstractEventLoop"] = None
+        self._rates: Dict[str, RateController] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg: Config) -> "VlmClient":
+        return cls(timeout_s=cfg.vlm_timeout_s, max_in_flight=cfg.vlm_max_in_flight, http2=cfg.vlm_http2,
+                   rate_per_s=cfg.vlm_rate_per_s, max_attempts=cfg.vlm_max_attempts)
+
+    def rate_for(self, endpoint: str) -> RateController:
+        u = urlsplit(endpoint)
+        key = f"{u.scheme}://{u.netloc}"
+        with self._lock:
+            if key not in self._rates:
+                self._rates[key] = RateController(self.max_in_flight, self.rate_per_s, self.max_attempts)
+            return self._rates[key]
+
+    @property
+    def rate_stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            rates = dict(self._rates)
+        return {k: r.stats for k, r in rates.items()}
+
+    def _limits(self) -> "httpx.Limits":
+        import httpx
+        return httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight)
+
+    @property
+    def client(self) -> "httpx.Client":
+        with self._lock:
+            if self._client is None:
+                import httpx
+                self._client = httpx.Client(timeout=self.timeout_s, limits=self._limits(), http2=self.http2)
+            return self._client
+
+    @property
+    def aclient(self) -> "httpx.AsyncClient":
+        import asyncio
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._aclients:
+                import httpx
+                self._aclients[loop] = httpx.AsyncClient(timeout=self.timeout_s, limits=self._limits(), http2=self.http2)
+            return self._aclients[loop]
+
+    def run(self, coro):
+        """Run a coroutine on the client's background event loop and return its result."""
+        import asyncio
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="vlm-loop", daemon=True).start()
+            loop = self._loop
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def post_json(self, endpoint: str, payload: Union[dict, JsonBody], headers: Optional[dict] = None) -> dict:
+        import httpx
+        client = self.client
+        def send() -> "httpx.Response":
+            r = client.post(endpoint, **_request_kwargs(payload, headers, False))
+            _count(r)
+            return r
+        r = self.rate_for(endpoint).call(send, (httpx.TransportError,))
+        r.raise_for_status()
+        return r.json()
+
+    async def apost_json(self, endpoint: str, payload: Union[dict, JsonBody], headers: Optional[dict] = None) -> dict:
+        import httpx
+        client = self.aclient
+        async def send() -> "httpx.Response":
+            r = await client.post(endpoint, **_request_kwargs(payload, headers, True))
+            _count(r)
+            return r
+        r = await self.rate_for(endpoint).acall(send, (httpx.TransportError,))
+        r.raise_for_status()
+        return r.json()
+
+    def close(self) -> None:
+        with self._lock:
+            loop, self._loop = self._loop, None
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+        if loop is not None:
+            import asyncio
+            asyncio.run_coroutine_threadsafe(self.aclose(), loop).result(timeout=10)
+            loop.call_soon_threadsafe(loop.stop)
+
+    async def aclose(self) -> None:
+        """Close the async client of the running event loop."""
+        import asyncio
+        with self._lock:
+            client = self._aclients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+_shared: Optional[VlmClient] = None
+_shared_lock = threading.Lock()
+
+def get_shared_client(cfg: Config) -> VlmClient:
+    """Return the process-wide client for this run, creating it from cfg on first use."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = VlmClient.from_config(cfg)
+        return _shared
+
+def close_shared_client() -> None:
+    global _shared
+    with _shared_lock:
+        if _shared is not None:
+            _shared.close()
+            _shared = None
@@ -0,0 +1,102 @@
+# 14_vlm_cache.py
+from __future__ import annotations
+import hashlib, json, os, threading, time
+from pathlib import Path
+from typing import Dict, Optional
+from m02_config import Config
+
+_HASH_CHUNK = 1024 * 1024
+
+class VlmCache:
+    """
+    Content-addressed on-disk store for raw VLM JSON responses.
+
+    Entries live at `<root>/<key[:2]>/<key>.json`, where the key is a SHA-256 over the
+    PDF bytes and every setting that influences the VLM answer. A hit refreshes the
+    entry's mtime, so `evict` removes entries unused for longer than `max_age_s` and
+    then the least recently used ones until the store fits into `max_bytes`.
+    """
+    def __init__(self, root: Path, max_bytes: int, max_age_s: float):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(pdf_path: Path, params: Dict[str, object]) -> str:
+        h = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+                h.update(chunk)
+        h.update(json.dumps(params, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[dict]:
+        p = self._path(key)
+        try:
+            raw = json.loads(p.read_text(encoding="utf-8"))
+            os.utime(p)
+        except (OSError, ValueError):
+            raw = None
+        with self._lock:
+            if raw is None: self.misses += 1
+            else: self.hits += 1
+        return raw
+
+    def put(self, key: str, raw: dict) -> None:
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(raw, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, p)
+
+    def evict(self) -> Dict[str, int]:
+        """Apply age and size limits; returns counts of removed entries and remaining bytes."""
+        if not self.root.is_dir():
+            return {"removed": 0, "bytes": 0}
+        now = time.time()
+        entries = []
+        removed = 0
+        for p in self.root.glob("*/*.json"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            if self.max_age_s > 0 and now - st.st_mtime > self.max_age_s:
+                p.unlink(missing_ok=True); removed += 1
+            else:
+                entries.append((st.st_mtime, st.st_size, p))
+        total = sum(size for _, size, _ in entries)
+        if self.max_bytes > 0:
+            for _, size, p in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                p.unlink(missing_ok=True); removed += 1
+                total -= size
+        return {"removed": removed, "bytes": total}
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0}
+
+_shared: Optional[VlmCache] = None
+_shared_lock = threading.Lock()
+
+def get_shared_cache(cfg: Config) -> Optional[VlmCache]:
+    """Return the process-wide cache for this run, or None when caching is disabled."""
+    global _shared
+    if not cfg.vlm_cache_enabled:
+        return None
+    with _shared_lock:
+        if _shared is None or _shared.root != Path(cfg.vlm_cache_dir):
+            _shared = VlmCache(Path(cfg.vlm_cache_dir), cfg.vlm_cache_max_mb * 1024 * 1024,
+                               cfg.vlm_cache_max_age_days * 86400)
+        return _shared
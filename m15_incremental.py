@@ -0,0 +1,102 @@
+# 15_incremental.py
+from __future__ import annotations
+import hashlib, json, shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from m02_config import Config
+from m03_models import PairingItem, ComparisonResult
+from m24_provider_chain import resolve_chain
+
+FINGERPRINTS_FILE = "fingerprints.json"
+_HASH_CHUNK = 1024 * 1024
+
+# Config values that change a pair's result; anything else (paths, logging) does not
+_FINGERPRINT_CFG = ("tolerance_warn", "tolerance_fail", "model_name", "vlm_provider", "vlm_chain",
+                    "use_vlm_stub", "dpi", "max_pages", "image_format", "image_quality",
+                    "image_grayscale", "image_max_long_edge", "page_select", "page_crop",
+                    "page_scan_limit", "text_layer_enabled", "text_layer_min_confidence", "silence_analysis", "silence_threshold_dbfs",
+                    "silence_window_ms", "compare_effective_length", "infer_unlabelled_wavs")
+
+def _source_files(p: Path) -> List[Path]:
+    # a directory delivery is the set of WAVs below it
+    if p.is_dir():
+        return sorted(f for f in p.rglob("*") if f.suffix.lower() == ".wav" and f.is_file())
+    return [p]
+
+def path_state(path: str) -> Tuple[int, int, int]:
+    """(total size, newest mtime_ns, file count) of a file or of the WAVs of a directory delivery."""
+    size = mtime = count = 0
+    for f in _source_files(Path(path)):
+        st = f.stat()
+        size += st.st_size
+        mtime = max(mtime, st.st_mtime_ns)
+        count += 1
+    return size, mtime, count
+
+def _file_state(path: Optional[str], with_hash: bool) -> Optional[Dict]:
+    if not path:
+        return None
+    p = Path(path)
+    size, mtime, count = path_state(path)
+    state = {"path": str(p), "size": size, "mtime_ns": mtime}
+    if p.is_dir():
+        state["files"] = count
+    if with_hash:
+        h = hashlib.sha256()
+        for fp in _source_files(p):
+            if fp != p:
+                h.update(fp.relative_to(p).as_posix().encode("utf-8") + b"\0")
+            with open(fp, "rb") as f:
+                for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+                    h.update(chunk)
+        state["sha256"] = h.hexdigest()
+    return state
+
+def pair_fingerprint(pair_item: PairingItem, cfg: Config, with_hash: bool = False) -> str:
+    """
+    Fingerprint a pair's inputs (size, mtime, optional content hash) and result-relevant
+    config, including the resolved VLM endpoints (another model server = another result).
+    """
+    parts = {
+        "pdf": _file_state(pair_item.pdf, with_hash),
+        "zip": _file_state(pair_item.zip, with_hash),
+        "cfg": {k: getattr(cfg, k) for k in _FINGERPRINT_CFG},
+        "vlm": [[p.kind, p.endpoint] for p in resolve_chain(cfg)],
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+def load_fingerprints(run_dir: Path) -> Dict[str, str]:
+    p = run_dir / "_batch" / FINGERPRINTS_FILE
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def write_fingerprints(run_dir: Path, fingerprints: Dict[str, str]) -> None:
+    bdir = run_dir / "_batch"
+    bdir.mkdir(parents=True, exist_ok=True)
+    (bdir / FINGERPRINTS_FILE).write_text(json.dumps(fingerprints, indent=2, sort_keys=True), encoding="utf-8")
+
+def reuse_pair_result(prev_run: Path, out_run: Path, pair_id: str, store=None,
+                      write_files: bool = True) -> Optional[ComparisonResult]:
+    """
+    Copy a pair's artefacts from a previous run and return its ComparisonResult, or None if unusable.
+    With a results store the pair's rows are copied there; write_files copies the per-pair files.
+    """
+    comp = None
+    if store is not None:
+        comp = store.copy_pair(prev_run.name, out_run.name, pair_id)
+        if comp is None:
+            return None
+    if write_files:
+        src = prev_run / pair_id
+        comp_file = src / "compare" / "compare.json"
+        if not comp_file.is_file():
+            return None
+        try:
+            file_comp = ComparisonResult.model_validate_json(comp_file.read_text(encoding="utf-8"))
+        except ValueError:
+            return None
+        shutil.copytree(src, out_run / pair_id, dirs_exist_ok=True)
+        comp = comp or file_comp
+    return comp
@@ -0,0 +1,117 @@
+# 16_text_layer.py
+from __future__ import annotations
+from pathlib import Path
+import re, threading
+from typing import Dict, List, Optional, Tuple
+import fitz
+from m03_models import SideTracklist, TrackInfo, parse_mmss_to_seconds, Letter
+
+# PyMuPDF is not thread-safe: with --jobs every fitz call of the pipeline (text layer,
+# page plan, render) runs under this one lock; the VLM requests still overlap
+FITZ_LOCK = threading.Lock()
+
+# "Side A", "SIDE B:", "Strana A", "A-Side", "A Side"
+_SIDE_HDR = re.compile(r"^(?:(?:side|strana)\s*([A-Z])|([A-Z])\s*[-_ ]?\s*side)\b[\s:.\-]*$", re.IGNORECASE)
+# "A1 Title 04:12", "A 1. Title 04:12", "1. Title 04:12", "1) Title ... 4:12"
+_TRACK = re.compile(r"^(?:([A-Z])\s*)?([0-9]{1,2})[.)]?\s+(.+?)[\s.\-–]*\(?([0-9]{1,2}:[0-5][0-9])\)?$")
+_MMSS = re.compile(r"\b[0-9]{1,2}:[0-5][0-9]\b")
+# "Total 18:45", "Side A total 18:45", "Celkem strana B 20:10", "Running time 39:00"
+_TOTAL = re.compile(r"^(?:(?:side|strana)\s*([A-Z])\s+|([A-Z])\s*[-_ ]?\s*side\s+)?(?:total|celkem|side total|running time)\b"
+                    r"(?:\s+(?:side|strana)\s*([A-Z])\b)?", re.IGNORECASE)
+_TOTAL_TIME = re.compile(r"\b(?:([0-9]{1,2}):)?([0-9]{1,3}):([0-5][0-9])\b")  # totals may run past an hour
+# a side with fewer tracks may be a fragment (e.g. a typed header over a scanned list) unless a total confirms it
+_MIN_TRACKS_PER_SIDE = 3
+
+def _rows(page: "fitz.Page") -> List[str]:
+    """Rebuild visual rows from word boxes, so table-style layouts yield one row per track."""
+    words = sorted(page.get_text("words"), key=lambda w: ((w[1]+w[3])/2, w[0]))
+    rows: List[List[tuple]] = []
+    row_y = None
+    for w in words:
+        y, h = (w[1]+w[3])/2, w[3]-w[1]
+        if rows and row_y is not None and abs(y-row_y) <= h/2:
+            rows[-1].append(w)
+        else:
+            rows.append([w]); row_y = y
+    return [" ".join(w[4] for w in sorted(r, key=lambda w: w[0])) for r in rows]
+
+def parse_tracklist_lines(lines: List[str]) -> Tuple[SideTracklist, float]:
+    """
+    Parse text rows into a SideTracklist.
+
+    Returns the tracklist and a confidence in [0, 1]: the share of rows carrying an
+    MM:SS duration that parsed into tracks, zeroed when no track was found, halved
+    when positions on a side are duplicated or not a 1..n sequence, halved when a
+    side or grand total line disagrees with the track durations, and scaled by
+    n/_MIN_TRACKS_PER_SIDE for the smallest side that has fewer tracks and no
+    matching total.
+    """
+    sides: Dict[Letter, List[TrackInfo]] = {}
+    totals: List[Tuple[Optional[str], int]] = []
+    side: Optional[str] = None
+    candidates = parsed = 0
+    for raw in lines:
+        line = " ".join(raw.split())
+        if not line:
+            continue
+        m = _SIDE_HDR.match(line)
+        if m:
+            side = (m.group(1) or m.group(2)).upper()
+            continue
+        m = _TOTAL.match(line)
+        if m:
+            times = _TOTAL_TIME.findall(line)
+            if times:
+                s = m.group(1) or m.group(2) or m.group(3)
+                h, mm, ss = times[-1]
+                totals.append((s.upper() if s else side, int(h or 0)*3600 + int(mm)*60 + int(ss)))
+            continue
+        if not _MMSS.search(line):
+            continue
+        candidates += 1
+        t = _TRACK.match(line)
+        if not t:
+            continue
+        s = (t.group(1) or side or "").upper()
+        if not s or int(t.group(2)) < 1:
+            continue
+        try:
+            dur = parse_mmss_to_seconds(t.group(4))
+        except ValueError:
+            continue
+        sides.setdefault(s, []).append(TrackInfo(title=t.group(3).strip(), side=s, position=int(t.group(2)), duration_sec=dur))  # type: ignore[arg-type]
+        parsed += 1
+
+    if not parsed:
+        return SideTracklist(), 0.0
+    confidence = parsed / candidates
+    for tracks in sides.values():
+        positions = sorted(t.position for t in tracks)
+        if positions != list(range(1, len(positions)+1)):
+            confidence /= 2
+            break
+
+    # totals are printed rounded: allow a second per track
+    sums = {s: (sum(t.duration_sec for t in ts), len(ts)) for s, ts in sides.items()}
+    grand = (sum(v for v, _ in sums.values()), parsed)
+    confirmed = set()
+    for s, total in totals:
+        if s in sums and abs(sums[s][0] - total) <= sums[s][1]:
+            confirmed.add(s)
+        elif abs(grand[0] - total) <= grand[1]:
+            confirmed.update(sums)
+        else:
+            confidence /= 2  # tracks missing from the text layer (or a misread duration)
+            break
+    short = [len(ts) for s, ts in sides.items() if s not in confirmed and len(ts) < _MIN_TRACKS_PER_SIDE]
+    if short:
+        confidence *= min(short) / _MIN_TRACKS_PER_SIDE
+    return SideTracklist(sides=sides), confidence
+
+def extract_text_tracklist(pdf_path: Path) -> Tuple[SideTracklist, float]:
+    """Parse the tracklist from the PDF's text layer; confidence is 0.0 for scanned/image-only PDFs."""
+    lines: List[str] = []
+    with FITZ_LOCK, fitz.open(str(pdf_path)) as doc:
+        for page in doc:
+            lines.extend(_rows(page))
+    return parse_tracklist_lines(lines)
@@ -0,0 +1,64 @@
+# 17_spans.py
+from __future__ import annotations
+import math, threading, time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+# Metrics of the innermost open span in the current thread / asyncio task
+_current: ContextVar[Optional[Dict[str, float]]] = ContextVar("span_metrics", default=None)
+_metrics_lock = threading.Lock()  # a span's counters may be updated from several worker threads
+
+def add_metric(key: str, value: float = 1) -> None:
+    """Add to a counter of the currently open span; a no-op outside of any span."""
+    metrics = _current.get()
+    if metrics is not None:
+        with _metrics_lock:
+            metrics[key] = metrics.get(key, 0) + value
+
+def percentile(sorted_vals: List[float], q: float) -> float:
+    """Nearest-rank percentile q (0-100] of a non-empty, ascending list."""
+    return sorted_vals[min(len(sorted_vals)-1, max(0, math.ceil(q * len(sorted_vals) / 100) - 1))]
+
+class StageStats:
+    """Thread-safe collector of span durations, aggregated per stage for the batch summary."""
+    def __init__(self):
+        self._durations: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, duration_ms: float) -> None:
+        with self._lock:
+            self._durations.setdefault(stage, []).append(duration_ms)
+
+    def durations(self) -> Dict[str, List[float]]:
+        with self._lock:
+            return {s: list(v) for s, v in self._durations.items()}
+
+    def summary(self) -> List[Dict]:
+        with self._lock:
+            items = [(s, sorted(v)) for s, v in self._durations.items()]
+        return [{"stage": s, "count": len(v), "total_ms": round(sum(v), 1), "p50_ms": round(percentile(v, 50), 1),
+                 "p95_ms": round(percentile(v, 95), 1), "max_ms": round(v[-1], 1)} for s, v in items]
+
+@contextmanager
+def span(logger, stats: Optional[StageStats], stage: str, module: str, pair_id: Optional[str]) -> Iterator[Dict[str, float]]:
+    """
+    Time a pipeline stage and emit one `stage_span` event with its duration and any
+    counters added via add_metric (bytes read, pages rendered, retries, ...) meanwhile.
+    """
+    metrics: Dict[str, float] = {}
+    token = _current.set(metrics)
+    t0 = time.perf_counter()
+    ok = True
+    try:
+        yield metrics
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        _current.reset(token)
+        duration_ms = (time.perf_counter()-t0)*1000
+        if stats is not None:
+            stats.record(stage, duration_ms)
+        logger.info("stage_span", module, pair_id, f"Stage {stage}",
+                    {"stage": stage, "duration_ms": round(duration_ms, 1), "ok": ok} | metrics)
@@ -0,0 +1,165 @@
+# 18_watch.py
+from __future__ import annotations
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from m02_config import Config
+from m03_models import PairingItem
+from m04_file_matcher import discover_and_pair_files
+from m09_export import get_results_store, write_batch_files
+from m10_utils import JsonLogger, summarize_rows
+from m15_incremental import pair_fingerprint, path_state, write_fingerprints
+
+_RETRY_CAP_S = 3600.0  # longest wait between retries of a failed pair
+
+# watchdog is optional: with it, file events wake the loop early; without it we poll
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+class _Wake(FileSystemEventHandler):
+    def __init__(self, ev: threading.Event):
+        self.ev = ev
+    def on_any_event(self, event):
+        self.ev.set()
+
+class _QuietRepeats:
+    """Logger proxy that emits each WARN (event, path) once, so re-pairing every poll does not flood the log."""
+    def __init__(self, logger):
+        self._logger = logger
+        self._seen: set = set()
+    def warn(self, event, module, pair_id, message, data=None):
+        key = (event, (data or {}).get("path"))
+        if key not in self._seen:
+            self._seen.add(key)
+            self._logger.warn(event, module, pair_id, message, data)
+    def __getattr__(self, name):
+        return getattr(self._logger, name)
+
+class StabilityTracker:
+    """
+    A file (or WAV folder) is stable once two observations saw the same (size, mtime, count)
+    and either that state has held for settle_s seconds or its mtime is already older than that.
+    """
+    def __init__(self, settle_s: float):
+        self.settle_s = settle_s
+        self._seen: Dict[str, Tuple[Tuple[int, int, int], float]] = {}
+
+    def stable(self, path: Optional[str], now: float) -> bool:
+        if path is None:
+            return True
+        try:
+            state = path_state(path)
+        except OSError:
+            self._seen.pop(path, None)
+            return False
+        prev = self._seen.get(path)
+        if prev is None or prev[0] != state:
+            self._seen[path] = (state, now)
+            return False
+        return now - prev[1] >= self.settle_s or time.time() - state[1] / 1e9 >= self.settle_s
+
+def watch_loop(pdf_dir: Path, zip_dir: Path, cfg: Config, out_run: Path, logger: JsonLogger,
+               process: Callable[[PairingItem], Optional[Dict]], stop: threading.Event,
+               interval_s: float = 5.0, settle_s: float = 10.0, orphan_after_s: float = 600.0,
+               retry_s: float = 60.0, max_attempts: int = 5, max_cycles: Optional[int] = None) -> Dict[str, Dict]:
+    """
+    Keep pairing the delivery trees and run `process` for every new or changed pair.
+
+    A pair is processed once its PDF and ZIP are both stable; a PDF still without a ZIP
+    after orphan_after_s is processed alone. A pair is re-run when its inputs change
+    (pair_fingerprint). A failed pair is retried after retry_s, doubling per attempt (at
+    most _RETRY_CAP_S), up to max_attempts; then it waits for its files to change. After
+    each cycle that processed something, the rolling `_batch` summary in out_run is
+    rewritten. When changed inputs fail, the pair's earlier row is dropped. Returns the
+    latest row per pair.
+    """
+    index_path = Path(cfg.dir_index) if cfg.dir_index else out_run / "_batch" / "dir_index.json"
+    quiet = _QuietRepeats(logger)
+    tracker = StabilityTracker(settle_s)
+    first_seen: Dict[str, float] = {}
+    done: Dict[str, str] = {}
+    failed: Dict[str, Tuple[str, int, float]] = {}  # pair_id -> (fingerprint, attempts, retry at)
+    rows: Dict[str, Dict] = {}
+    row_fps: Dict[str, str] = {}  # pair_id -> fingerprint of the inputs its row was computed from
+    wake = threading.Event()
+    observer = None
+    if Observer is not None:
+        observer = Observer()
+        for d in (pdf_dir, zip_dir):
+            observer.schedule(_Wake(wake), str(d), recursive=True)
+        observer.start()
+    logger.info("watch_start","watch",None,"Watching for deliveries",{
+        "pdf_dir":str(pdf_dir),"zip_dir":str(zip_dir),"interval_s":interval_s,"settle_s":settle_s,
+        "orphan_after_s":orphan_after_s,"notify":"watchdog" if observer else "polling"
+    })
+    cycles = 0
+    try:
+        with ThreadPoolExecutor(max_workers=cfg.jobs, thread_name_prefix="pair") as ex:
+            while not stop.is_set():
+                now = time.monotonic()
+                pr = discover_and_pair_files(pdf_dir, zip_dir, cfg.id_min_digits, cfg.id_max_digits, quiet, index_path)
+                ready: List[Tuple[PairingItem, str]] = []
+                for pi in pr.pairs:
+                    first_seen.setdefault(pi.pair_id, now)
+                    if not (tracker.stable(pi.pdf, now) and tracker.stable(pi.zip, now)):
+                        continue
+                    if pi.zip is None and now - first_seen[pi.pair_id] < orphan_after_s:
+                        continue
+                    try:
+                        fp = pair_fingerprint(pi, cfg)
+                    except OSError:
+                        continue
+                    if done.get(pi.pair_id) == fp:
+                        continue
+                    f = failed.get(pi.pair_id)
+                    if f is not None and f[0] == fp and now < f[2]:
+                        continue
+                    ready.append((pi, fp))
+
+                if ready:
+                    logger.info("watch_batch","watch",None,"Processing new deliveries",{"pairs":[pi.pair_id for pi, _ in ready]})
+                    for (pi, fp), row in zip(ready, ex.map(lambda x: process(x[0]), ready)):
+                        if row is not None:
+                            done[pi.pair_id] = fp
+                            rows[pi.pair_id] = row
+                            row_fps[pi.pair_id] = fp
+                            failed.pop(pi.pair_id, None)
+                            continue
+                        if row_fps.get(pi.pair_id, fp) != fp:
+                            # the earlier row was computed from the previous files, it no longer applies
+                            rows.pop(pi.pair_id); row_fps.pop(pi.pair_id)
+                        f = failed.get(pi.pair_id)
+                        attempts = f[1] + 1 if f is not None and f[0] == fp else 1  # changed files start over
+                        if attempts >= max_attempts:
+                            done[pi.pair_id] = fp  # not retried again until its files change
+                            failed.pop(pi.pair_id, None)
+                            logger.warn("watch_pair_gave_up","watch",pi.pair_id,"Pair failed on all attempts",{"attempts":attempts})
+                        else:
+                            delay = min(_RETRY_CAP_S, retry_s * 2 ** (attempts - 1))
+                            failed[pi.pair_id] = (fp, attempts, time.monotonic() + delay)
+                            logger.info("watch_pair_retry","watch",pi.pair_id,"Pair failed, retrying later",{
+                                "attempts":attempts,"retry_in_s":round(delay, 1)})
+                    store = get_results_store(cfg)
+                    if store is not None:
+                        store.flush()
+                    ordered = [rows[k] for k in sorted(rows)]
+                    write_batch_files(out_run/"_batch", ordered, summarize_rows(ordered), logger.stages.summary())
+                    write_fingerprints(out_run, row_fps)
+
+                cycles += 1
+                if max_cycles is not None and cycles >= max_cycles:
+                    break
+                # with watchdog an event ends the wait early; a short pause coalesces event bursts
+                if wake.wait(interval_s):
+                    stop.wait(min(1.0, interval_s))
+                wake.clear()
+    finally:
+        if observer is not None:
+            observer.stop(); observer.join()
+        logger.info("watch_stop","watch",None,"Watch stopped",{"cycles":cycles,"pairs_done":len(rows)})
+    return rows
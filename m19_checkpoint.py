@@ -0,0 +1,66 @@
+# 19_checkpoint.py
+from __future__ import annotations
+import json, os, threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+CHECKPOINT_FILE = "checkpoint.jsonl"
+
+class Checkpoint:
+    """
+    Append-only JSONL record of completed pairs in `<run dir>/_batch/checkpoint.jsonl`.
+
+    Every row is flushed and fsync'ed before `append` returns, so after a crash or
+    Ctrl-C the file lists exactly the pairs that finished; a torn last line is ignored
+    on load. When a pair appears more than once the last row wins.
+    """
+    def __init__(self, run_dir: Path):
+        self.path = Path(run_dir) / "_batch" / CHECKPOINT_FILE
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._terminate_torn_line()
+
+    def _terminate_torn_line(self) -> None:
+        # a crash mid-write leaves a partial last line; end it so new rows start on a fresh line
+        try:
+            with open(self.path, "rb+") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+        except FileNotFoundError:
+            pass
+
+    def append(self, row: Dict) -> None:
+        line = json.dumps(row, ensure_ascii=False) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self) -> Dict[str, Dict]:
+        return load_checkpoint(self.path.parent.parent)
+
+def load_checkpoint(run_dir: Path) -> Dict[str, Dict]:
+    """Return the completed rows of a run keyed by pair_id (empty if there is no checkpoint)."""
+    rows: Dict[str, Dict] = {}
+    try:
+        with open(Path(run_dir) / "_batch" / CHECKPOINT_FILE, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue  # torn write from an interrupted run
+                rows[row["pair_id"]] = row
+    except OSError:
+        pass
+    return rows
+
+def drop_stale(rows: Dict[str, Dict], fingerprints: Dict[str, str]) -> Tuple[Dict[str, Dict], int]:
+    """
+    Keep the checkpointed rows whose fingerprint still matches the pair's current inputs
+    and config; returns (rows, number of current pairs whose row is stale).
+    """
+    fresh = {pid: r for pid, r in rows.items() if pid in fingerprints and r.get("fingerprint") == fingerprints[pid]}
+    return fresh, sum(1 for pid in rows if pid in fingerprints and pid not in fresh)
@@ -0,0 +1,100 @@
+# 20_page_select.py
+from __future__ import annotations
+import re
+from typing import List, NamedTuple, Optional
+import fitz
+from m02_config import Config
+
+# "4:12", "04:12", "1:04:12"
+_TIME = re.compile(r"\b(?:[0-9]{1,2}:)?[0-9]{1,2}:[0-5][0-9]\b")
+_SIDE = re.compile(r"\b(?:side|strana)\b", re.IGNORECASE)
+
+_PREVIEW_ZOOM = 1/3   # 24 dpi grayscale preview for ink detection
+_INK = 200            # gray level below which a preview pixel counts as ink
+_MIN_INK_AREA = 0.005 # share of the page an ink box needs to not be a blank/noise page
+_PROSE_WORDS = 20     # a text page this long without any MM:SS is not a tracklist
+_CROP_MIN_GAIN = 0.9  # crop only when the region is at most this share of the page
+
+class PageInfo(NamedTuple):
+    index: int
+    words: int
+    time_codes: int
+    blank: bool
+    region: Optional[fitz.Rect]  # likely tracklist region (or ink box), page coordinates
+
+class PagePlan(NamedTuple):
+    index: int
+    clip: Optional[fitz.Rect]  # None = render the whole page
+    reason: str
+
+def _ink_box(page: "fitz.Page") -> Optional[fitz.Rect]:
+    """Bounding box of non-white pixels on a tiny grayscale preview (works for scans too)."""
+    pm = page.get_pixmap(matrix=fitz.Matrix(_PREVIEW_ZOOM, _PREVIEW_ZOOM), colorspace=fitz.csGRAY, alpha=False)
+    s, w, h, stride = pm.samples, pm.width, pm.height, pm.stride
+    rows = [y for y in range(h) if min(s[y*stride:y*stride+w]) < _INK]
+    if not rows:
+        return None
+    band = s[rows[0]*stride:(rows[-1]+1)*stride]
+    cols = [x for x in range(w) if min(band[x::stride]) < _INK]
+    z = 1/_PREVIEW_ZOOM
+    return fitz.Rect(cols[0]*z, rows[0]*z, (cols[-1]+1)*z, (rows[-1]+1)*z) & page.rect
+
+def inspect_page(page: "fitz.Page") -> PageInfo:
+    """Cheap pre-pass over one page: word and MM:SS counts, blank detection and content region."""
+    words = page.get_text("words")
+    lines = {}
+    for x0, y0, x1, y1, text, block, line, _ in words:
+        r = lines.setdefault((block, line), [fitz.Rect(x0, y0, x1, y1), []])
+        r[0] |= fitz.Rect(x0, y0, x1, y1)
+        r[1].append(text)
+    timed = [box for box, t in lines.values() if _TIME.search(" ".join(t))]
+    ink = _ink_box(page)
+    blank = not words and (ink is None or ink.get_area() < _MIN_INK_AREA * page.rect.get_area())
+
+    region = None if ink is None else fitz.Rect(ink.x0 - 12, ink.y0 - 12, ink.x1 + 12, ink.y1 + 12) & page.rect
+    if timed:
+        # tracklist rows plus nearby side headers, padded by a couple of row heights; united
+        # with the ink box, so rows drawn as images (a scanned list under typed text) stay in
+        heads = [box for box, t in lines.values() if _SIDE.search(" ".join(t))]
+        box = fitz.Rect(timed[0])
+        for b in timed[1:] + heads:
+            box |= b
+        pad = 2 * max(b.height for b in timed)
+        x0 = min(w[0] for w in words); x1 = max(w[2] for w in words)
+        text = fitz.Rect(x0 - pad, box.y0 - pad, x1 + pad, box.y1 + pad) & page.rect
+        region = text if region is None else text | region
+    return PageInfo(page.number, len(words), sum(len(_TIME.findall(w[4])) for w in words), blank, region)
+
+def plan_pages(doc: "fitz.Document", cfg: Config) -> List[PagePlan]:
+    """
+    Choose which pages (and regions) to rasterise for the VLM.
+
+    Pages with MM:SS time codes in their text layer win; otherwise non-blank pages that
+    are not plain prose (scans, sparse layouts) are taken in order. At most cfg.max_pages
+    pages are returned in document order; with cfg.page_crop each is clipped to its
+    content region when that saves enough area. The caller holds FITZ_LOCK
+    (m16_text_layer) while using doc.
+    """
+    limit = len(doc) if cfg.page_scan_limit <= 0 else min(len(doc), cfg.page_scan_limit)
+    cap = cfg.max_pages if cfg.max_pages > 0 else limit
+    infos = [inspect_page(doc.load_page(i)) for i in range(limit)]
+
+    nonblank = [p for p in infos if not p.blank]
+    timed = [p for p in nonblank if p.time_codes >= 2]
+    if timed:
+        chosen, reason = sorted(timed, key=lambda p: -p.time_codes)[:cap], "time_codes"
+    else:
+        loose = [p for p in nonblank if not (p.words >= _PROSE_WORDS and p.time_codes == 0)]
+        chosen, reason = (loose or nonblank)[:cap], "non_blank"
+    if not chosen:
+        chosen, reason = infos[:cap], "fallback"
+
+    plans = []
+    for p in sorted(chosen, key=lambda p: p.index):
+        clip = None
+        if cfg.page_crop and p.region is not None:
+            page_area = doc.load_page(p.index).rect.get_area()
+            if not p.region.is_empty and p.region.get_area() <= _CROP_MIN_GAIN * page_area:
+                clip = p.region
+        plans.append(PagePlan(p.index, clip, reason))
+    return plans
@@ -0,0 +1,76 @@
+# 21_memory_budget.py
+from __future__ import annotations
+import threading, time
+from typing import Dict, Optional
+from m02_config import Config
+from m17_spans import add_metric
+
+class MemoryBudget:
+    """
+    Byte budget shared by all concurrent page renders of a run.
+
+    Each pair holds one Reservation: it grows once to the estimated peak of its render
+    (blocking until that fits), shrinks to the encoded pages it keeps for the VLM request
+    and is released when the request is done. A request larger than the whole budget is
+    clamped to it, so it runs alone instead of waiting forever. limit_bytes 0 = unlimited.
+    """
+    def __init__(self, limit_bytes: int):
+        self.limit = max(0, limit_bytes)
+        self.used = 0
+        self.peak = 0
+        self.waits = 0
+        self._cond = threading.Condition()
+
+    def reserve(self, nbytes: int = 0) -> "Reservation":
+        r = Reservation(self)
+        r.resize(nbytes)
+        return r
+
+    def _resize(self, held: int, nbytes: int) -> int:
+        nbytes = max(0, nbytes if self.limit == 0 else min(nbytes, self.limit))
+        with self._cond:
+            if nbytes > held and self.limit:
+                t0 = time.perf_counter()
+                if self.used + nbytes - held > self.limit:
+                    self.waits += 1
+                    self._cond.wait_for(lambda: self.used + nbytes - held <= self.limit)
+                    add_metric("render_budget_waits"); add_metric("render_budget_wait_ms", round((time.perf_counter()-t0)*1000, 1))
+            self.used += nbytes - held
+            self.peak = max(self.peak, self.used)
+            if nbytes < held:
+                self._cond.notify_all()
+        return nbytes
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            return {"limit_mb": round(self.limit/2**20, 1), "peak_mb": round(self.peak/2**20, 1), "waits": self.waits}
+
+class Reservation:
+    """Bytes held against a MemoryBudget; a context manager that releases them on exit."""
+    def __init__(self, budget: MemoryBudget):
+        self.budget = budget
+        self.held = 0
+
+    def resize(self, nbytes: int) -> None:
+        self.held = self.budget._resize(self.held, nbytes)
+
+    def release(self) -> None:
+        self.resize(0)
+
+    def __enter__(self) -> "Reservation":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+_shared: Optional[MemoryBudget] = None
+_shared_lock = threading.Lock()
+
+def get_shared_budget(cfg: Config) -> MemoryBudget:
+    """Return the process-wide render budget, created from cfg.render_memory_mb on first use."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = MemoryBudget(cfg.render_memory_mb * 2**20)
+        return _shared
@@ -0,0 +1,266 @@
+# 22_work_queue.py
+from __future__ import annotations
+import json, os, socket, sqlite3, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from m02_config import Config
+from m03_models import PairingItem
+from m09_export import write_batch_files
+from m10_utils import JsonLogger, summarize_rows
+from m15_incremental import write_fingerprints
+from m17_spans import StageStats
+
+QUEUE_FILE = "queue.sqlite"
+# leases are written with the claiming host's clock and checked with another's: a lease only
+# expires this long after its deadline, so clocks that disagree by less do not steal leases
+CLOCK_SKEW_S = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS work (
+    pair_id TEXT PRIMARY KEY, seq INTEGER NOT NULL, item TEXT NOT NULL, fingerprint TEXT, reuse_from TEXT,
+    state TEXT NOT NULL DEFAULT 'queued', worker TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0,
+    row TEXT, error TEXT, updated_at REAL);
+CREATE INDEX IF NOT EXISTS work_state ON work(state, seq);
+CREATE TABLE IF NOT EXISTS spans (worker TEXT NOT NULL, stage TEXT NOT NULL, duration_ms REAL NOT NULL);
+"""
+# the coordinator's config travels to the workers, except secrets and host-local settings
+_LOCAL_CFG = {"openrouter_api_key", "log_file", "log_level", "log_echo", "jobs"}
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _remap(path: Optional[str], old_root: str, new_root: Optional[str]) -> Optional[str]:
+    if path is None or new_root is None:
+        return path
+    try:
+        return str(Path(new_root) / Path(path).relative_to(old_root))
+    except ValueError:
+        return path
+
+class WorkQueue:
+    """
+    Pair queue shared by worker processes through `<run dir>/_batch/queue.sqlite`.
+
+    A worker claims the next queued pair with a lease of lease_s seconds and renews it by
+    heartbeat while the pair runs; a pair whose lease expired (worker died or hung) is
+    queued again once it is clock_skew_s past its deadline. A pair that failed or lost its
+    lease max_attempts times is marked failed. Every state change is one short IMMEDIATE transaction in the rollback journal
+    (not WAL), so the file works from several hosts on a share with working file locks.
+    """
+    def __init__(self, run_dir: Path, max_attempts: int = 3, clock_skew_s: float = CLOCK_SKEW_S):
+        self.run_dir = Path(run_dir)
+        self.path = self.run_dir / "_batch" / QUEUE_FILE
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.clock_skew_s = clock_skew_s
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=60, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=DELETE")
+        self._db.executescript(_SCHEMA)
+
+    def _tx(self, fn: Callable[[sqlite3.Connection], object]):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self._db)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return out
+
+    def enqueue(self, pairs: List[PairingItem], cfg: Config, pdf_dir: Path, zip_dir: Path,
+                fingerprints: Dict[str, str], reuse: Dict[str, Path]) -> int:
+        """
+        Queue the pairs; returns how many already queued pairs were queued again. A pair
+        already in the queue (--resume) keeps its state unless its fingerprint changed
+        (new files or result-relevant config) or it failed on all attempts.
+        """
+        meta = {"config": cfg.model_dump_json(exclude=_LOCAL_CFG), "pdf_dir": str(pdf_dir), "zip_dir": str(zip_dir),
+                "created_at": str(time.time())}
+        def _do(db):
+            db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", meta.items())
+            known = {r[0] for r in db.execute("SELECT pair_id FROM work")}
+            before = db.total_changes
+            db.executemany("INSERT INTO work (pair_id, seq, item, fingerprint, reuse_from, updated_at) VALUES (?,?,?,?,?,?) "
+                           "ON CONFLICT(pair_id) DO UPDATE SET seq=excluded.seq, item=excluded.item, "
+                           "fingerprint=excluded.fingerprint, reuse_from=excluded.reuse_from, state='queued', worker=NULL, "
+                           "lease_until=NULL, attempts=0, row=NULL, error=NULL, updated_at=excluded.updated_at "
+                           "WHERE work.fingerprint IS NOT excluded.fingerprint OR work.state='failed'",
+                           [(pi.pair_id, i, pi.model_dump_json(), fingerprints.get(pi.pair_id),
+                             str(reuse[pi.pair_id]) if pi.pair_id in reuse else None, time.time()) for i, pi in enumerate(pairs)])
+            return db.total_changes - before - sum(1 for pi in pairs if pi.pair_id not in known)
+        return self._tx(_do)
+
+    def meta(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._db.execute("SELECT key, value FROM meta"))
+
+    def config(self, **local) -> Config:
+        """The coordinator's Config with this host's settings (API key, logging, jobs) applied."""
+        return Config.model_validate_json(self.meta()["config"]).model_copy(update=local)
+
+    def _requeue_expired(self, db: sqlite3.Connection, now: float) -> None:
+        db.execute("UPDATE work SET state=CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, worker=NULL, "
+                   "lease_until=NULL, error=COALESCE(error, 'lease expired'), updated_at=? "
+                   "WHERE state='leased' AND lease_until < ?", (self.max_attempts, now, now - self.clock_skew_s))
+
+    def claim(self, worker: str, lease_s: float) -> Optional[Tuple[PairingItem, Optional[str], Optional[str]]]:
+        """Lease the next queued pair; returns (item, reuse_from, fingerprint) or None when nothing is claimable."""
+        def _do(db):
+            now = time.time()
+            self._requeue_expired(db, now)
+            r = db.execute("SELECT pair_id, item, reuse_from, fingerprint FROM work WHERE state='queued' ORDER BY seq LIMIT 1").fetchone()
+            if r is None:
+                return None
+            db.execute("UPDATE work SET state='leased', worker=?, lease_until=?, attempts=attempts+1, updated_at=? WHERE pair_id=?",
+                       (worker, now + lease_s, now, r[0]))
+            return PairingItem.model_validate_json(r[1]), r[2], r[3]
+        return self._tx(_do)
+
+    def heartbeat(self, pair_id: str, worker: str, lease_s: float) -> bool:
+        """Extend the lease; False when the pair is no longer leased to this worker."""
+        def _do(db):
+            now = time.time()
+            return db.execute("UPDATE work SET lease_until=?, updated_at=? WHERE pair_id=? AND worker=? AND state='leased'",
+                              (now + lease_s, now, pair_id, worker)).rowcount == 1
+        return self._tx(_do)
+
+    def complete(self, pair_id: str, worker: str, row: Dict, fingerprint: Optional[str]) -> None:
+        # the first result wins, also when it arrives after the lease was lost, unless the
+        # pair was queued again for changed inputs meanwhile (the result is then stale)
+        self._tx(lambda db: db.execute("UPDATE work SET state='done', worker=?, lease_until=NULL, row=?, error=NULL, updated_at=? "
+                                       "WHERE pair_id=? AND state != 'done' AND fingerprint IS ?",
+                                       (worker, json.dumps(row), time.time(), pair_id, fingerprint)))
+
+    def fail(self, pair_id: str, worker: str, reason: str) -> None:
+        self._tx(lambda db: db.execute("UPDATE work SET state=CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                                       "worker=NULL, lease_until=NULL, error=?, updated_at=? "
+                                       "WHERE pair_id=? AND worker=? AND state='leased'",
+                                       (self.max_attempts, reason, time.time(), pair_id, worker)))
+
+    def counts(self) -> Dict[str, int]:
+        def _do(db):
+            self._requeue_expired(db, time.time())
+            return dict(db.execute("SELECT state, COUNT(*) FROM work GROUP BY state"))
+        c = self._tx(_do)
+        return {s: c.get(s, 0) for s in ("queued", "leased", "done", "failed")}
+
+    def failed(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._db.execute("SELECT pair_id, COALESCE(error, '') FROM work WHERE state='failed' ORDER BY seq"))
+
+    def add_spans(self, worker: str, stats: StageStats) -> None:
+        self._tx(lambda db: db.executemany("INSERT INTO spans VALUES (?, ?, ?)",
+                                           [(worker, s, ms) for s, v in stats.durations().items() for ms in v]))
+
+    def results(self) -> Tuple[List[Dict], Dict[str, str], StageStats]:
+        """Done rows in pairing order, their fingerprints and the stage timings of all workers."""
+        stats = StageStats()
+        with self._lock:
+            done = self._db.execute("SELECT pair_id, row, fingerprint FROM work WHERE state='done' ORDER BY seq").fetchall()
+            for stage, ms in self._db.execute("SELECT stage, duration_ms FROM spans"):
+                stats.record(stage, ms)
+        return [json.loads(r) for _, r, _ in done], {p: fp for p, _, fp in done if fp}, stats
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+class _Heartbeat:
+    """Renews a pair's lease every lease_s/3 seconds while the pair runs."""
+    def __init__(self, queue: WorkQueue, pair_id: str, worker: str, lease_s: float, logger):
+        self.queue, self.pair_id, self.worker, self.lease_s, self.logger = queue, pair_id, worker, lease_s, logger
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{pair_id}", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.lease_s / 3):
+            try:
+                ok = self.queue.heartbeat(self.pair_id, self.worker, self.lease_s)
+            except sqlite3.Error as e:
+                self.logger.warn("queue_heartbeat_failed","queue",self.pair_id,"Lease renewal failed",{"reason":str(e)})
+                continue
+            if not ok:
+                self.logger.warn("queue_lease_lost","queue",self.pair_id,"Lease lost, pair may run twice",{"worker":self.worker})
+                return
+
+    def __enter__(self) -> "_Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+def run_worker(queue: WorkQueue, worker: str, logger: JsonLogger, process: Callable[[PairingItem, Optional[Path]], Optional[Dict]],
+               stop: threading.Event, jobs: int = 1, lease_s: float = 120.0, poll_s: float = 5.0,
+               pdf_dir: Optional[Path] = None, zip_dir: Optional[Path] = None) -> int:
+    """
+    Claim and process pairs until the queue has nothing queued or leased left (or stop is set).
+
+    `process(item, reuse_from)` returns the pair's summary row or None on failure. While
+    other workers still hold leases this worker keeps polling, so it picks up their pairs
+    if their leases expire. pdf_dir/zip_dir map the coordinator's input roots to where
+    this host mounts them. Returns the number of pairs this worker completed.
+    """
+    meta = queue.meta()
+    pdf_root = str(pdf_dir) if pdf_dir else None
+    zip_root = str(zip_dir) if zip_dir else None
+    done = [0]
+    logger.info("queue_worker_start","queue",None,"Worker started",{"worker":worker,"queue":str(queue.path),"jobs":jobs,"lease_s":lease_s})
+
+    def _loop() -> None:
+        while not stop.is_set():
+            claimed = queue.claim(worker, lease_s)
+            if claimed is None:
+                c = queue.counts()
+                if c["queued"] == 0 and c["leased"] == 0:
+                    return
+                stop.wait(poll_s)
+                continue
+            pi, reuse_from, fingerprint = claimed
+            pi = pi.model_copy(update={"pdf": _remap(pi.pdf, meta["pdf_dir"], pdf_root), "zip": _remap(pi.zip, meta["zip_dir"], zip_root)})
+            logger.info("queue_claim","queue",pi.pair_id,"Pair claimed",{"worker":worker})
+            with _Heartbeat(queue, pi.pair_id, worker, lease_s, logger):
+                row = process(pi, Path(reuse_from) if reuse_from else None)
+            if row is None:
+                queue.fail(pi.pair_id, worker, "pipeline failed")
+            else:
+                queue.complete(pi.pair_id, worker, row, fingerprint)
+                done[0] += 1
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="queue") as ex:
+            for f in [ex.submit(_loop) for _ in range(jobs)]:
+                f.result()
+    finally:
+        queue.add_spans(worker, logger.stages)
+        logger.info("queue_worker_finish","queue",None,"Worker finished",{"worker":worker,"pairs_done":done[0]} | queue.counts())
+    return done[0]
+
+def wait_and_merge(queue: WorkQueue, out_run: Path, logger: JsonLogger, stop: threading.Event,
+                   poll_s: float = 5.0) -> Optional[str]:
+    """
+    Wait until no pair is queued or leased, then write the run's `_batch` summary from the
+    rows the workers stored. Returns the summary table, or None when stop was set first.
+    """
+    last = None
+    while True:
+        c = queue.counts()
+        if c != last:
+            logger.info("queue_progress","queue",None,"Queue progress",c)
+            last = c
+        if c["queued"] == 0 and c["leased"] == 0:
+            break
+        if stop.wait(poll_s):
+            return None
+    rows, fingerprints, stats = queue.results()
+    if c["failed"]:
+        logger.warn("queue_pairs_failed","queue",None,"Pairs failed on all attempts",{"pairs":queue.failed()})
+    write_fingerprints(out_run, fingerprints)
+    table = write_batch_files(out_run/"_batch", rows, summarize_rows(rows), stats.summary())
+    logger.info("queue_merged","queue",None,"Queue results merged",{"pairs_done":len(rows),"pairs_failed":c["failed"]})
+    return table
@@ -0,0 +1,207 @@
+# 23_rate_control.py
+from __future__ import annotations
+import random, threading, time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, Tuple, Type
+from m17_spans import add_metric
+
+_RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+_BACKOFF_BASE_S = 1.0
+_BACKOFF_CAP_S = 30.0
+_SLOW_FACTOR = 2.0  # a response this many times slower than the best seen counts as congestion
+
+def retry_after_s(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), None when absent/invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - (now if now is not None else time.time()))
+    except (TypeError, ValueError):
+        return None
+
+class RateController:
+    """
+    Admission control for the requests to one VLM endpoint.
+
+    A token bucket caps the request rate (rate_per_s, 0 = no cap) and an AIMD window
+    caps concurrency: each success widens the window by 1/window (one slot per round
+    trip) unless latency has grown past _SLOW_FACTOR times the best seen, and a 429,
+    5xx or transport error halves it, at most once per round trip so a burst of errors
+    from one wave counts once. A Retry-After pauses all callers until it has passed;
+    failed attempts are retried up to max_attempts with jittered exponential backoff.
+    """
+    def __init__(self, max_in_flight: int, rate_per_s: float = 0.0, max_attempts: int = 6,
+                 max_wait_s: float = 120.0):
+        self.max_window = max(1, max_in_flight)
+        self.window = float(self.max_window)
+        self.rate = max(0.0, rate_per_s)
+        self.max_attempts = max(1, max_attempts)
+        self.max_wait_s = max_wait_s
+        self._tokens = max(1.0, self.rate)
+        self._refill_at = time.monotonic()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_cut = 0.0
+        self._best_latency: Optional[float] = None
+        self._cond = threading.Condition()
+        self._stats = {"requests": 0, "retries": 0, "throttled": 0, "errors": 0, "throttle_s": 0.0,
+                       "latency_s": 0.0, "min_window": self.window}
+        self._first = self._last = None
+
+    # --- admission ---
+    def _try_acquire(self, now: float) -> Optional[float]:
+        """Take a slot and a token: 0 when admitted, else seconds to wait (None = until a slot frees)."""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._in_flight >= int(self.window):
+            return None
+        if self.rate:
+            self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._refill_at) * self.rate)
+            self._refill_at = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            self._tokens -= 1
+        self._in_flight += 1
+        return 0
+
+    def acquire(self) -> float:
+        t0 = time.monotonic()
+        with self._cond:
+            while True:
+                wait = self._try_acquire(time.monotonic())
+                if wait == 0:
+                    break
+                self._cond.wait(wait)
+        return self._waited(t0)
+
+    async def aacquire(self) -> float:
+        import asyncio
+        t0 = time.monotonic()
+        while True:
+            with self._cond:
+                wait = self._try_acquire(time.monotonic())
+            if wait == 0:
+                break
+            await asyncio.sleep(0.05 if wait is None else min(wait, 1.0))
+        return self._waited(t0)
+
+    def _waited(self, t0: float) -> float:
+        waited = time.monotonic() - t0
+        if waited > 0.001:
+            with self._cond:
+                self._stats["throttle_s"] += waited
+            add_metric("vlm_throttle_ms", round(waited*1000, 1))
+        return waited
+
+    def abandon(self) -> None:
+        """Return the slot of a request that was cancelled; no feedback on the window."""
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    # --- feedback ---
+    def release(self, started: float, status: Optional[int], retry_after: Optional[float] = None) -> None:
+        """Return the slot and adapt the window to the outcome (status None = transport error)."""
+        now = time.monotonic()
+        latency = now - started
+        with self._cond:
+            self._in_flight -= 1
+            s = self._stats
+            s["requests"] += 1; s["latency_s"] += latency
+            self._first = self._first if self._first is not None else started
+            self._last = now
+            congested = status is None or status == 429 or status >= 500
+            if congested:
+                s["throttled" if status == 429 else "errors"] += 1
+                if retry_after:
+                    self._paused_until = max(self._paused_until, now + min(retry_after, self.max_wait_s))
+                if now - self._last_cut >= (self._best_latency or latency):
+                    self.window = max(1.0, self.window / 2)
+                    self._last_cut = now
+                    s["min_window"] = min(s["min_window"], self.window)
+            else:
+                self._best_latency = latency if self._best_latency is None else min(self._best_latency, latency)
+                if latency <= _SLOW_FACTOR * self._best_latency:
+                    self.window = min(float(self.max_window), self.window + 1 / self.window)
+            self._cond.notify_all()
+
+    def backoff_s(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.max_wait_s)
+        return min(_BACKOFF_CAP_S, _BACKOFF_BASE_S * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+    # --- request loops ---
+    def _outcome(self, r) -> Tuple[int, Optional[float]]:
+        return r.status_code, retry_after_s(r.headers.get("Retry-After"))
+
+    def call(self, send: Callable[[], object], transient: Tuple[Type[BaseException], ...] = ()):
+        """Run send() (returning an HTTP response) under admission control, retrying 429/5xx/transient errors."""
+        for attempt in range(1, self.max_attempts + 1):
+            self.acquire()
+            started = time.monotonic()
+            try:
+                r = send()
+            except transient:
+                self.release(started, None)
+                if attempt == self.max_attempts:
+                    raise
+                status, retry_after = None, None
+            except BaseException:
+                self.abandon()
+                raise
+            else:
+                status, retry_after = self._outcome(r)
+                self.release(started, status, retry_after)
+                if status not in _RETRY_STATUS or attempt == self.max_attempts:
+                    return r
+            self._retry_wait(attempt, status, retry_after, time.sleep)
+        raise AssertionError("unreachable")
+
+    async def acall(self, send: Callable[[], object], transient: Tuple[Type[BaseException], ...] = ()):
+        """Async counterpart of call; send() returns an awaitable response."""
+        import asyncio
+        for attempt in range(1, self.max_attempts + 1):
+            await self.aacquire()
+            started = time.monotonic()
+            try:
+                r = await send()
+            except transient:
+                self.release(started, None)
+                if attempt == self.max_attempts:
+                    raise
+                status, retry_after = None, None
+            except BaseException:  # cancelled (e.g. a hedged request that lost) or a bug
+                self.abandon()
+                raise
+            else:
+                status, retry_after = self._outcome(r)
+                self.release(started, status, retry_after)
+                if status not in _RETRY_STATUS or attempt == self.max_attempts:
+                    return r
+            await self._retry_wait(attempt, status, retry_after, asyncio.sleep)
+        raise AssertionError("unreachable")
+
+    def _retry_wait(self, attempt: int, status: Optional[int], retry_after: Optional[float], sleep):
+        delay = self.backoff_s(attempt, retry_after)
+        with self._cond:
+            self._stats["retries"] += 1
+            self._stats["throttle_s"] += delay
+        add_metric("vlm_retries"); add_metric("vlm_throttle_ms", round(delay*1000, 1))
+        if status == 429:
+            add_metric("vlm_429")
+        return sleep(delay)
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            s = dict(self._stats)
+            span = (self._last - self._first) if self._first is not None else 0.0
+        n = s.pop("requests")
+        return {"requests": n, "retries": s["retries"], "throttled_429": s["throttled"], "errors": s["errors"],
+                "effective_rps": round(n / span, 3) if span > 0 else None,
+                "throttle_s": round(s["throttle_s"], 1), "avg_latency_s": round(s["latency_s"] / n, 3) if n else None,
+                "window": round(self.window, 2), "min_window": round(s["min_window"], 2)}
@@ -0,0 +1,155 @@
+# 24_provider_chain.py
+from __future__ import annotations
+import threading, time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+from m02_config import Config
+from m17_spans import add_metric, percentile
+
+PROVIDER_KINDS = ("openrouter", "local", "direct")
+_LATENCY_WINDOW = 200  # latest successful latencies kept per provider
+_HEDGE_MIN_SAMPLES = 10  # below this, hedging uses cfg.vlm_hedge_after_s instead of the p95
+
+class Provider(NamedTuple):
+    name: str      # "kind@host", the key of its stats
+    kind: str      # openrouter | local | direct (request format)
+    endpoint: str  # full URL the request is posted to
+
+def _provider(kind: str, url: str) -> Provider:
+    from urllib.parse import urlsplit
+    return Provider(f"{kind}@{urlsplit(url).netloc or url}", kind, url)
+
+def resolve_chain(cfg: Config) -> List[Provider]:
+    """
+    Providers in the order they are tried: cfg.vlm_chain entries "kind" or "kind=url"
+    (a bare kind uses the configured endpoint; for openrouter the url is the API base),
+    or just cfg.vlm_provider when no chain is set.
+    """
+    out: List[Provider] = []
+    for entry in cfg.vlm_chain or [cfg.vlm_provider]:
+        kind, _, url = entry.strip().partition("=")
+        kind = kind.strip().lower()
+        if kind not in PROVIDER_KINDS:
+            raise ValueError(f"Unknown VLM provider in chain: {entry!r}")
+        if kind == "openrouter":
+            out.append(_provider(kind, f"{(url or cfg.openrouter_base_url).rstrip('/')}/chat/completions"))
+        else:
+            out.append(_provider(kind, url or cfg.vlm_endpoint))
+    return out
+
+class ProviderStats:
+    """Thread-safe per-provider counters and recent latencies (the hedging p95)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lat: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def count(self, name: str, key: str) -> None:
+        with self._lock:
+            c = self._counts.setdefault(name, {"requests": 0, "wins": 0, "failed": 0, "invalid": 0, "cancelled": 0, "hedges": 0})
+            c[key] += 1
+
+    def latency(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._lat.setdefault(name, deque(maxlen=_LATENCY_WINDOW)).append(seconds)
+
+    def p95(self, name: str) -> Optional[float]:
+        with self._lock:
+            lat = sorted(self._lat.get(name, ()))
+        return percentile(lat, 95) if len(lat) >= _HEDGE_MIN_SAMPLES else None
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            out = {}
+            for name, c in self._counts.items():
+                lat = sorted(self._lat.get(name, ()))
+                out[name] = dict(c) | ({"p50_s": round(percentile(lat, 50), 3), "p95_s": round(percentile(lat, 95), 3),
+                                        "max_s": round(lat[-1], 3)} if lat else {})
+            return out
+
+_stats = ProviderStats()
+
+def provider_stats() -> ProviderStats:
+    """Process-wide provider stats; latencies carry over between runs so hedging starts informed."""
+    return _stats
+
+async def race(providers: List[Provider], attempt: Callable[[Provider], Awaitable[dict]],
+               valid: Callable[[dict], bool], cfg: Config, logger, pair_id: str) -> Tuple[Provider, dict]:
+    """
+    Get one valid VLM response from the provider chain.
+
+    Providers are tried in order: a provider that fails, misses its deadline
+    (cfg.vlm_deadline_s) or returns an invalid response hands over to the next one.
+    With cfg.vlm_hedge, the next provider is also started once the newest running request
+    exceeds its provider's p95 latency (cfg.vlm_hedge_after_s until enough samples). The
+    first valid response wins and the requests still running are cancelled. When no
+    provider answers validly, the last invalid response is returned, else the last
+    error is raised.
+    """
+    import asyncio
+    running: Dict["asyncio.Task", Tuple[Provider, float]] = {}
+    queue = list(providers)
+    fallback: Optional[Tuple[Provider, dict]] = None
+    error: Optional[BaseException] = None
+
+    async def _one(p: Provider) -> dict:
+        if cfg.vlm_deadline_s > 0:
+            return await asyncio.wait_for(attempt(p), cfg.vlm_deadline_s)
+        return await attempt(p)
+
+    def _launch(reason: str) -> None:
+        p = queue.pop(0)
+        running[asyncio.ensure_future(_one(p))] = (p, time.monotonic())
+        _stats.count(p.name, "requests")
+        if reason == "hedge":
+            _stats.count(p.name, "hedges"); add_metric("vlm_hedges")
+            logger.info("vlm_hedge","vlm",pair_id,"Hedged request to next provider",{"provider":p.name})
+        elif reason == "failover":
+            add_metric("vlm_failovers")
+            logger.info("vlm_failover","vlm",pair_id,"Trying next provider",{"provider":p.name})
+
+    _launch("primary")
+    try:
+        while running:
+            timeout = None
+            if cfg.vlm_hedge and queue:
+                p, started = max(running.values(), key=lambda v: v[1])
+                after = _stats.p95(p.name) or (cfg.vlm_hedge_after_s if cfg.vlm_hedge_after_s > 0 else None)
+                if after is not None:
+                    timeout = max(0.0, started + after - time.monotonic())
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                _launch("hedge")
+                continue
+            for t in done:
+                p, started = running.pop(t)
+                latency = time.monotonic() - started
+                try:
+                    raw = t.result()
+                except Exception as e:
+                    error = e
+                    _stats.count(p.name, "failed")
+                    reason = "deadline" if isinstance(e, asyncio.TimeoutError) else str(e)
+                    logger.warn("vlm_provider_failed","vlm",pair_id,"VLM provider failed",{
+                        "provider":p.name,"reason":reason,"elapsed_s":round(latency, 3)})
+                    continue
+                _stats.latency(p.name, latency)
+                if not valid(raw):
+                    fallback = (p, raw)
+                    _stats.count(p.name, "invalid")
+                    logger.warn("vlm_provider_invalid","vlm",pair_id,"VLM response without a usable tracklist",{"provider":p.name})
+                    continue
+                _stats.count(p.name, "wins")
+                return p, raw
+            if not running and queue:
+                _launch("failover")
+    finally:
+        for t, (p, _) in running.items():
+            t.cancel()
+            _stats.count(p.name, "cancelled")
+            logger.info("vlm_request_cancelled","vlm",pair_id,"Slower request cancelled",{"provider":p.name})
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    if fallback is not None:
+        return fallback
+    raise error if error is not None else RuntimeError("No VLM provider configured")
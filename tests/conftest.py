@@ -0,0 +1,52 @@
+# tests/conftest.py
+from __future__ import annotations
+import json, subprocess, sys
+from pathlib import Path
+from typing import Dict, List
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+@pytest.fixture
+def small_corpus(tmp_path: Path) -> Path:
+    """Two born-digital pairs with short, low-rate WAVs (fast to analyze)."""
+    from bench.corpus import generate_corpus
+    generate_corpus(tmp_path / "corpus", pairs=2, sides=2, tracks_per_side=3, track_sec=3, rate=8000,
+                    sampwidth=1, channels=1, side_mode_ratio=0.5, ambiguous=0)
+    return tmp_path / "corpus"
+
+def run_cli(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, str(ROOT / "m01_main_cli.py"), *args], cwd=ROOT,
+                          capture_output=True, text=True, timeout=300)
+
+def log_events(stdout: str, event: str) -> List[Dict]:
+    out = []
+    for line in stdout.splitlines():
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(rec, dict) and rec.get("event") == event:
+            out.append(rec)
+    return out
+
+class RecordingLogger:
+    """Collects (level, event, data) instead of writing log lines."""
+    def __init__(self):
+        self.records: List = []
+
+    def _add(self, level, event, module, pair_id, message, data=None):
+        self.records.append((level, event, data))
+
+    def info(self, *a): self._add("INFO", *a)
+    def warn(self, *a): self._add("WARN", *a)
+    def error(self, *a): self._add("ERROR", *a)
+
+    def events(self, event: str) -> List:
+        return [d for _, e, d in self.records if e == event]
+
+@pytest.fixture
+def logger() -> RecordingLogger:
+    return RecordingLogger()
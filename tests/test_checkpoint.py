@@ -0,0 +1,38 @@
+# tests/test_checkpoint.py
+from __future__ import annotations
+import os
+from conftest import log_events, run_cli
+from m19_checkpoint import Checkpoint, drop_stale, load_checkpoint
+
+def test_drop_stale_keeps_only_matching_fingerprints():
+    rows = {"1": {"pair_id": "1", "fingerprint": "a"}, "2": {"pair_id": "2", "fingerprint": "b"},
+            "3": {"pair_id": "3", "fingerprint": "c"}}
+    fresh, stale = drop_stale(rows, {"1": "a", "2": "changed"})
+    assert list(fresh) == ["1"]
+    assert stale == 1  # pair 3 is no longer paired, it is not counted as stale
+
+def test_checkpoint_ignores_torn_line_and_last_row_wins(tmp_path):
+    cp = Checkpoint(tmp_path)
+    cp.append({"pair_id": "1", "ok": 1})
+    with open(cp.path, "a", encoding="utf-8") as f:
+        f.write('{"pair_id": "2", "o')
+    cp = Checkpoint(tmp_path)
+    cp.append({"pair_id": "1", "ok": 2})
+    assert load_checkpoint(tmp_path) == {"1": {"pair_id": "1", "ok": 2}}
+
+def test_resume_reruns_pairs_whose_inputs_changed(small_corpus):
+    out = small_corpus / "out"
+    args = ["--pdf-dir", str(small_corpus / "pdf"), "--zip-dir", str(small_corpus / "zip"), "--out-dir", str(out),
+            "--use-vlm-stub", "--no-vlm-cache"]
+    first = run_cli(*args)
+    assert first.returncode == 0, first.stderr
+    run_dir = next(out.glob("RUN_*"))
+
+    pdf = small_corpus / "pdf" / "cue_100000.pdf"
+    st = pdf.stat()
+    os.utime(pdf, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))  # replaced delivery
+    second = run_cli(*args, "--resume", str(run_dir))
+    assert second.returncode == 0, second.stderr
+    plan = log_events(second.stdout, "resume_plan")[0]["data"]
+    assert (plan["completed"], plan["stale"], plan["to_process"]) == (1, 1, 1)
+    assert {r["pair_id"] for r in log_events(second.stdout, "stage_span")} == {"100000"}
@@ -0,0 +1,39 @@
+# tests/test_export.py
+from __future__ import annotations
+import subprocess, sys
+from conftest import ROOT, run_cli
+
+def test_stored_run_exports_to_the_file_layout(small_corpus, tmp_path):
+    out, db = tmp_path / "out", tmp_path / "results.sqlite"
+    # pairing follows the PDF paths, so 100001 is paired (and summarised) before 100000
+    (small_corpus / "pdf" / "cue_100000.pdf").rename(small_corpus / "pdf" / "z_cue_100000.pdf")
+    r = run_cli("--pdf-dir", str(small_corpus / "pdf"), "--zip-dir", str(small_corpus / "zip"), "--out-dir", str(out),
+                "--use-vlm-stub", "--no-vlm-cache", "--results-backend", "both", "--results-db", str(db))
+    assert r.returncode == 0, r.stderr
+    run_dir = next(out.glob("RUN_*"))
+
+    exported = tmp_path / "exported"
+    r = subprocess.run([sys.executable, str(ROOT / "m09_export.py"), "--db", str(db), "--out", str(exported)],
+                       cwd=ROOT, capture_output=True, text=True)
+    assert r.returncode == 0, r.stderr
+    assert r.stdout.startswith(f"{run_dir.name}: 2 pairs")
+    for rel in ("tracklist.json", "matched_tracks.json", "wav/wav_analysis.json", "compare/compare.json", "compare/summary.csv"):
+        for pid in ("100000", "100001"):
+            assert (exported / pid / rel).read_bytes() == (run_dir / pid / rel).read_bytes(), rel
+    for rel in ("summary.csv", "summary.json", "summary.txt"):
+        assert (exported / "_batch" / rel).read_bytes() == (run_dir / "_batch" / rel).read_bytes(), rel
+
+def test_unknown_run_is_an_error(tmp_path):
+    from m09_export import ResultsStore
+    ResultsStore(tmp_path / "r.sqlite").close()
+    r = subprocess.run([sys.executable, str(ROOT / "m09_export.py"), "--db", str(tmp_path / "r.sqlite"), "--run-tag", "RUN_X"],
+                       cwd=ROOT, capture_output=True, text=True)
+    assert r.returncode == 2 and "ERROR" in r.stderr
+
+def test_store_uses_a_rollback_journal(tmp_path):
+    import sqlite3
+    from m09_export import ResultsStore
+    ResultsStore(tmp_path / "r.sqlite").close()
+    with sqlite3.connect(str(tmp_path / "r.sqlite")) as db:
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    assert not (tmp_path / "r.sqlite-wal").exists()
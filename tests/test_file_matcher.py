@@ -0,0 +1,102 @@
+# tests/test_file_matcher.py
+from __future__ import annotations
+import os, time
+from pathlib import Path
+from m04_file_matcher import DirIndex
+
+def _touch(path: Path, age_s: float = 0.0) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"%PDF")
+    if age_s:
+        t = time.time_ns() - int(age_s * 1e9)
+        os.utime(path.parent, ns=(t, t))
+
+def _names(index: DirIndex, root: Path):
+    return [p.relative_to(root).as_posix() for p, _ in index.files(root, (".pdf",))]
+
+def test_entry_added_in_the_same_mtime_tick_is_found(tmp_path):
+    root = tmp_path / "pdf"
+    _touch(root / "cue_1001.pdf")
+    index = DirIndex(tmp_path / "index.json", 4, 8)
+    assert _names(index, root) == ["cue_1001.pdf"]
+    # a coarse-timestamp share keeps the directory mtime of the first listing
+    mtime = os.stat(root).st_mtime_ns
+    _touch(root / "cue_1002.pdf")
+    os.utime(root, ns=(mtime, mtime))
+    assert _names(index, root) == ["cue_1001.pdf", "cue_1002.pdf"]
+
+def _age(*dirs: Path, age_s: float = 10.0) -> None:
+    """Backdate directories past the mtime resolution, as if they had been quiet for a while."""
+    t = time.time_ns() - int(age_s * 1e9)
+    for d in dirs:
+        os.utime(d, ns=(t, t))
+
+def test_unchanged_directories_are_reused(tmp_path):
+    root = tmp_path / "pdf"
+    _touch(root / "a" / "cue_1001.pdf"); _touch(root / "b" / "cue_1002.pdf")
+    _age(root, root / "a", root / "b")
+    index = DirIndex(tmp_path / "index.json", 4, 8)
+    index.files(root, (".pdf",)); index.save()
+    assert (index.scanned, index.reused) == (3, 0)
+    index = DirIndex(tmp_path / "index.json", 4, 8)
+    assert _names(index, root) == ["a/cue_1001.pdf", "b/cue_1002.pdf"]
+    assert (index.scanned, index.reused) == (0, 3)
+
+def test_changed_directories_are_rescanned(tmp_path):
+    root = tmp_path / "pdf"
+    _touch(root / "a" / "cue_1001.pdf"); _touch(root / "b" / "cue_1002.pdf")
+    _age(root, root / "a", root / "b")
+    index = DirIndex(tmp_path / "index.json", 4, 8)
+    assert _names(index, root) == ["a/cue_1001.pdf", "b/cue_1002.pdf"]
+    index.save()
+
+    _touch(root / "b" / "cue_1003.pdf")  # a new file in a subdirectory
+    (root / "a" / "cue_1001.pdf").unlink()
+    _touch(root / "c" / "d" / "cue_1004_final.pdf")  # a new subdirectory tree
+    _age(root, root / "a", root / "b", root / "c", root / "c" / "d")
+    index = DirIndex(tmp_path / "index.json", 4, 8)
+    files = index.files(root, (".pdf",))
+    assert [(p.relative_to(root).as_posix(), ids) for p, ids in files] == [
+        ("b/cue_1002.pdf", ["1002"]), ("b/cue_1003.pdf", ["1003"]), ("c/d/cue_1004_final.pdf", ["1004"])]
+    assert (index.scanned, index.reused) == (5, 0)
+
+def test_index_is_rebuilt_for_another_id_range(tmp_path):
+    root = tmp_path / "pdf"
+    _touch(root / "cue_123456.pdf")
+    _age(root)
+    index = DirIndex(tmp_path / "index.json", 4, 8)
+    index.files(root, (".pdf",)); index.save()
+    index = DirIndex(tmp_path / "index.json", 6, 6)
+    assert [ids for _, ids in index.files(root, (".pdf",))] == [["123456"]]
+    assert index.scanned == 1
+
+def _wav(path: Path, seconds: int = 1) -> None:
+    import wave
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1); w.setsampwidth(1); w.setframerate(8000)
+        w.writeframes(b"\x80" * 8000 * seconds)
+
+def test_loose_wavs_and_delivery_folders_pair_with_pdfs(tmp_path, logger):
+    from m04_file_matcher import discover_and_pair_files
+    from m06_wav_analyzer import analyze_zip
+    pdf, audio = tmp_path / "pdf", tmp_path / "audio"
+    for pid in ("1001", "1002", "1003"):
+        _touch(pdf / f"cue_{pid}.pdf")
+    _touch(audio / "audio_1001.zip")
+    # a delivery folder named with the ID: its WAVs (also in sub-folders) form one source
+    _wav(audio / "delivery_1002" / "A1.wav"); _wav(audio / "delivery_1002" / "A2.wav", 2)
+    _wav(audio / "delivery_1002" / "side_b" / "B1.wav", 3)
+    # a loose WAV in a folder without an ID is its own source
+    _wav(audio / "inbox" / "tape_1003.wav", 4)
+    for index_path in (None, tmp_path / "index.json"):
+        pr = discover_and_pair_files(pdf, audio, 4, 8, logger, index_path)
+        assert [(pi.pair_id, Path(pi.zip).relative_to(audio).as_posix()) for pi in pr.pairs] == [
+            ("1001", "audio_1001.zip"), ("1002", "delivery_1002"), ("1003", "inbox/tape_1003.wav")]
+        assert pr.unmatched_zips == []
+
+    folder = analyze_zip(audio / "delivery_1002", logger, "1002")
+    assert [(w.filename, w.duration_sec, w.side, w.position) for w in folder.items] == [
+        ("A1.wav", 1.0, "A", 1), ("A2.wav", 2.0, "A", 2), ("side_b/B1.wav", 3.0, "B", 1)]
+    single = analyze_zip(audio / "inbox" / "tape_1003.wav", logger, "1003")
+    assert [(w.filename, w.duration_sec) for w in single.items] == [("tape_1003.wav", 4.0)]
@@ -0,0 +1,18 @@
+# tests/test_incremental.py
+from __future__ import annotations
+from m02_config import Config
+from m03_models import PairingItem
+from m15_incremental import pair_fingerprint
+
+def _pair(corpus) -> PairingItem:
+    return PairingItem(pair_id="100000", pdf=str(corpus / "pdf" / "cue_100000.pdf"), zip=str(corpus / "zip" / "audio_100000.zip"))
+
+def test_fingerprint_tracks_the_vlm_endpoints(small_corpus):
+    pi = _pair(small_corpus)
+    local = Config(vlm_provider="local", vlm_endpoint="http://gpu-a:12345/v1/vision/extract")
+    assert pair_fingerprint(pi, local) == pair_fingerprint(pi, local.model_copy())
+    assert pair_fingerprint(pi, local) != pair_fingerprint(pi, local.model_copy(update={"vlm_endpoint": "http://gpu-b:12345/v1/vision/extract"}))
+    remote = Config(vlm_provider="openrouter")
+    assert pair_fingerprint(pi, remote) != pair_fingerprint(pi, remote.model_copy(update={"openrouter_base_url": "https://proxy/api/v1"}))
+    # the local endpoint does not matter while only OpenRouter is used
+    assert pair_fingerprint(pi, remote) == pair_fingerprint(pi, remote.model_copy(update={"vlm_endpoint": "http://other/x"}))
@@ -0,0 +1,27 @@
+# tests/test_logger.py
+from __future__ import annotations
+import gc, json, weakref
+from m10_utils import JsonLogger
+
+def test_records_keep_the_data_as_logged(tmp_path):
+    path = tmp_path / "log.jsonl"
+    log = JsonLogger("RUN_T", str(path), echo=False)
+    data = {"n": 1, "items": ["a"]}
+    log.info("ev", "test", None, "first", data)
+    data["n"] = 2; data["items"].append("b")  # caller reuses its dict right away
+    for i in range(100):
+        data[f"k{i}"] = i
+    log.info("ev", "test", None, "second", data)
+    log.close()
+    recs = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert recs[0]["data"] == {"n": 1, "items": ["a"]}
+    assert recs[1]["data"]["n"] == 2 and len(recs[1]["data"]) == 102
+
+def test_closed_logger_is_not_kept_alive(tmp_path):
+    log = JsonLogger("RUN_T", str(tmp_path / "log.jsonl"), echo=False)
+    log.info("ev", "test", None, "msg", {})
+    log.close()
+    ref = weakref.ref(log)
+    del log
+    gc.collect()
+    assert ref() is None
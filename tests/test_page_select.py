@@ -0,0 +1,39 @@
+# tests/test_page_select.py
+from __future__ import annotations
+import fitz
+from m02_config import Config
+from m20_page_select import plan_pages
+
+def _doc(with_image: bool) -> "fitz.Document":
+    doc = fitz.open()
+    page = doc.new_page()  # A4 portrait, 595 x 842 pt
+    page.insert_text((72, 100), "Side A")
+    for i in range(3):
+        page.insert_text((72, 120 + 16*i), f"{i+1}. Track {i+1}")
+        page.insert_text((400, 120 + 16*i), f"0{i+3}:1{i}")
+    if with_image:
+        # the rest of the tracklist, scanned and pasted in as an image
+        pm = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 40, 20), False)
+        pm.clear_with(40)
+        page.insert_image(fitz.Rect(72, 400, 520, 600), pixmap=pm)
+    return doc
+
+def test_crop_keeps_content_drawn_as_image():
+    plans = plan_pages(_doc(with_image=True), Config(page_crop=True))
+    assert len(plans) == 1 and plans[0].reason == "time_codes"
+    clip = plans[0].clip
+    assert clip is not None and clip.contains(fitz.Rect(80, 410, 510, 590))
+
+def test_crop_still_drops_blank_margins():
+    clip = plan_pages(_doc(with_image=False), Config(page_crop=True))[0].clip
+    assert clip is not None and clip.y1 < 300
+
+def test_rendered_pages_stay_within_the_long_edge_cap(tmp_path, logger):
+    from m05_pdf_extractor import render_pdf_pages
+    pdf = tmp_path / "cue.pdf"
+    _doc(with_image=True).save(str(pdf))
+    for crop in (True, False):
+        for cap in (333, 799, 800, 801, 1000):
+            cfg = Config(image_max_long_edge=cap, page_crop=crop)
+            sizes = [max(p.width, p.height) for p in render_pdf_pages(pdf, cfg, logger, "p")]
+            assert sizes and all(cap - 2 <= s <= cap for s in sizes), (crop, cap, sizes)
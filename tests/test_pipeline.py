@@ -0,0 +1,39 @@
+# tests/test_pipeline.py
+from __future__ import annotations
+from m02_config import Config
+from m03_models import PairingItem
+from m10_utils import JsonLogger, run_pipeline_for_pair
+
+def test_every_stage_is_timed_once_per_pair(small_corpus, tmp_path):
+    logger = JsonLogger("RUN_P", None, echo=False)
+    cfg = Config(use_vlm_stub=True, vlm_cache_enabled=False)
+    for pid in ("100000", "100001"):
+        pi = PairingItem(pair_id=pid, pdf=str(small_corpus / "pdf" / f"cue_{pid}.pdf"),
+                         zip=str(small_corpus / "zip" / f"audio_{pid}.zip"))
+        comp = run_pipeline_for_pair(pi, cfg, tmp_path, logger)
+        assert comp.counts["ok"] == comp.counts["sides_total"] == 2
+    logger.close()
+    stages = {r["stage"]: r["count"] for r in logger.stages.summary()}
+    assert set(stages) >= {"pair", "extract", "wav_analysis", "match", "compare", "export_result"}
+    assert set(stages.values()) == {2}
+
+def test_jobs_give_the_same_output_as_one_job(tmp_path):
+    from bench.corpus import generate_corpus
+    from conftest import run_cli
+    corpus = tmp_path / "corpus"
+    generate_corpus(corpus, pairs=8, sides=2, tracks_per_side=3, track_sec=3, rate=8000, sampwidth=1, channels=1,
+                    side_mode_ratio=0.5, scanned_ratio=0.5, ambiguous=0)
+    runs = []
+    for jobs in ("1", "4"):
+        out = tmp_path / f"out_{jobs}"
+        r = run_cli("--pdf-dir", str(corpus / "pdf"), "--zip-dir", str(corpus / "zip"), "--out-dir", str(out),
+                    "--use-vlm-stub", "--no-vlm-cache", "--jobs", jobs, "--quiet")
+        assert r.returncode in (0, 1), r.stderr
+        runs.append((r.returncode, next(out.glob("RUN_*"))))
+    (rc_1, one), (rc_n, many) = runs
+    assert rc_1 == rc_n
+    # everything but the stage timings
+    files = sorted(p.relative_to(one) for p in one.rglob("*") if p.suffix in (".json", ".csv") and p.stem != "stages")
+    assert len(files) > 8 * 4
+    for rel in files:
+        assert (many / rel).read_bytes() == (one / rel).read_bytes(), rel
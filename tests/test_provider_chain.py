@@ -0,0 +1,84 @@
+# tests/test_provider_chain.py
+from __future__ import annotations
+import time
+import pytest
+import m24_provider_chain
+from bench.corpus import canonical_tracklist, vlm_response
+from bench.stub_vlm import StubVlmServer
+from m02_config import Config
+from m05_pdf_extractor import EncodedPage, callvlm_json
+from m13_vlm_client import VlmClient
+from m24_provider_chain import ProviderStats
+
+GOOD = vlm_response(canonical_tracklist(1, 2, 60))
+PAGE = [EncodedPage(b"\x89PNG fake page", "image/png", 10, 10)]
+
+@pytest.fixture
+def stats(monkeypatch) -> ProviderStats:
+    # provider stats are process-wide (they carry the hedging p95); each test starts clean
+    fresh = ProviderStats()
+    monkeypatch.setattr(m24_provider_chain, "_stats", fresh)
+    return fresh
+
+def _name(server: StubVlmServer) -> str:
+    return "local@" + server.url.split("/")[2]
+
+def _call(cfg: Config, logger):
+    client = VlmClient.from_config(cfg)
+    try:
+        t0 = time.monotonic()
+        resp = callvlm_json(PAGE, cfg, logger, "p1", False, client)
+        return resp, time.monotonic() - t0, client
+    finally:
+        client.close()
+
+def _cfg(*servers: StubVlmServer, **kw) -> Config:
+    return Config(vlm_chain=[f"local={s.url}" for s in servers], vlm_cache_enabled=False, vlm_max_attempts=1, **kw)
+
+def test_hedge_to_faster_provider_cancels_the_slow_one(stats, logger):
+    with StubVlmServer(GOOD, latency_ms=3000) as slow, StubVlmServer(GOOD, latency_ms=50) as fast:
+        resp, elapsed, client = _call(_cfg(slow, fast, vlm_hedge=True, vlm_hedge_after_s=0.2), logger)
+    assert resp == GOOD
+    assert elapsed < 2.0  # did not wait for the slow provider
+    snap = stats.snapshot()
+    assert snap[_name(fast)]["wins"] == 1 and snap[_name(fast)]["hedges"] == 1
+    assert snap[_name(slow)]["cancelled"] == 1 and snap[_name(slow)]["wins"] == 0
+    assert [d["provider"] for d in logger.events("vlm_request_cancelled")] == [_name(slow)]
+    # the cancelled request gave its slot back without counting as a completed request
+    slow_rate = client.rate_for(slow.url)
+    assert slow_rate._in_flight == 0 and slow_rate.stats["requests"] == 0
+    assert client.rate_for(fast.url).stats["requests"] == 1
+
+def test_fast_primary_wins_without_hedge(stats, logger):
+    with StubVlmServer(GOOD, latency_ms=50) as fast, StubVlmServer(GOOD, latency_ms=1000) as slow:
+        resp, _, _ = _call(_cfg(fast, slow, vlm_hedge=True, vlm_hedge_after_s=0.5), logger)
+        assert slow.stats["requests"] == 0
+    assert resp == GOOD
+    assert list(stats.snapshot()) == [_name(fast)] and stats.snapshot()[_name(fast)]["wins"] == 1
+
+def test_deadline_fails_over_to_next_provider(stats, logger):
+    with StubVlmServer(GOOD, latency_ms=2000) as slow, StubVlmServer(GOOD, latency_ms=100) as fast:
+        resp, elapsed, client = _call(_cfg(slow, fast, vlm_deadline_s=0.3), logger)
+    assert resp == GOOD and elapsed < 1.5
+    snap = stats.snapshot()
+    assert snap[_name(slow)]["failed"] == 1 and snap[_name(fast)]["wins"] == 1
+    assert [d["reason"] for d in logger.events("vlm_provider_failed")] == ["deadline"]
+    assert client.rate_for(slow.url)._in_flight == 0
+
+def test_server_error_fails_over(stats, logger):
+    with StubVlmServer(GOOD, status=500) as broken, StubVlmServer(GOOD, latency_ms=100) as ok:
+        resp, _, _ = _call(_cfg(broken, ok), logger)
+    assert resp == GOOD
+    snap = stats.snapshot()
+    assert snap[_name(broken)]["failed"] == 1 and snap[_name(ok)]["wins"] == 1
+    assert len(logger.events("vlm_failover")) == 1
+
+def test_invalid_response_fails_over_and_is_the_last_resort(stats, logger):
+    empty = {"sides": {}}
+    with StubVlmServer(empty, latency_ms=20) as invalid, StubVlmServer(GOOD, latency_ms=100) as ok:
+        resp, _, _ = _call(_cfg(invalid, ok), logger)
+    assert resp == GOOD
+    assert stats.snapshot()[_name(invalid)]["invalid"] == 1
+    with StubVlmServer(empty, latency_ms=20) as invalid, StubVlmServer(GOOD, status=503) as broken:
+        resp, _, _ = _call(_cfg(invalid, broken), logger)
+    assert resp == empty  # no valid answer: the invalid one is returned, not the error
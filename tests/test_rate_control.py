@@ -0,0 +1,98 @@
+# tests/test_rate_control.py
+from __future__ import annotations
+import asyncio
+from types import SimpleNamespace
+import pytest
+import m23_rate_control
+from m23_rate_control import RateController, retry_after_s
+
+class FakeClock:
+    """Stands in for the time module: monotonic()/time() return t, sleep() advances it."""
+    def __init__(self):
+        self.t = 1000.0
+        self.sleeps = []
+    def monotonic(self) -> float:
+        return self.t
+    def time(self) -> float:
+        return self.t
+    def sleep(self, s: float) -> None:
+        self.sleeps.append(s)
+        self.t += s
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    c = FakeClock()
+    monkeypatch.setattr(m23_rate_control, "time", c)
+    return c
+
+def _resp(status: int, retry_after=None):
+    return SimpleNamespace(status_code=status, headers={"Retry-After": retry_after} if retry_after else {})
+
+def _request(rc: RateController, clock: FakeClock, status, latency: float = 1.0, retry_after=None) -> None:
+    assert rc._try_acquire(clock.t) == 0
+    started = clock.t
+    clock.t += latency
+    rc.release(started, status, retry_after)
+
+def test_retry_after_header_values():
+    assert retry_after_s("7") == 7.0
+    assert retry_after_s("Fri, 16 Oct 2026 12:00:30 GMT", now=1792152000.0) == 30.0
+    assert retry_after_s("soon") is None and retry_after_s(None) is None
+
+def test_429_waits_for_retry_after(clock):
+    rc = RateController(4)
+    responses = iter([_resp(429, "7"), _resp(200)])
+    assert rc.call(lambda: next(responses)).status_code == 200
+    assert clock.sleeps == [7.0]
+    assert rc.stats["throttled_429"] == 1 and rc.stats["retries"] == 1
+
+def test_retry_after_pauses_every_caller(clock):
+    rc = RateController(4)
+    _request(rc, clock, 429, retry_after=5.0)
+    assert rc._try_acquire(clock.t) == pytest.approx(5.0)
+    clock.t += 5.0
+    assert rc._try_acquire(clock.t) == 0
+
+def test_window_halves_once_per_round_trip_then_recovers_additively(clock):
+    rc = RateController(8)
+    _request(rc, clock, 200)
+    assert rc.window == 8
+    _request(rc, clock, 503, latency=0.2)
+    _request(rc, clock, 503, latency=0.2)  # same round trip as the first error
+    assert rc.window == 4
+    clock.t += 1.0
+    _request(rc, clock, None)  # transport error in a later round trip
+    assert rc.window == 2
+    _request(rc, clock, 200)
+    assert rc.window == 2.5  # +1/window per success
+    _request(rc, clock, 200, latency=5.0)  # slower than twice the best: congestion, no growth
+    assert rc.window == 2.5
+    for _ in range(60):
+        _request(rc, clock, 200)
+    assert rc.window == 8  # capped at max_in_flight
+    assert rc.stats["min_window"] == 2
+
+def test_slot_is_returned_on_errors(clock):
+    rc = RateController(2, max_attempts=3)
+    class Boom(Exception):
+        pass
+    def failing():
+        raise Boom()
+    with pytest.raises(Boom):
+        rc.call(failing, (Boom,))  # transient: retried, then raised
+    assert rc._in_flight == 0 and rc.stats["errors"] == 3
+    with pytest.raises(RuntimeError):
+        rc.call(lambda: (_ for _ in ()).throw(RuntimeError("bug")))
+    assert rc._in_flight == 0
+    assert rc.call(lambda: _resp(500)).status_code == 500  # the last attempt's response is returned
+    assert rc._in_flight == 0
+
+def test_slot_is_returned_when_a_request_is_cancelled(clock):
+    rc = RateController(1)
+    async def never():
+        await asyncio.Event().wait()
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(rc.acall(never), 0.05)
+    asyncio.run(main())
+    assert rc._in_flight == 0 and rc._try_acquire(clock.t) == 0
@@ -0,0 +1,11 @@
+# tests/test_spans.py
+from __future__ import annotations
+from m17_spans import percentile
+
+def test_nearest_rank_percentile():
+    assert percentile([1.0, 2.0], 50) == 1.0
+    assert percentile([float(i) for i in range(6)], 50) == 2.0
+    assert percentile([float(i) for i in range(20)], 95) == 18.0
+    assert percentile([float(i) for i in range(100)], 7) == 6.0
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([1.0, 2.0, 3.0], 100) == 3.0
@@ -0,0 +1,48 @@
+# tests/test_text_layer.py
+from __future__ import annotations
+from m16_text_layer import parse_tracklist_lines
+
+SIDE_A = ["Side A", "1. Intro 3:45", "2. Second Song 4:10", "3) Third ....... 5:05"]
+SIDE_B = ["Side B", "B1 Fourth 2:30", "B2 Fifth 3:00", "B3 Sixth 6:15"]
+
+def test_complete_tracklist_is_confident():
+    tl, conf = parse_tracklist_lines(["Final cue sheet", *SIDE_A, *SIDE_B])
+    assert conf == 1.0
+    assert [(t.position, t.title, t.duration_sec) for t in tl.sides["A"]] == [
+        (1, "Intro", 225), (2, "Second Song", 250), (3, "Third", 305)]
+    assert [t.side for t in tl.sides["B"]] == ["B"] * 3
+
+def test_single_row_is_not_enough():
+    # typed header page over a scanned tracklist: one clean row must not skip the VLM
+    tl, conf = parse_tracklist_lines(["Side A", "1 Intro 3:45"])
+    assert len(tl.sides["A"]) == 1 and conf < 0.9
+
+def test_matching_totals_confirm_short_sides():
+    _, conf = parse_tracklist_lines(["Side A", "1 Single 3:45", "Side A total 3:45",
+                                     "Strana B", "1 Flip 4:00", "Celkem 4:00"])
+    assert conf == 1.0
+
+def test_grand_total_confirms_all_sides():
+    lines = ["Side A", "1 Single 3:45", "Side B", "1 Flip 4:00", "Total running time 7:45"]
+    assert parse_tracklist_lines(lines)[1] == 1.0
+
+def test_grand_total_past_an_hour():
+    lines = ["Side A"] + [f"{i} Long {i} 20:00" for i in range(1, 4)] + ["Total 1:00:00"]
+    assert parse_tracklist_lines(lines)[1] == 1.0
+
+def test_disagreeing_total_halves_confidence():
+    # side B's tracks are on a scanned page: its total has no tracks to add up
+    _, conf = parse_tracklist_lines([*SIDE_A, "Side A total 13:00", "Side B total 11:45"])
+    assert conf == 0.5
+
+def test_duplicate_positions_halve_confidence():
+    _, conf = parse_tracklist_lines(["Side A", "1 One 3:00", "1 One again 3:00", "2 Two 3:00"])
+    assert conf == 0.5
+
+def test_unparsed_duration_rows_lower_confidence():
+    _, conf = parse_tracklist_lines([*SIDE_A, "Printed 12:30 on 3 May"])
+    assert conf == 0.75
+
+def test_no_tracks():
+    tl, conf = parse_tracklist_lines(["Scanned cue sheet", "Catalogue 12345"])
+    assert conf == 0.0 and not tl.sides
@@ -0,0 +1,35 @@
+# tests/test_track_matcher.py
+from __future__ import annotations
+import itertools, random
+from m03_models import SideTracklist, TrackInfo, WavAnalysis, WavInfo
+from m07_track_matcher import _assign, match_tracks
+
+def _tracklist(sides):
+    return SideTracklist(sides={s: [TrackInfo(title=f"{s}{i+1}", side=s, position=i+1, duration_sec=d)
+                                    for i, d in enumerate(durs)] for s, durs in sides.items()})
+
+def test_unlabelled_wavs_fill_open_tracks_by_duration(logger):
+    tl = _tracklist({"A": [200, 180], "B": [240]})
+    wav = WavAnalysis(items=[WavInfo("A1.wav", 200, "A", 1), WavInfo("mix_b.wav", 241), WavInfo("alt.wav", 179)])
+    out = {(m.side, m.position): m for m in match_tracks(tl, wav, logger, "p", 6)}
+    assert out[("A", 1)].wav.filename == "A1.wav" and not out[("A", 1)].inferred
+    assert out[("A", 2)].wav.filename == "alt.wav" and out[("A", 2)].inferred
+    assert out[("B", 1)].wav.filename == "mix_b.wav" and out[("B", 1)].inferred
+
+def test_side_mode_sides_are_not_filled_by_inference(logger):
+    tl = _tracklist({"A": [199, 181], "B": [240]})
+    wav = WavAnalysis(items=[WavInfo("Side A.wav", 380, "A", None), WavInfo("bonus_mix.wav", 181)])
+    out = match_tracks(tl, wav, logger, "p", 6)
+    assert not any(m.inferred for m in out)
+    assert [m.side for m in out if m.side_consolidated] == ["A"]
+    assert [d["filename"] for d in logger.events("unmatchable_wav")] == ["bonus_mix.wav"]
+
+def test_assign_maximises_pairs_then_minimises_error():
+    rnd = random.Random(3)
+    for _ in range(200):
+        wav = [rnd.randint(100, 130) for _ in range(rnd.randint(1, 4))]
+        pdf = [rnd.randint(100, 130) for _ in range(rnd.randint(len(wav), 5))]
+        got = _assign(wav, pdf, 6)
+        best = max((len(errs), -sum(errs)) for perm in itertools.permutations(range(len(pdf)), len(wav))
+                   for errs in [[abs(wav[r] - pdf[c]) for r, c in enumerate(perm) if abs(wav[r] - pdf[c]) <= 6]])
+        assert (len(got), -sum(e for _, _, e in got)) == best
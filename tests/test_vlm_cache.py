@@ -0,0 +1,53 @@
+# tests/test_vlm_cache.py
+from __future__ import annotations
+import os, time
+from m02_config import Config
+from m05_pdf_extractor import _cache_lookup
+from m14_vlm_cache import VlmCache
+
+def test_key_tracks_the_vlm_endpoints(small_corpus, tmp_path, logger):
+    pdf = small_corpus / "pdf" / "cue_100000.pdf"
+    cfg = Config(vlm_provider="local", vlm_cache_dir=str(tmp_path / "cache"))
+    key_a = _cache_lookup(pdf, cfg, logger, "p")[1]
+    key_b = _cache_lookup(pdf, cfg.model_copy(update={"vlm_endpoint": "http://gpu-b:1/x"}), logger, "p")[1]
+    assert key_a is not None and key_a != key_b
+    key_c = _cache_lookup(pdf, cfg.model_copy(update={"model_name": "other-model"}), logger, "p")[1]
+    assert key_c not in (key_a, key_b)
+    assert _cache_lookup(pdf, cfg.model_copy(), logger, "p")[1] == key_a
+
+def test_hit_returns_the_stored_answer(tmp_path):
+    cache = VlmCache(tmp_path, max_bytes=0, max_age_s=0)
+    assert cache.get("ab" * 32) is None
+    cache.put("ab" * 32, {"sides": {"A": []}})
+    assert cache.get("ab" * 32) == {"sides": {"A": []}}
+    assert cache.stats == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+def test_evict_by_age_then_least_recently_used(tmp_path):
+    cache = VlmCache(tmp_path, max_bytes=0, max_age_s=3600)
+    now = time.time()
+    for n, age in (("a", 7200), ("b", 300), ("c", 200), ("d", 100)):
+        cache.put(n * 64, {"sides": {}, "pad": "x" * 100})
+        os.utime(cache._path(n * 64), (now - age, now - age))
+    size = cache._path("b" * 64).stat().st_size
+    cache.max_bytes = 2 * size
+    cache.get("b" * 64)  # a hit makes b the most recently used entry
+    assert cache.evict() == {"removed": 2, "bytes": 2 * size}
+    assert [k for k in "abcd" if cache._path(k * 64).exists()] == ["b", "d"]
+
+def _extract_with(monkeypatch, pdf, cfg, logger, raw):
+    import m05_pdf_extractor as m05
+    calls = []
+    monkeypatch.setattr(m05, "render_pdf_pages", lambda *a, **k: [])
+    monkeypatch.setattr(m05, "callvlm_json", lambda *a, **k: calls.append(1) or raw)
+    return m05.extract_pdf_tracklist(pdf, cfg, logger, "p"), calls
+
+def test_unusable_responses_are_not_cached(small_corpus, tmp_path, logger, monkeypatch):
+    pdf = small_corpus / "pdf" / "cue_100000.pdf"
+    cfg = Config(vlm_provider="local", text_layer_enabled=False, vlm_cache_dir=str(tmp_path / "cache"))
+    tracklist, _ = _extract_with(monkeypatch, pdf, cfg, logger, {"sides": {}})
+    assert tracklist.sides == {}
+    assert not list((tmp_path / "cache").glob("*/*.json"))
+    good = {"sides": {"A": [{"title": "X", "side": "A", "position": 1, "duration_formatted": "03:00"}]}}
+    tracklist, calls = _extract_with(monkeypatch, pdf, cfg, logger, good)
+    assert calls == [1] and tracklist.sides["A"][0].duration_sec == 180
+    assert len(list((tmp_path / "cache").glob("*/*.json"))) == 1
@@ -0,0 +1,37 @@
+# tests/test_vlm_client.py
+from __future__ import annotations
+import asyncio, base64, json
+import pytest
+from m05_pdf_extractor import EncodedPage, _PAGE_SLOT, _stream_payload
+from m13_vlm_client import JsonBody, VlmClient
+
+_SIZES = [0, 1, 2, JsonBody.SLICE - 1, JsonBody.SLICE, JsonBody.SLICE + 1, 2 * JsonBody.SLICE + 2]
+
+def _body():
+    pages = [EncodedPage(bytes(range(256)) * (n // 256) + bytes(n % 256), "image/png", 1, 1) for n in _SIZES]
+    payload = {"task": "t", "images_base64": [_PAGE_SLOT.format(i) for i in range(len(pages))]}
+    expected = {"task": "t", "images_base64": [base64.b64encode(p.data).decode("ascii") for p in pages]}
+    return _stream_payload(payload, pages), json.dumps(expected).encode("utf-8")
+
+def test_streamed_bytes_match_content_length():
+    body, expected = _body()
+    sent = b"".join(body.chunks())
+    assert sent == expected and len(sent) == len(body)
+    assert b"".join(body.chunks()) == sent  # a retry re-sends the same body
+
+    async def collect():
+        return b"".join([c async for c in body.achunks()])
+    assert asyncio.run(collect()) == sent
+
+def test_server_receives_content_length_bytes():
+    from bench.stub_vlm import StubVlmServer
+    pytest.importorskip("httpx")
+    body, expected = _body()
+    client = VlmClient(timeout_s=10, http2=False)
+    try:
+        with StubVlmServer({"sides": {}}) as stub:
+            assert client.post_json(stub.url, body) == {"sides": {}}
+            assert client.run(client.apost_json(stub.url, body)) == {"sides": {}}
+            assert stub.stats == {"requests": 2, "request_bytes": 2 * len(expected)}
+    finally:
+        client.close()
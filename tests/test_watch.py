@@ -0,0 +1,64 @@
+# tests/test_watch.py
+from __future__ import annotations
+import json, threading
+from collections import Counter
+from m02_config import Config
+from m10_utils import JsonLogger
+from m15_incremental import load_fingerprints
+from m18_watch import watch_loop
+
+def _watch(corpus, tmp_path, process, **kw):
+    logger = JsonLogger("RUN_W", None, echo=False)
+    try:
+        return watch_loop(corpus / "pdf", corpus / "zip", Config(), tmp_path / "run", logger, process,
+                          threading.Event(), interval_s=0.01, settle_s=0, max_cycles=12, **kw)
+    finally:
+        logger.close()
+
+def _row(pi):
+    return {"pair_id": pi.pair_id, "sides_total": 2, "ok": 2, "warn": 0, "fail": 0, "worst_delta": 0}
+
+def test_failed_pair_is_retried_until_it_succeeds(small_corpus, tmp_path):
+    calls = Counter()
+    def process(pi):
+        calls[pi.pair_id] += 1
+        return None if pi.pair_id == "100000" and calls[pi.pair_id] < 3 else _row(pi)
+    rows = _watch(small_corpus, tmp_path, process, retry_s=0, max_attempts=5)
+    assert calls == {"100000": 3, "100001": 1}
+    assert sorted(rows) == ["100000", "100001"]
+
+def test_retries_stop_at_max_attempts(small_corpus, tmp_path):
+    calls = Counter()
+    def process(pi):
+        calls[pi.pair_id] += 1
+        return None if pi.pair_id == "100000" else _row(pi)
+    rows = _watch(small_corpus, tmp_path, process, retry_s=0, max_attempts=3)
+    assert calls["100000"] == 3
+    assert sorted(rows) == ["100001"]
+
+def test_retry_waits_for_backoff(small_corpus, tmp_path):
+    calls = Counter()
+    def process(pi):
+        calls[pi.pair_id] += 1
+        return None
+    _watch(small_corpus, tmp_path, process, retry_s=60, max_attempts=5)
+    assert calls == {"100000": 1, "100001": 1}
+
+def test_changed_inputs_that_fail_drop_the_earlier_row(small_corpus, tmp_path):
+    pdf = small_corpus / "pdf" / "cue_100000.pdf"
+    calls = Counter()
+    def process(pi):
+        calls[pi.pair_id] += 1
+        if pi.pair_id != "100000":
+            return _row(pi)
+        if calls[pi.pair_id] == 1:
+            with open(pdf, "ab") as f:  # a new version lands right after the first result
+                f.write(b"\n% revised\n")
+            return _row(pi)
+        return None
+    rows = _watch(small_corpus, tmp_path, process, retry_s=0, max_attempts=2)
+    assert calls["100000"] == 3
+    assert sorted(rows) == ["100001"]
+    summary = json.loads((tmp_path / "run" / "_batch" / "summary.json").read_text(encoding="utf-8"))
+    assert summary["pairs_total"] == 1
+    assert sorted(load_fingerprints(tmp_path / "run")) == ["100001"]
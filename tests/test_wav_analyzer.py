@@ -0,0 +1,110 @@
+# tests/test_wav_analyzer.py
+from __future__ import annotations
+import io, struct
+import pytest
+from m06_wav_analyzer import SilenceOptions, _measure, _numpy, analyze_zip
+
+np = _numpy()
+needs_numpy = pytest.mark.skipif(np is None, reason="the level scan needs NumPy")
+
+RATE = 8000
+
+def _pcm(x, width: int) -> bytes:
+    """Encode float samples in [-1, 1] as little-endian PCM of `width` bytes."""
+    if width == 1:
+        return (np.round(x * 127) + 128).astype(np.uint8).tobytes()
+    if width == 2:
+        return np.round(x * 32767).astype("<i2").tobytes()
+    return np.round(x * 8388607).astype("<i4").view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+
+def _wav(pcm: bytes, width: int, pre: bytes = b"", data_size=None, rf64: bool = False) -> bytes:
+    """A mono PCM WAV; `pre` chunks go before `fmt `, rf64 moves the sizes into a ds64 chunk."""
+    fmt = struct.pack("<HHIIHH", 1, 1, RATE, RATE * width, width, width * 8)
+    size = len(pcm) if data_size is None else data_size
+    if rf64:
+        pre = b"ds64" + struct.pack("<I", 28) + struct.pack("<QQQI", 0, size, size // width, 0) + pre
+        size = 0xFFFFFFFF
+    body = b"WAVE" + pre + b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"data" + struct.pack("<I", size) + pcm
+    return (b"RF64" if rf64 else b"RIFF") + struct.pack("<I", 0xFFFFFFFF if rf64 else len(body)) + body
+
+def _program(lead_s: float, tone_s: float, trail_s: float, amp: float = 0.1):
+    """Silence, a sine tone of peak amplitude `amp`, silence."""
+    t = np.arange(int(tone_s * RATE)) / RATE
+    return np.concatenate([np.zeros(int(lead_s * RATE)), amp * np.sin(2 * np.pi * 440 * t), np.zeros(int(trail_s * RATE))])
+
+def _levels(data: bytes, opts: SilenceOptions = SilenceOptions()):
+    return _measure(io.BytesIO(data), len(data), opts)
+
+@needs_numpy
+@pytest.mark.parametrize("width", [1, 2, 3])
+def test_leading_and_trailing_silence(width):
+    duration, levels = _levels(_wav(_pcm(_program(0.5, 1.0, 0.25), width), width))
+    assert duration == pytest.approx(1.75)
+    assert levels.leading_sec == pytest.approx(0.5)
+    assert levels.trailing_sec == pytest.approx(0.25)
+    assert levels.peak_dbfs == pytest.approx(-20.0, abs=0.5)
+
+@needs_numpy
+def test_all_silent_member():
+    _, levels = _levels(_wav(_pcm(np.zeros(RATE), 2), 2))
+    assert levels == (1.0, 0.0, None)
+
+@needs_numpy
+def test_threshold_option():
+    data = _wav(_pcm(_program(0.5, 1.0, 0.25), 2), 2)
+    # the tone's RMS is about -23 dBFS: loud for -30, silence for -20
+    assert _levels(data, SilenceOptions(threshold_dbfs=-30.0))[1].leading_sec == pytest.approx(0.5)
+    assert _levels(data, SilenceOptions(threshold_dbfs=-20.0))[1].leading_sec == pytest.approx(1.75)
+
+@needs_numpy
+def test_window_option():
+    # 200 ms windows: the windows holding the tone's edges count as loud
+    _, levels = _levels(_wav(_pcm(_program(0.5, 1.0, 0.25), 2), 2), SilenceOptions(window_ms=200))
+    assert levels.leading_sec == pytest.approx(0.4)
+    assert levels.trailing_sec == pytest.approx(0.15)
+
+@needs_numpy
+@pytest.mark.parametrize("width", [1, 2, 3])
+def test_effective_length_of_a_side(tmp_path, logger, width):
+    (tmp_path / "A1.wav").write_bytes(_wav(_pcm(_program(0.5, 1.0, 0.1), width), width))
+    (tmp_path / "A2.wav").write_bytes(_wav(_pcm(_program(0.1, 1.0, 0.25), width), width))
+    wa = analyze_zip(tmp_path, logger, "p", silence=SilenceOptions())
+    assert [w.effective_duration_sec for w in wa.items] == [pytest.approx(1.0), pytest.approx(1.0)]
+    side = wa.per_side_mode["A"]
+    assert side.total_duration_sec == pytest.approx(2.95)
+    # only the silence before the first and after the last track is dropped
+    assert side.effective_duration_sec == pytest.approx(2.2)
+
+def _duration(data: bytes) -> float:
+    return _measure(io.BytesIO(data), len(data))[0]
+
+def test_plain_riff_duration():
+    assert _duration(_wav(bytes(2 * RATE * 3), 2)) == pytest.approx(3.0)
+
+def test_rf64_takes_the_data_size_from_ds64():
+    assert _duration(_wav(bytes(2 * RATE * 3), 2, rf64=True)) == pytest.approx(3.0)
+
+def test_rf64_without_ds64_is_rejected():
+    data = b"RF64" + _wav(bytes(2 * RATE), 2, data_size=0xFFFFFFFF)[4:]
+    with pytest.raises(ValueError, match="ds64"):
+        _duration(data)
+
+@pytest.mark.parametrize("rf64", [False, True])
+def test_odd_sized_chunks_are_padded(rf64):
+    # a 5-byte LIST chunk is followed by one pad byte before the next chunk header
+    pre = b"LIST" + struct.pack("<I", 5) + b"INFOx" + b"\0" + b"junk" + struct.pack("<I", 3) + b"abc\0"
+    assert _duration(_wav(bytes(2 * RATE * 3), 2, pre=pre, rf64=rf64)) == pytest.approx(3.0)
+
+def test_streamed_data_size_is_clamped_to_the_file():
+    # writers that stream the WAV leave 0xFFFFFFFF in the data header
+    assert _duration(_wav(bytes(2 * RATE * 3), 2, data_size=0xFFFFFFFF)) == pytest.approx(3.0)
+    # a data chunk cut short (truncated upload) counts only the frames present
+    assert _duration(_wav(bytes(2 * RATE * 3), 2, data_size=2 * RATE * 5)) == pytest.approx(3.0)
+
+def test_rf64_in_a_zip(tmp_path, logger):
+    import zipfile
+    with zipfile.ZipFile(tmp_path / "a.zip", "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("A1.wav", _wav(bytes(2 * RATE * 3), 2, rf64=True))
+        z.writestr("A2.wav", _wav(bytes(RATE * 2), 1))
+    wa = analyze_zip(tmp_path / "a.zip", logger, "p")
+    assert [(w.filename, w.duration_sec) for w in wa.items] == [("A1.wav", pytest.approx(3.0)), ("A2.wav", pytest.approx(2.0))]
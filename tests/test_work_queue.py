@@ -0,0 +1,84 @@
+# tests/test_work_queue.py
+from __future__ import annotations
+import subprocess, sys, time
+from pathlib import Path
+from conftest import ROOT, log_events
+from m02_config import Config
+from m03_models import PairingItem
+from m22_work_queue import WorkQueue
+
+def _pairs(n: int):
+    return [PairingItem(pair_id=str(i), pdf=f"/in/pdf/{i}.pdf", zip=f"/in/zip/{i}.zip") for i in range(n)]
+
+def _enqueue(q: WorkQueue, pairs, fps) -> int:
+    return q.enqueue(pairs, Config(), Path("/in/pdf"), Path("/in/zip"), fps, {})
+
+def test_resume_requeues_changed_and_failed_pairs(tmp_path):
+    q = WorkQueue(tmp_path, max_attempts=1)
+    pairs = _pairs(3)
+    assert _enqueue(q, pairs, {"0": "a", "1": "b", "2": "c"}) == 0
+    for _ in range(2):
+        pi, _, fp = q.claim("w", 60)
+        q.complete(pi.pair_id, "w", {"pair_id": pi.pair_id}, fp)
+    pi, _, _ = q.claim("w", 60)
+    q.fail(pi.pair_id, "w", "boom")
+    assert q.counts() == {"queued": 0, "leased": 0, "done": 2, "failed": 1}
+
+    # pair 0 unchanged, pair 1 has new files, pair 2 failed
+    assert _enqueue(q, pairs, {"0": "a", "1": "b2", "2": "c"}) == 2
+    assert q.counts() == {"queued": 2, "leased": 0, "done": 1, "failed": 0}
+    q.close()
+
+def test_result_for_superseded_fingerprint_is_discarded(tmp_path):
+    q = WorkQueue(tmp_path)
+    _enqueue(q, _pairs(1), {"0": "old"})
+    pi, _, fp = q.claim("w", 60)
+    _enqueue(q, _pairs(1), {"0": "new"})  # files replaced while the pair runs
+    q.complete(pi.pair_id, "w", {"pair_id": "0"}, fp)
+    assert q.counts()["queued"] == 1
+    pi, _, fp = q.claim("w2", 60)
+    q.complete(pi.pair_id, "w2", {"pair_id": "0", "new": True}, fp)
+    rows, fps, _ = q.results()
+    assert rows == [{"pair_id": "0", "new": True}] and fps == {"0": "new"}
+    q.close()
+
+def test_lease_expires_only_past_the_clock_skew_margin(tmp_path):
+    q = WorkQueue(tmp_path, clock_skew_s=30)
+    _enqueue(q, _pairs(2), {})
+    q.claim("fast-clock-host", -10)   # deadline 10 s ago by this clock: within the margin
+    q.claim("dead-host", -60)          # 60 s past: the worker is gone
+    assert q.counts() == {"queued": 1, "leased": 1, "done": 0, "failed": 0}
+    pi, _, _ = q.claim("w", 60)
+    assert pi.pair_id == "1"
+    q.close()
+
+def test_coordinator_and_workers_drain_queue_with_expired_lease(small_corpus, tmp_path):
+    out = tmp_path / "out"
+    cli = [sys.executable, str(ROOT / "m01_main_cli.py")]
+    coord = subprocess.Popen(cli + ["--pdf-dir", str(small_corpus / "pdf"), "--zip-dir", str(small_corpus / "zip"),
+                                    "--out-dir", str(out), "--use-vlm-stub", "--no-vlm-cache", "--queue", "--queue-poll", "0.2"],
+                             cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    try:
+        deadline = time.monotonic() + 60
+        while not list(out.glob("RUN_*/_batch/queue.sqlite")) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        run_dir = next(out.glob("RUN_*"))
+        q = WorkQueue(run_dir)
+        while sum(q.counts().values()) < 2 and time.monotonic() < deadline:
+            time.sleep(0.1)
+        # a worker that claimed a pair and died: its lease ran out long ago
+        dead, _, _ = q.claim("dead-host:1", -3600)
+
+        workers = [subprocess.Popen(cli + ["--worker", str(run_dir), "--worker-id", f"w{i}", "--queue-poll", "0.2"],
+                                    cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) for i in range(2)]
+        for w in workers:
+            assert w.wait(timeout=120) == 0, w.stderr.read()
+        stdout, stderr = coord.communicate(timeout=60)
+    finally:
+        coord.kill()
+    assert coord.returncode == 0, stderr
+    assert log_events(stdout, "queue_merged")[0]["data"] == {"pairs_done": 2, "pairs_failed": 0}
+    rows = dict(q._db.execute("SELECT pair_id, worker || ':' || attempts FROM work"))
+    assert rows[dead.pair_id].startswith("w") and rows[dead.pair_id].endswith(":2")
+    assert (run_dir / "_batch").is_dir() and (run_dir / "_batch" / "fingerprints.json").is_file()
+    q.close()